@@ -1,13 +1,30 @@
+import io
 import os
+import re
+import csv
+import gzip
+import json
+import zlib
+import hashlib
+import heapq
 import secrets
+import random
+import mimetypes
+import unicodedata
+import time as time_module
+from bisect import bisect_left, bisect_right
 from datetime import datetime, date, timedelta, timezone
 from functools import wraps
+from operator import itemgetter
 
+import click
 from flask import (
     Flask, render_template, request, redirect,
-    url_for, flash, session, jsonify
+    url_for, flash, session, jsonify,
+    Response, stream_with_context, send_file, send_from_directory
 )
 
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import (
     LoginManager, UserMixin, login_user,
@@ -15,11 +32,32 @@ from flask_login import (
 )
 
 from flask_socketio import SocketIO, emit, join_room, leave_room
+import gevent
 
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from sqlalchemy import func, or_
+from sqlalchemy import (
+    func, or_, and_, case, event, insert, update, select, bindparam, tuple_, false, true
+)
+from sqlalchemy.exc import IntegrityError
 from threading import Lock
+from collections import Counter, deque
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+try:
+    from PIL import Image, ImageOps, features as pil_features
+except ImportError:  # Pillow é opcional: sem ele as fotos são salvas como enviadas
+    Image = ImageOps = pil_features = None
+
+try:
+    import brotli
+except ImportError:  # sem o módulo, estáticos e respostas saem só com gzip
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # sem o módulo, o JSON usa a biblioteca padrão
+    orjson = None
 
 # ======================================================
 # CONFIGURAÇÃO
@@ -73,22 +111,341 @@ def allowed_file(filename):
 background_task = None
 background_task_lock = Lock()
 
+# =========================
+# JSON E COMPRESSÃO
+# =========================
+# jsonify, SSE e Socket.IO usam o mesmo serializador: orjson quando
+# instalado (JSON_SERIALIZADOR=json força a biblioteca padrão), compacto e
+# com UTF-8 direto em vez de escapes \uXXXX, salvo pedido do chamador. Datas e demais tipos
+# especiais seguem o tratamento padrão do Flask. Respostas HTML/JSON acima de
+# COMPRESSAO_MINIMA bytes saem com brotli ou gzip, conforme o Accept-Encoding.
+JSON_SERIALIZADOR = os.getenv("JSON_SERIALIZADOR", "orjson" if orjson is not None else "json")
+COMPRESSAO_MINIMA = int(os.getenv("COMPRESSAO_MINIMA", "1024"))  # bytes
+COMPRESSAO_NIVEL_GZIP = 6
+COMPRESSAO_QUALIDADE_BROTLI = 5  # níveis altos são lentos demais por requisição
+TIPOS_COMPRIMIDOS = {"text/html", "application/json", "text/plain", "text/css", "application/javascript"}
+
+# Compressão das respostas do Socket.IO em long-polling (SOCKETIO_COMPRESSAO=0 desativa)
+SOCKETIO_COMPRESSAO = os.getenv("SOCKETIO_COMPRESSAO", "1") == "1"
+
+SEPARADORES_COMPACTOS = (",", ":")
+SEPARADORES_INDENTADOS = (",", ": ")
+
+def json_dumps(obj, sort_keys=False, indent=None, separators=None, default=None,
+               ensure_ascii=False, **kwargs):
+    """Serializa em JSON (str), compacto e em UTF-8 por padrão.
+
+    Aceita os argumentos do json.dumps. O orjson cobre sort_keys e indent=2;
+    o resto (outra indentação, separadores próprios, ensure_ascii, cls...)
+    vai para a biblioteca padrão, que recusa argumentos desconhecidos.
+    """
+    default = default or DefaultJSONProvider.default
+    formato_orjson = (indent is None and separators in (None, SEPARADORES_COMPACTOS)) \
+        or (indent == 2 and separators in (None, SEPARADORES_INDENTADOS))
+    if JSON_SERIALIZADOR == "orjson" and formato_orjson and not ensure_ascii and not kwargs:
+        opcoes = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            opcoes |= orjson.OPT_SORT_KEYS
+        if indent:
+            opcoes |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=opcoes).decode("utf-8")
+    if separators is None and indent is None:
+        separators = SEPARADORES_COMPACTOS
+    return json.dumps(obj, default=default, ensure_ascii=ensure_ascii, sort_keys=sort_keys,
+                      indent=indent, separators=separators, **kwargs)
+
+def json_loads(texto, **kwargs):
+    if JSON_SERIALIZADOR == "orjson" and not kwargs:
+        return orjson.loads(texto)
+    return json.loads(texto, **kwargs)
+
+class ProvedorJSON(DefaultJSONProvider):
+    """JSON do Flask (jsonify, request.get_json, |tojson) com o serializador configurado"""
+    ensure_ascii = False  # UTF-8 direto: menor e mais rápido que os escapes \uXXXX
+
+    def dumps(self, obj, **kwargs):
+        # Mesmos padrões do provedor do Flask (sort_keys=True deixa a saída determinística)
+        kwargs.setdefault("sort_keys", self.sort_keys)
+        kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+        return json_dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return json_loads(s, **kwargs)
+
+class JSONSocketIO:
+    """Módulo json entregue ao Socket.IO (só precisa de dumps e loads)"""
+    dumps = staticmethod(json_dumps)
+    loads = staticmethod(json_loads)
+
+app.json = ProvedorJSON(app)
+
+@app.after_request
+def comprimir_resposta(resposta):
+    """Comprime HTML/JSON grandes com brotli ou gzip, se o cliente aceitar"""
+    if (resposta.direct_passthrough or resposta.is_streamed
+            or resposta.status_code != 200
+            or "Content-Encoding" in resposta.headers
+            or resposta.mimetype not in TIPOS_COMPRIMIDOS):
+        return resposta
+    
+    resposta.vary.add("Accept-Encoding")
+    if brotli is not None and request.accept_encodings["br"]:
+        codificacao = "br"
+    elif request.accept_encodings["gzip"]:
+        codificacao = "gzip"
+    else:
+        return resposta
+    
+    dados = resposta.get_data()
+    if len(dados) < COMPRESSAO_MINIMA:
+        return resposta
+    
+    if codificacao == "br":
+        resposta.set_data(brotli.compress(dados, quality=COMPRESSAO_QUALIDADE_BROTLI))
+    else:
+        resposta.set_data(gzip.compress(dados, COMPRESSAO_NIVEL_GZIP))
+    resposta.headers["Content-Encoding"] = codificacao
+    
+    # Outra representação do mesmo conteúdo: o ETag passa a ser fraco
+    etag, fraco = resposta.get_etag()
+    if etag and not fraco:
+        resposta.set_etag(etag, weak=True)
+    return resposta
+
 # =========================
 # EXTENSÕES
 # =========================
 db = SQLAlchemy(app)
 
+# Logs verbosos do transporte só quando pedidos (SOCKETIO_LOG=1)
+SOCKETIO_LOG = os.getenv("SOCKETIO_LOG", "0") == "1"
+
 socketio = SocketIO(
     app,
     async_mode="gevent",
     cors_allowed_origins="*",
-    logger=True,  # Ativa logs do SocketIO
-    engineio_logger=True,  # Ativa logs do EngineIO
+    logger=SOCKETIO_LOG,
+    engineio_logger=SOCKETIO_LOG,
     ping_timeout=60,
     ping_interval=25,
-    always_connect=True
+    always_connect=True,
+    json=JSONSocketIO,
+    http_compression=SOCKETIO_COMPRESSAO,
+    compression_threshold=COMPRESSAO_MINIMA
 )
 
+# =========================
+# MÉTRICAS DO SOCKET.IO
+# =========================
+# Intervalo (segundos) das linhas de log estruturadas; 0 desativa
+SOCKETIO_METRICAS_INTERVALO = int(os.getenv("SOCKETIO_METRICAS_INTERVALO", "60"))
+JANELA_METRICAS = 60  # segundos usados no cálculo das taxas
+JANELA_RECONEXAO = 60  # reconexão = mesmo cliente volta dentro desta janela
+LIMITES_LATENCIA_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class MetricasTempoReal:
+    """Contadores da camada em tempo real (conexões, emits, bytes e latência)"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.inicio = time_module.time()
+        self.conexoes = 0
+        self.desconexoes = 0
+        self.reconexoes = 0
+        self.sockets_ativos = set()
+        self.ultima_desconexao = {}
+        self.emits = 0
+        self.mensagens = 0
+        self.bytes_enviados = 0
+        self.por_segundo = deque(maxlen=JANELA_METRICAS)
+        self.latencias = {}
+        self._ultimo_pacote = None
+        self._tamanho_ultimo_pacote = 0
+
+    def _segundo_atual(self):
+        """Retorna o balde [segundo, emits, mensagens, bytes] corrente"""
+        agora = int(time_module.time())
+        if not self.por_segundo or self.por_segundo[-1][0] != agora:
+            self.por_segundo.append([agora, 0, 0, 0])
+        return self.por_segundo[-1]
+
+    def registrar_conexao(self, sid, chave):
+        agora = time_module.time()
+        with self.lock:
+            self.conexoes += 1
+            self.sockets_ativos.add(sid)
+            desconectou_em = self.ultima_desconexao.pop(chave, None)
+            if desconectou_em and agora - desconectou_em <= JANELA_RECONEXAO:
+                self.reconexoes += 1
+
+    def registrar_desconexao(self, sid, chave):
+        agora = time_module.time()
+        with self.lock:
+            self.desconexoes += 1
+            self.sockets_ativos.discard(sid)
+            self.ultima_desconexao[chave] = agora
+            # Descarta registros antigos para não crescer indefinidamente
+            if len(self.ultima_desconexao) > 1000:
+                self.ultima_desconexao = {
+                    c: t for c, t in self.ultima_desconexao.items()
+                    if agora - t <= JANELA_RECONEXAO
+                }
+
+    def registrar_emit(self):
+        with self.lock:
+            self.emits += 1
+            self._segundo_atual()[1] += 1
+
+    def registrar_envio(self, pacote):
+        """Conta uma mensagem entregue a um socket e o tamanho do payload"""
+        with self.lock:
+            # O mesmo pacote é reaproveitado para todos os destinatários de
+            # um broadcast; o tamanho é calculado uma única vez
+            if pacote is not self._ultimo_pacote:
+                dados = pacote.data
+                if isinstance(dados, str):
+                    tamanho = len(dados.encode('utf-8'))
+                elif isinstance(dados, bytes):
+                    tamanho = len(dados)
+                else:
+                    tamanho = 0
+                self._ultimo_pacote = pacote
+                self._tamanho_ultimo_pacote = tamanho
+            tamanho = self._tamanho_ultimo_pacote
+            self.mensagens += 1
+            self.bytes_enviados += tamanho
+            balde = self._segundo_atual()
+            balde[2] += 1
+            balde[3] += tamanho
+
+    def registrar_latencia(self, evento, duracao_ms):
+        with self.lock:
+            hist = self.latencias.get(evento)
+            if hist is None:
+                hist = self.latencias[evento] = {
+                    'contagem': 0, 'soma_ms': 0.0, 'max_ms': 0.0,
+                    'baldes': [0] * (len(LIMITES_LATENCIA_MS) + 1)
+                }
+            hist['contagem'] += 1
+            hist['soma_ms'] += duracao_ms
+            hist['max_ms'] = max(hist['max_ms'], duracao_ms)
+            for i, limite in enumerate(LIMITES_LATENCIA_MS):
+                if duracao_ms <= limite:
+                    hist['baldes'][i] += 1
+                    break
+            else:
+                hist['baldes'][-1] += 1
+
+    def sockets_por_sala(self):
+        """Quantidade de sockets em cada sala nomeada (ignora salas por sid)"""
+        try:
+            salas = socketio.server.manager.rooms.get('/', {})
+        except AttributeError:
+            return {}
+        return {
+            sala: len(participantes)
+            for sala, participantes in list(salas.items())
+            if sala is not None and sala not in participantes
+        }
+
+    def snapshot(self):
+        """Retorna um dicionário serializável com o estado atual"""
+        agora = time_module.time()
+        salas = self.sockets_por_sala()
+        with self.lock:
+            recentes = [b for b in self.por_segundo if agora - b[0] <= JANELA_METRICAS]
+            janela = max(1, min(JANELA_METRICAS, int(agora - self.inicio) + 1))
+            latencias = {}
+            for evento, hist in self.latencias.items():
+                # Lista (e não dicionário) para manter a ordem dos baldes no JSON
+                limites = list(LIMITES_LATENCIA_MS) + [None]
+                latencias[evento] = {
+                    'contagem': hist['contagem'],
+                    'media_ms': round(hist['soma_ms'] / hist['contagem'], 2),
+                    'max_ms': round(hist['max_ms'], 2),
+                    'histograma': [
+                        {'ate_ms': limite, 'contagem': qtd}
+                        for limite, qtd in zip(limites, hist['baldes'])
+                    ]
+                }
+            return {
+                'tipo': 'metricas_socketio',
+                'timestamp': datetime.utcnow().isoformat(),
+                'uptime_s': int(agora - self.inicio),
+                'sockets_conectados': len(self.sockets_ativos),
+                'sockets_por_sala': salas,
+                'conexoes': self.conexoes,
+                'desconexoes': self.desconexoes,
+                'reconexoes': self.reconexoes,
+                'taxa_reconexao': round(self.reconexoes / self.conexoes, 4) if self.conexoes else 0.0,
+                'emits_total': self.emits,
+                'mensagens_total': self.mensagens,
+                'bytes_total': self.bytes_enviados,
+                'emits_por_segundo': round(sum(b[1] for b in recentes) / janela, 3),
+                'mensagens_por_segundo': round(sum(b[2] for b in recentes) / janela, 3),
+                'bytes_por_segundo': round(sum(b[3] for b in recentes) / janela, 1),
+                'latencia_handlers': latencias
+            }
+
+
+metricas_socketio = MetricasTempoReal()
+metricas_task = None
+metricas_task_lock = Lock()
+
+
+def instrumentar_socketio():
+    """Envolve o servidor Socket.IO para contar emits e bytes enviados"""
+    servidor = socketio.server
+    emit_original = servidor.emit
+    enviar_original = servidor.eio.send_packet
+
+    def emit_medido(*args, **kwargs):
+        metricas_socketio.registrar_emit()
+        return emit_original(*args, **kwargs)
+
+    def enviar_medido(sid, pacote):
+        metricas_socketio.registrar_envio(pacote)
+        return enviar_original(sid, pacote)
+
+    servidor.emit = emit_medido
+    servidor.eio.send_packet = enviar_medido
+
+
+instrumentar_socketio()
+
+
+def medir_evento_socket(evento):
+    """Decorator que registra a latência de um handler do Socket.IO"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            inicio = time_module.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                metricas_socketio.registrar_latencia(
+                    evento, (time_module.perf_counter() - inicio) * 1000
+                )
+        return decorated_function
+    return decorator
+
+
+def registrar_metricas_periodicamente():
+    """Emite uma linha JSON com as métricas a cada intervalo configurado"""
+    while True:
+        socketio.sleep(SOCKETIO_METRICAS_INTERVALO)
+        print(json.dumps(metricas_socketio.snapshot(), ensure_ascii=False), flush=True)
+
+
+def iniciar_log_metricas():
+    global metricas_task
+    if SOCKETIO_METRICAS_INTERVALO <= 0:
+        return
+    with metricas_task_lock:
+        if metricas_task is None:
+            metricas_task = socketio.start_background_task(registrar_metricas_periodicamente)
+
 # =========================
 # LOGIN
 # =========================
@@ -101,6 +458,7 @@ login_manager.login_view = "login"
 # =========================
 TEMPO_ESCOLHA = 30  # segundos
 VALOR_PADRAO_JOGO = 7.00
+VALOR_MENSALIDADE = 22.00
 
 
 # ======================================================
@@ -111,7 +469,7 @@ VALOR_PADRAO_JOGO = 7.00
 class ConfiguracaoSemana(db.Model):
     """Configurações específicas para cada semana"""
     id = db.Column(db.Integer, primary_key=True)
-    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id'), nullable=False, unique=True)
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), nullable=False, unique=True)
     max_times = db.Column(db.Integer, default=2)
     max_jogadores_por_time = db.Column(db.Integer, default=6)
     tempo_por_escolha = db.Column(db.Integer, default=30)
@@ -135,7 +493,7 @@ class PixInfo(db.Model):
     
     # NOVOS CAMPOS
     para_todas_semanas = db.Column(db.Boolean, default=True)
-    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id'), nullable=True)
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='SET NULL'), nullable=True)
     
     # RELACIONAMENTO
     semana = db.relationship('Semana', backref='pix_especificos', foreign_keys=[semana_id])
@@ -156,7 +514,7 @@ class Recado(db.Model):
     
     # NOVOS CAMPOS
     para_todas_semanas = db.Column(db.Boolean, default=True)
-    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id'), nullable=True)
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='SET NULL'), nullable=True)
     
     # RELACIONAMENTO
     semana = db.relationship('Semana', backref='recados_especificos', foreign_keys=[semana_id])
@@ -170,7 +528,7 @@ class User(UserMixin, db.Model):
     password = db.Column(db.String(200), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=True)
     role = db.Column(db.String(20), nullable=False, default='jogador')
-    jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id'))
+    jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id', ondelete='CASCADE'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
     foto_perfil = db.Column(db.String(200))
@@ -230,8 +588,8 @@ class Semana(db.Model):
 
 class Confirmacao(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id'), nullable=False)
-    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id'), nullable=False)
+    jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id', ondelete='CASCADE'), nullable=False)
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), nullable=False)
     confirmado = db.Column(db.Boolean, default=False)
     confirmado_em = db.Column(db.DateTime)
     presente = db.Column(db.Boolean, default=False)
@@ -245,7 +603,7 @@ class Confirmacao(db.Model):
 
 class ListaEspera(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id'), nullable=False)
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), nullable=False)
     nome = db.Column(db.String(100), nullable=False)
     telefone = db.Column(db.String(20))
     posicao_preferida = db.Column(db.String(50))
@@ -258,9 +616,9 @@ class ListaEspera(db.Model):
 
 class Time(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id'), nullable=False)
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), nullable=False)
     nome = db.Column(db.String(50))
-    capitao_id = db.Column(db.Integer, db.ForeignKey('jogador.id'))
+    capitao_id = db.Column(db.Integer, db.ForeignKey('jogador.id', ondelete='SET NULL'))
     ordem_escolha = db.Column(db.Integer)
     cor = db.Column(db.String(20), default='#3498db')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -274,9 +632,9 @@ class Time(db.Model):
 
 class EscolhaDraft(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id'), nullable=False)
-    jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id'), nullable=False)
-    time_id = db.Column(db.Integer, db.ForeignKey('time.id'), nullable=False)  # <-- DEVE ter nullable=False
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), nullable=False)
+    jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id', ondelete='CASCADE'), nullable=False)
+    time_id = db.Column(db.Integer, db.ForeignKey('time.id', ondelete='CASCADE'), nullable=False)  # <-- DEVE ter nullable=False
     ordem_escolha = db.Column(db.Integer)
     round_num = db.Column(db.Integer, default=1)
     escolhido_em = db.Column(db.DateTime, default=datetime.utcnow)
@@ -290,8 +648,8 @@ class EscolhaDraft(db.Model):
 
 class DraftStatus(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id'), nullable=False, unique=True)
-    vez_capitao_id = db.Column(db.Integer, db.ForeignKey('jogador.id'))
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), nullable=False, unique=True)
+    vez_capitao_id = db.Column(db.Integer, db.ForeignKey('jogador.id', ondelete='SET NULL'))
     rodada_atual = db.Column(db.Integer, default=1)
     escolha_atual = db.Column(db.Integer, default=1)
     tempo_restante = db.Column(db.Integer, default=TEMPO_ESCOLHA)
@@ -308,9 +666,9 @@ class DraftStatus(db.Model):
 
 class HistoricoDraft(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id'), nullable=False)
-    jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id'), nullable=False)
-    time_id = db.Column(db.Integer, db.ForeignKey('time.id'), nullable=False)
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), nullable=False)
+    jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id', ondelete='CASCADE'), nullable=False)
+    time_id = db.Column(db.Integer, db.ForeignKey('time.id', ondelete='CASCADE'), nullable=False)
     acao = db.Column(db.String(50))
     detalhes = db.Column(db.Text)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -354,8 +712,8 @@ class CicloMensalidade(db.Model):
 class PagamentoCofre(db.Model):
     """Registro de pagamentos no cofrinho por semana"""
     id = db.Column(db.Integer, primary_key=True)
-    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id'), nullable=False)
-    jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id'), nullable=False)
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), nullable=False)
+    jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id', ondelete='CASCADE'), nullable=False)
     valor = db.Column(db.Float, default=07.00)  # Valor padrão por jogo
     pago = db.Column(db.Boolean, default=False)
     pago_em = db.Column(db.DateTime)
@@ -378,7 +736,7 @@ class MovimentoCofre(db.Model):
     tipo = db.Column(db.String(20), nullable=False)  # entrada, saida, ajuste, deposito, retirada
     valor = db.Column(db.Float, nullable=False)
     descricao = db.Column(db.String(200), nullable=False)
-    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id'), nullable=True)  # Pode ser vinculado a uma semana
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), nullable=True)  # Pode ser vinculado a uma semana
     observacao = db.Column(db.Text)
     usuario = db.Column(db.String(100))  # Quem fez a movimentação
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -404,49 +762,393 @@ class MetaCofre(db.Model):
     
     def __repr__(self):
         return f'<MetaCofre {self.titulo} - R${self.valor_meta}>'    
+
+class EstatisticaJogador(db.Model):
+    """Estatísticas agregadas por jogador e temporada, mantidas incrementalmente.
+    
+    Tabela desnormalizada (sem chaves estrangeiras) alimentada por AnaliseSemana;
+    pode ser reconstruída a qualquer momento com reconstruir_analise().
+    """
+    jogador_id = db.Column(db.Integer, primary_key=True)
+    temporada = db.Column(db.Integer, primary_key=True)  # ano
+    jogos = db.Column(db.Integer, default=0)  # semanas em que jogou (time de draft finalizado)
+    escolhas = db.Column(db.Integer, default=0)  # vezes escolhido por um capitão
+    soma_posicao_escolha = db.Column(db.Integer, default=0)
+    vezes_capitao = db.Column(db.Integer, default=0)
+    confirmacoes = db.Column(db.Integer, default=0)
+    confirmacoes_dia = db.Column(db.String(50), default='0,0,0,0,0,0,0')  # segunda..domingo
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @staticmethod
+    def ler_confirmacoes_dia(texto):
+        """Converte o texto 'n,n,...' em lista de segunda (0) a domingo (6)"""
+        valores = [int(v) for v in (texto or '').split(',') if v.strip().lstrip('-').isdigit()]
+        return (valores + [0] * 7)[:7]
+    
+    def get_confirmacoes_dia(self):
+        """Retorna lista com as confirmações de segunda (0) a domingo (6)"""
+        return self.ler_confirmacoes_dia(self.confirmacoes_dia)
+    
+    def __repr__(self):
+        return f'<EstatisticaJogador {self.jogador_id} - {self.temporada}>'
+
+class ParceriaJogadores(db.Model):
+    """Quantas vezes dois jogadores jogaram no mesmo time (matriz simétrica)"""
+    jogador_id = db.Column(db.Integer, primary_key=True)
+    companheiro_id = db.Column(db.Integer, primary_key=True)
+    temporada = db.Column(db.Integer, primary_key=True)
+    jogos = db.Column(db.Integer, default=0)
+    
+    def __repr__(self):
+        return f'<ParceriaJogadores {self.jogador_id}-{self.companheiro_id} ({self.jogos})>'
+
+class AnaliseSemana(db.Model):
+    """Contribuição de cada semana já aplicada às estatísticas.
+    
+    Guardar o que foi aplicado permite atualizar só a diferença quando a
+    semana muda (presença marcada/desmarcada, draft refeito ou finalizado).
+    """
+    semana_id = db.Column(db.Integer, primary_key=True)
+    temporada = db.Column(db.Integer, nullable=False)
+    dia_semana = db.Column(db.Integer, nullable=False)
+    confirmados = db.Column(db.Text, default='')  # ids separados por vírgula
+    escalacao = db.Column(db.Text, default='[]')  # JSON: [[capitao_id, [[jogador_id, posicao_escolha], ...]], ...]
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AnaliseSemana {self.semana_id}>'
+
+class ResultadoTime(db.Model):
+    """Resultado de um time na semana (sets vencidos e perdidos)"""
+    time_id = db.Column(db.Integer, db.ForeignKey('time.id', ondelete='CASCADE'), primary_key=True)
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), nullable=False, index=True)
+    vitorias = db.Column(db.Integer, default=0)
+    derrotas = db.Column(db.Integer, default=0)
+    registrado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    time = db.relationship('Time')
+    
+    def __repr__(self):
+        return f'<ResultadoTime {self.time_id}: {self.vitorias}x{self.derrotas}>'
+
+class HistoricoRating(db.Model):
+    """Variação do rating de cada jogador em cada semana com resultado"""
+    id = db.Column(db.Integer, primary_key=True)
+    jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id', ondelete='CASCADE'), nullable=False, index=True)
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), nullable=False, index=True)
+    time_id = db.Column(db.Integer)
+    rating_anterior = db.Column(db.Integer, nullable=False)
+    rating_novo = db.Column(db.Integer, nullable=False)
+    variacao = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<HistoricoRating {self.jogador_id} - Semana {self.semana_id}: {self.variacao:+d}>'
+
+class SorteioCapitaes(db.Model):
+    """Registro de cada sorteio automático de capitães (auditoria e reprodução)"""
+    id = db.Column(db.Integer, primary_key=True)
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), nullable=False, index=True)
+    semente = db.Column(db.String(64), nullable=False)
+    candidatos = db.Column(db.Text, nullable=False)  # JSON: [[jogador_id, pontuacao], ...] na ordem usada
+    capitaes = db.Column(db.Text, nullable=False)  # JSON: [jogador_id, ...] na ordem dos times
+    quantidade = db.Column(db.Integer, nullable=False)
+    realizado_por = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'))
+    realizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SorteioCapitaes {self.id} - Semana {self.semana_id}>'
+
+class ExecucaoTarefa(db.Model):
+    """Estado de cada tarefa agendada: última execução e próxima prevista"""
+    nome = db.Column(db.String(50), primary_key=True)
+    ultima_execucao_em = db.Column(db.DateTime)
+    duracao_ms = db.Column(db.Integer)
+    linhas_afetadas = db.Column(db.Integer)
+    sucesso = db.Column(db.Boolean)
+    mensagem = db.Column(db.String(300))
+    proxima_execucao_em = db.Column(db.DateTime)
+    execucoes = db.Column(db.Integer, default=0)
+    
+    def __repr__(self):
+        return f'<ExecucaoTarefa {self.nome}>'
+
+class VersaoTabela(db.Model):
+    """Contador de alterações de cada tabela, incrementado na mesma transação que a altera"""
+    tabela = db.Column(db.String(64), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<VersaoTabela {self.tabela} v{self.versao}>'
+
+class LiderAgendador(db.Model):
+    """Linha única com o processo que detém a vez de rodar as tarefas agendadas"""
+    id = db.Column(db.Integer, primary_key=True)
+    dono = db.Column(db.String(64), nullable=False)
+    expira_em = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<LiderAgendador {self.dono}>'
+
+class ArquivoSemana(db.Model):
+    """Dados de uma semana antiga retirados das tabelas do dia a dia, com o resumo para relatórios"""
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), primary_key=True)
+    temporada = db.Column(db.Integer, nullable=False, index=True)
+    dados = db.Column(db.LargeBinary, nullable=False)  # zlib(JSON {tabela: {'colunas': [...], 'linhas': [[...], ...]}})
+    confirmados = db.Column(db.Integer, default=0)
+    escolhas = db.Column(db.Integer, default=0)
+    pagamentos = db.Column(db.Integer, default=0)
+    valor_pago = db.Column(db.Float, default=0)
+    pagamentos_metodo = db.Column(db.Text, default='{}')  # JSON: {metodo: [quantidade, valor]} dos pagos
+    saldo_movimentos = db.Column(db.Float, default=0)  # créditos - débitos do cofre ligados à semana
+    ultimo_movimento_em = db.Column(db.DateTime)
+    arquivado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ArquivoSemana {self.semana_id}>'
+
+class ArquivoJogador(db.Model):
+    """Índice dos jogadores com linhas no arquivo de cada semana (consultas sem descomprimir)"""
+    semana_id = db.Column(db.Integer, db.ForeignKey('semana.id', ondelete='CASCADE'), primary_key=True)
+    jogador_id = db.Column(db.Integer, db.ForeignKey('jogador.id', ondelete='CASCADE'), primary_key=True, index=True)
+    
+    def __repr__(self):
+        return f'<ArquivoJogador {self.semana_id}/{self.jogador_id}>'
    
 
 # ======================================================
-# FUNÇÕES AUXILIARES
+# EXCLUSÃO EM CASCATA
 # ======================================================
+# Regras de cada tabela raiz: (dependente, coluna que aponta para a raiz, ação).
+# 'cascata' exclui a dependente aplicando as regras dela, 'excluir' apaga as
+# linhas e 'anular' zera a referência. O plano sai dos filhos para os pais,
+# respeitando as chaves estrangeiras. As FKs declaram o mesmo ON DELETE
+# (CASCADE/SET NULL), mas só valem em bancos criados depois e, no SQLite,
+# com PRAGMA foreign_keys; o plano continua sendo quem garante a integridade.
+REGRAS_EXCLUSAO = {
+    Semana: [
+        (Time, Time.semana_id, 'cascata'),
+        (ResultadoTime, ResultadoTime.semana_id, 'excluir'),
+        (HistoricoRating, HistoricoRating.semana_id, 'excluir'),
+        (SorteioCapitaes, SorteioCapitaes.semana_id, 'excluir'),
+        (HistoricoDraft, HistoricoDraft.semana_id, 'excluir'),
+        (EscolhaDraft, EscolhaDraft.semana_id, 'excluir'),
+        (PagamentoCofre, PagamentoCofre.semana_id, 'excluir'),
+        (MovimentoCofre, MovimentoCofre.semana_id, 'excluir'),
+        (DraftStatus, DraftStatus.semana_id, 'excluir'),
+        (Confirmacao, Confirmacao.semana_id, 'excluir'),
+        (ListaEspera, ListaEspera.semana_id, 'excluir'),
+        (ConfiguracaoSemana, ConfiguracaoSemana.semana_id, 'excluir'),
+        (ArquivoJogador, ArquivoJogador.semana_id, 'excluir'),
+        (ArquivoSemana, ArquivoSemana.semana_id, 'excluir'),
+        (PixInfo, PixInfo.semana_id, 'anular'),
+        (Recado, Recado.semana_id, 'anular'),
+    ],
+    Time: [
+        (ResultadoTime, ResultadoTime.time_id, 'excluir'),
+        (HistoricoDraft, HistoricoDraft.time_id, 'excluir'),
+        (EscolhaDraft, EscolhaDraft.time_id, 'excluir'),
+    ],
+    Jogador: [
+        (User, User.jogador_id, 'cascata'),
+        (PagamentoCofre, PagamentoCofre.jogador_id, 'excluir'),
+        (Confirmacao, Confirmacao.jogador_id, 'excluir'),
+        (EscolhaDraft, EscolhaDraft.jogador_id, 'excluir'),
+        (HistoricoDraft, HistoricoDraft.jogador_id, 'excluir'),
+        (HistoricoRating, HistoricoRating.jogador_id, 'excluir'),
+        (ArquivoJogador, ArquivoJogador.jogador_id, 'excluir'),
+        (Time, Time.capitao_id, 'anular'),
+        (DraftStatus, DraftStatus.vez_capitao_id, 'anular'),
+    ],
+    User: [
+        (SorteioCapitaes, SorteioCapitaes.realizado_por, 'anular'),
+    ],
+}
+TAMANHO_LOTE_EXCLUSAO = 500  # ids por comando (limite de parâmetros do SQLite)
+
+def _lotes(ids):
+    ids = sorted(ids)
+    for i in range(0, len(ids), TAMANHO_LOTE_EXCLUSAO):
+        yield ids[i:i + TAMANHO_LOTE_EXCLUSAO]
+
+def planejar_exclusao(modelo, ids, manter_raiz=False):
+    """Passos [(modelo, coluna, ação, ids)] para excluir as linhas e tudo que depende delas"""
+    passos = []
+    for dependente, coluna, acao in REGRAS_EXCLUSAO.get(modelo, ()):
+        if acao != 'cascata':
+            passos.append((dependente, coluna, acao, ids))
+            continue
+        filhos = set()
+        for lote in _lotes(ids):
+            filhos.update(id for (id,) in db.session.query(dependente.id).filter(coluna.in_(lote)))
+        if filhos:
+            passos.extend(planejar_exclusao(dependente, filhos))
+    if not manter_raiz:
+        passos.append((modelo, modelo.id, 'excluir', ids))
+    return passos
+
+def excluir_em_cascata(modelo, ids, simular=False, manter_raiz=False):
+    """Executa o plano de exclusão em lote, sem commit; com simular=True só conta.
+
+    O número de comandos depende das regras e do tamanho dos lotes, não da
+    quantidade de linhas. Retorna {tabela (ou tabela.coluna anulada): linhas}.
+    """
+    ids = set(ids)
+    if not ids:
+        return {}
+    
+    linhas = Counter()
+    ja_excluidas = {}  # tabela -> filtros já aplicados (para a simulação não contar duas vezes)
+    for dependente, coluna, acao, alvo in planejar_exclusao(modelo, ids, manter_raiz):
+        tabela = dependente.__tablename__
+        chave = tabela if acao == 'excluir' else f'{tabela}.{coluna.key} (anulado)'
+        anteriores = ja_excluidas.setdefault(tabela, [])
+        for lote in _lotes(alvo):
+            filtro = coluna.in_(lote)
+            if simular:
+                consulta = db.session.query(func.count()).select_from(dependente).filter(filtro)
+                if anteriores:
+                    consulta = consulta.filter(~or_(*anteriores))
+                linhas[chave] += consulta.scalar()
+            elif acao == 'excluir':
+                linhas[chave] += dependente.query.filter(filtro).delete(synchronize_session=False)
+            else:
+                linhas[chave] += dependente.query.filter(filtro).update(
+                    {coluna.key: None}, synchronize_session=False
+                )
+            if acao == 'excluir':
+                anteriores.append(filtro)
+    return {chave: quantidade for chave, quantidade in linhas.items() if quantidade}
+
+def descrever_exclusao(linhas):
+    """Resumo legível das linhas afetadas por tabela"""
+    if not linhas:
+        return 'nenhuma linha'
+    return ', '.join(f'{tabela}: {quantidade}' for tabela, quantidade in sorted(linhas.items()))
+
+def _inicio_recalculo_ratings(*condicoes):
+    """Data da semana mais antiga com resultado afetado (None se não há resultados)"""
+    return db.session.query(func.min(Semana.data)).join(
+        ResultadoTime, ResultadoTime.semana_id == Semana.id
+    ).filter(*condicoes).scalar()
+
+def _retirar_resultados(coluna, ids):
+    """Apaga os resultados ligados aos ids e refaz os ratings a partir do mais antigo.
+
+    Roda antes do resto da exclusão: o recálculo parte do histórico anterior
+    aos resultados, que ainda precisa existir. Retorna (linhas apagadas, data).
+    """
+    desde = None
+    for lote in _lotes(ids):
+        data = _inicio_recalculo_ratings(coluna.in_(lote))
+        desde = min(filter(None, (desde, data)), default=None)
+    if not desde:
+        return 0, None
+    
+    apagados = 0
+    for lote in _lotes(ids):
+        apagados += ResultadoTime.query.filter(coluna.in_(lote)).delete(synchronize_session=False)
+    # Reaplica as semanas seguintes sem os resultados excluídos
+    recalcular_ratings(desde)
+    return apagados, desde
+
+def excluir_semanas(semanas_ids, simular=False, manter_semanas=False):
+    """Exclui semanas (ou só os dados delas, com manter_semanas) e tudo que depende delas"""
+    semanas_ids = set(semanas_ids)
+    if simular:
+        return excluir_em_cascata(Semana, semanas_ids, simular=True, manter_raiz=manter_semanas)
+    
+    # O histórico de rating dessas semanas some no recálculo; conta antes para o relatório
+    historico = sum(
+        HistoricoRating.query.filter(HistoricoRating.semana_id.in_(lote)).count()
+        for lote in _lotes(semanas_ids)
+    )
+    resultados, desde = _retirar_resultados(ResultadoTime.semana_id, semanas_ids)
+    
+    linhas = Counter(excluir_em_cascata(Semana, semanas_ids, manter_raiz=manter_semanas))
+    if desde:
+        linhas['resultado_time'] += resultados
+        linhas['historico_rating'] = historico
+    
+    for semana_id in semanas_ids:
+        marcar_semana_analise(semana_id)
+    return {chave: quantidade for chave, quantidade in linhas.items() if quantidade}
+
+def excluir_times(times_ids, simular=False):
+    """Exclui times e suas escolhas, histórico e resultados; ajusta capitães e drafts"""
+    times = db.session.query(Time.id, Time.semana_id, Time.capitao_id).filter(
+        Time.id.in_(list(times_ids))
+    ).all()
+    if not times:
+        return {}
+    ids = {id for id, _, _ in times}
+    semanas_ids = {semana_id for _, semana_id, _ in times if semana_id}
+    capitaes_ids = {capitao_id for _, _, capitao_id in times if capitao_id}
+    if simular:
+        return excluir_em_cascata(Time, ids, simular=True)
+    
+    resultados, _ = _retirar_resultados(ResultadoTime.time_id, ids)
+    linhas = Counter(excluir_em_cascata(Time, ids))
+    linhas['resultado_time'] += resultados
+    linhas = {chave: quantidade for chave, quantidade in linhas.items() if quantidade}
+    
+    for semana_id in semanas_ids:
+        marcar_semana_analise(semana_id)
+    
+    # Quem não é mais capitão de nenhum time perde o status
+    if capitaes_ids:
+        sem_time = [
+            Jogador.id.in_(capitaes_ids),
+            ~db.session.query(Time).filter(Time.capitao_id == Jogador.id).exists()
+        ]
+        ex_capitaes = [id for (id,) in db.session.query(Jogador.id).filter(Jogador.capitao == True, *sem_time)]
+        if ex_capitaes:
+            Jogador.query.filter(Jogador.id.in_(ex_capitaes)).update({'capitao': False}, synchronize_session=False)
+            User.query.filter(User.jogador_id.in_(ex_capitaes), User.role == 'capitao').update(
+                {'role': 'jogador'}, synchronize_session=False
+            )
+    
+    # Drafts em andamento cuja vez era de um capitão removido
+    for semana in Semana.query.filter(Semana.id.in_(semanas_ids), Semana.draft_em_andamento == True):
+        draft_status = DraftStatus.query.filter_by(semana_id=semana.id).first()
+        if not draft_status or (draft_status.vez_capitao_id and draft_status.vez_capitao_id not in capitaes_ids):
+            continue
+        primeiro = Time.query.filter_by(semana_id=semana.id).order_by(Time.ordem_escolha).first()
+        if primeiro:
+            draft_status.vez_capitao_id = primeiro.capitao_id
+            print(f"   ✅ Vez do capitão ajustada para novo time")
+        else:
+            # Se não há mais times, finalizar draft
+            draft_status.finalizado = True
+            semana.draft_em_andamento = False
+            semana.draft_finalizado = True
+            print(f"   ✅ Draft finalizado (último time removido)")
+    return linhas
+
+def excluir_jogadores(jogadores_ids, simular=False):
+    """Exclui jogadores, o usuário vinculado e todo o histórico deles"""
+    jogadores_ids = set(jogadores_ids)
+    if simular:
+        return excluir_em_cascata(Jogador, jogadores_ids, simular=True)
+    
+    # Fotos dos jogadores e dos usuários que saem junto com eles
+    fotos = {foto for (foto,) in db.session.query(Jogador.foto_perfil).filter(
+        Jogador.id.in_(jogadores_ids), Jogador.foto_perfil.isnot(None)
+    )}
+    fotos.update(foto for (foto,) in db.session.query(User.foto_perfil).filter(
+        User.jogador_id.in_(jogadores_ids), User.foto_perfil.isnot(None)
+    ))
+    linhas = excluir_em_cascata(Jogador, jogadores_ids)
+    
+    # Os arquivos só são apagados depois do commit de quem chamou
+    agendar_remocao_fotos(fotos - fotos_em_uso(fotos))
+    return linhas
+
 def excluir_semana_seguro(semana_id):
-    """Exclui uma semana e todas as suas dependências de forma segura"""
+    """Exclui todas as dependências de uma semana (a semana em si fica com quem chamou)"""
     try:
-        print(f"🔧 Excluindo semana {semana_id} e suas dependências...")
-        
-        # 1. Tabelas que dependem de Time (mas referenciam semana)
-        HistoricoDraft.query.filter_by(semana_id=semana_id).delete()
-        print(f"   ✅ HistoricoDraft excluído")
-        
-        EscolhaDraft.query.filter_by(semana_id=semana_id).delete()
-        print(f"   ✅ EscolhaDraft excluído")
-        
-        # 2. Pagamentos do cofre (se existirem)
-        PagamentoCofre.query.filter_by(semana_id=semana_id).delete()
-        print(f"   ✅ PagamentoCofre excluído")
-        
-        MovimentoCofre.query.filter_by(semana_id=semana_id).delete()
-        print(f"   ✅ MovimentoCofre excluído")
-        
-        # 3. Times (depois de excluir suas dependências acima)
-        Time.query.filter_by(semana_id=semana_id).delete()
-        print(f"   ✅ Times excluídos")
-        
-        # 4. Outras dependências diretas da semana
-        DraftStatus.query.filter_by(semana_id=semana_id).delete()
-        print(f"   ✅ DraftStatus excluído")
-        
-        Confirmacao.query.filter_by(semana_id=semana_id).delete()
-        print(f"   ✅ Confirmacao excluído")
-        
-        ListaEspera.query.filter_by(semana_id=semana_id).delete()
-        print(f"   ✅ ListaEspera excluído")
-        
-        # 5. Configurações específicas da semana (se existirem)
-        ConfiguracaoSemana.query.filter_by(semana_id=semana_id).delete()
-        print(f"   ✅ ConfiguracaoSemana excluído")
-        
-        print(f"✅ Todas dependências da semana {semana_id} excluídas com sucesso")
+        linhas = excluir_semanas([semana_id], manter_semanas=True)
+        print(f"🔧 Semana {semana_id}: dependências excluídas ({descrever_exclusao(linhas)})")
         return True
         
     except Exception as e:
@@ -458,63 +1160,11 @@ def excluir_semana_seguro(semana_id):
 def excluir_time_seguro(time_id):
     """Exclui um time e suas dependências de forma segura"""
     try:
-        print(f"🔧 Excluindo time {time_id} e suas dependências...")
-        
-        # Buscar informações do time antes de excluir
-        time = Time.query.get(time_id)
-        if not time:
+        linhas = excluir_times([time_id])
+        if not linhas:
             print(f"❌ Time {time_id} não encontrado")
             return False
-        
-        semana_id = time.semana_id
-        capitao_id = time.capitao_id
-        
-        # 1. Excluir dependências do time
-        HistoricoDraft.query.filter_by(time_id=time_id).delete()
-        print(f"   ✅ HistoricoDraft do time excluído")
-        
-        EscolhaDraft.query.filter_by(time_id=time_id).delete()
-        print(f"   ✅ EscolhaDraft do time excluído")
-        
-        # 2. Remover status de capitão se necessário
-        if capitao_id:
-            capitao = Jogador.query.get(capitao_id)
-            if capitao and capitao.capitao:
-                # Verificar se é capitão em outros times
-                outros_times = Time.query.filter(
-                    Time.capitao_id == capitao_id,
-                    Time.id != time_id
-                ).count()
-                
-                if outros_times == 0:
-                    capitao.capitao = False
-                    if capitao.user and capitao.user.role == 'capitao':
-                        capitao.user.role = 'jogador'
-                    print(f"   ✅ Status de capitão removido do jogador {capitao.nome}")
-        
-        # 3. Excluir o time
-        db.session.delete(time)
-        print(f"   ✅ Time {time_id} excluído")
-        
-        # 4. Se draft está em andamento, ajustar status
-        if semana_id:
-            semana = Semana.query.get(semana_id)
-            if semana and semana.draft_em_andamento:
-                draft_status = DraftStatus.query.filter_by(semana_id=semana_id).first()
-                if draft_status and draft_status.vez_capitao_id == capitao_id:
-                    # Encontrar próximo time
-                    times_restantes = Time.query.filter_by(semana_id=semana_id).order_by(Time.ordem_escolha).all()
-                    if times_restantes:
-                        draft_status.vez_capitao_id = times_restantes[0].capitao_id
-                        print(f"   ✅ Vez do capitão ajustada para novo time")
-                    else:
-                        # Se não há mais times, finalizar draft
-                        draft_status.finalizado = True
-                        semana.draft_em_andamento = False
-                        semana.draft_finalizado = True
-                        print(f"   ✅ Draft finalizado (último time removido)")
-        
-        print(f"✅ Time {time_id} e dependências excluídos com sucesso")
+        print(f"✅ Time {time_id} e dependências excluídos ({descrever_exclusao(linhas)})")
         return True
         
     except Exception as e:
@@ -523,6 +1173,11 @@ def excluir_time_seguro(time_id):
         traceback.print_exc()
         return False
 
+
+# ======================================================
+# FUNÇÕES AUXILIARES
+# ======================================================
+
 def get_dia_semana_curto(numero_dia):
     """Retorna o nome curto do dia da semana"""
     dias_curto = [
@@ -554,18 +1209,20 @@ def verificar_dependencias_jogador(jogador_id):
     if escolhas > 0:
         dependencias.append(f"{escolhas} escolha(s) em drafts")
     
+    # Verifica histórico em semanas arquivadas
+    arquivadas = ArquivoJogador.query.filter_by(jogador_id=jogador_id).count()
+    if arquivadas > 0:
+        dependencias.append(f"histórico em {arquivadas} semana(s) arquivada(s)")
+    
     return dependencias
 
 def obter_ciclo_sistema_ativo():
     """Obtém o ciclo ativo do sistema (configuração de ciclos)"""
-    # Busca o ciclo ativo na tabela CicloMensalidade
-    ciclo_ativo = CicloMensalidade.query.filter_by(ativo=True).first()
-    
-    if ciclo_ativo:
-        return ciclo_ativo.data_inicio, ciclo_ativo.data_fim, True
-    else:
-        # Se não há ciclo ativo, retorna None
-        return None, None, False
+    ciclo_inicio, ciclo_fim, origem = obter_ciclo_vigente()
+    if origem == 'tabela':
+        return ciclo_inicio, ciclo_fim, True
+    # Se não há ciclo ativo na tabela, retorna None
+    return None, None, False
 
 def sincronizar_capitao_permissao(jogador_id):
     """Sincroniza permissões de capitão entre Jogador e User"""
@@ -620,79 +1277,136 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def criar_semanas_automaticas():
-    """Cria semanas automaticamente baseado nos dias fixos configurados e ciclo ativo"""
+# Dependências que impedem remover uma semana no calendário (dados reais de jogo)
+DEPENDENCIAS_SEMANA = (Confirmacao, ListaEspera, Time, EscolhaDraft, HistoricoDraft,
+                       PagamentoCofre, MovimentoCofre, SorteioCapitaes, ResultadoTime,
+                       HistoricoRating, PixInfo, Recado)
+
+def datas_de_jogo(inicio, fim, dias_semana):
+    """Datas entre inicio e fim (inclusive) que caem nos dias da semana dados"""
+    datas = []
+    for dia in set(dias_semana):
+        data = inicio + timedelta(days=(dia - inicio.weekday()) % 7)
+        while data <= fim:
+            datas.append(data)
+            data += timedelta(days=7)
+    return sorted(datas)
+
+def periodo_calendario(hoje=None):
+    """(inicio, fim, dias_semana) do calendário a gerar, ou None se não há o que gerar.
+
+    Com ciclo ativo vai de hoje (ou do início do ciclo) até o fim do ciclo;
+    sem ciclo, cobre os próximos 30 dias.
+    """
+    hoje = hoje or date.today()
     config_global = ConfiguracaoGlobal.query.first()
     if not config_global:
-        return
+        print("⚠️ Configuração global não encontrada")
+        return None
     
-    hoje = date.today()
+    dias_semana = config_global.get_dias_semana() if config_global.dias_semana_fixos else []
+    if not dias_semana:
+        print("⚠️ Nenhum dia da semana configurado. Configure os dias em /admin/configuracoes")
+        return None
     
-    # Busca o ciclo ativo do sistema
     ciclo_inicio, ciclo_fim, ciclo_existe = obter_ciclo_sistema_ativo()
+    if ciclo_existe and ciclo_inicio and ciclo_fim:
+        inicio = max(hoje, ciclo_inicio)
+        if inicio > ciclo_fim:
+            print(f"⚠️ Ciclo já terminou: {format_date_func(ciclo_fim)}")
+            return None
+        return inicio, ciclo_fim, dias_semana
+    return hoje, hoje + timedelta(days=30), dias_semana
+
+def filtro_semanas_vazias():
+    """Condições de semana sem draft e sem nenhum dado de jogo vinculado"""
+    condicoes = [
+        or_(Semana.draft_em_andamento == False, Semana.draft_em_andamento.is_(None)),
+        or_(Semana.draft_finalizado == False, Semana.draft_finalizado.is_(None))
+    ]
+    for modelo in DEPENDENCIAS_SEMANA:
+        condicoes.append(~db.session.query(modelo).filter(modelo.semana_id == Semana.id).exists())
+    return condicoes
+
+def remover_semanas_vazias(*condicoes):
+    """Remove em lote as semanas vazias que atendem às condições (sem commit)"""
+    ids = [id for (id,) in db.session.query(Semana.id).filter(*condicoes, *filtro_semanas_vazias())]
+    if not ids:
+        return 0
+    DraftStatus.query.filter(DraftStatus.semana_id.in_(ids)).delete(synchronize_session=False)
+    ConfiguracaoSemana.query.filter(ConfiguracaoSemana.semana_id.in_(ids)).delete(synchronize_session=False)
+    # Semana vazia não contribui para as estatísticas: basta apagar o registro aplicado
+    AnaliseSemana.query.filter(AnaliseSemana.semana_id.in_(ids)).delete(synchronize_session=False)
+    return Semana.query.filter(Semana.id.in_(ids)).delete(synchronize_session=False)
+
+def sincronizar_calendario(inicio, fim, dias_semana, remover=False, hoje=None):
+    """Deixa o calendário de inicio a fim igual às datas de jogo, numa transação.
+
+    Insere de uma vez as datas que faltam e, com remover=True, apaga as
+    semanas vazias a partir de hoje que não são dia de jogo no período ou
+    ficam depois do fim. Retorna (criadas, removidas).
+    """
+    hoje = hoje or date.today()
+    alvo = datas_de_jogo(inicio, fim, dias_semana)
     
-    # Dias da semana configurados
-    dias_semana = []
-    if config_global.dias_semana_fixos:
-        dias_semana = config_global.get_dias_semana()
-    else:
-        # Se não houver dias configurados, não cria semanas
-        print("⚠️ Nenhum dia da semana configurado. Configure os dias em /admin/configuracoes")
-        return
+    removidas = 0
+    if remover:
+        removidas = remover_semanas_vazias(
+            Semana.data >= hoje,
+            or_(Semana.data > fim, Semana.data.notin_(alvo)) if alvo else true()
+        )
     
-    if not dias_semana:
-        print("⚠️ Nenhum dia da semana selecionado.")
-        return
+    existentes = {data for (data,) in db.session.query(Semana.data).filter(
+        Semana.data >= inicio,
+        Semana.data <= fim
+    )}
+    novas = [{
+        'data': data,
+        'descricao': f'Jogo de Vôlei - {data.strftime("%d/%m/%Y")}',
+        'lista_aberta': True,
+        'max_times': 2,
+        'max_jogadores_por_time': 6
+    } for data in alvo if data not in existentes]
+    if novas:
+        db.session.execute(insert(Semana), novas)
     
-    # Determina até quando criar semanas
-    if ciclo_existe and ciclo_inicio and ciclo_fim:
-        # Se há ciclo ativo, cria semanas apenas dentro do ciclo
-        data_limite = ciclo_fim
-        print(f"✅ Usando ciclo ativo: criando semanas de {ciclo_inicio.strftime('%d/%m/%Y')} a {data_limite.strftime('%d/%m/%Y')}")
-        
-        # Ajusta o início para hoje ou início do ciclo (o que for maior)
-        data_inicio_criacao = max(hoje, ciclo_inicio)
-    else:
-        # Se não há ciclo ativo, usa os próximos 30 dias (comportamento padrão)
-        data_inicio_criacao = hoje
-        data_limite = hoje + timedelta(days=30)
-        print(f"✅ Sem ciclo ativo: criando semanas para os próximos 30 dias")
-    
-    semanas_criadas = 0
-    data_atual = data_inicio_criacao
-    
-    print(f"📅 Período de criação: {data_atual.strftime('%d/%m/%Y')} até {data_limite.strftime('%d/%m/%Y')}")
-    print(f"🎯 Dias de jogo configurados: {', '.join([get_dia_semana_curto(d) for d in dias_semana])}")
-    
-    # Cria semanas até a data limite
-    while data_atual <= data_limite:
-        if data_atual.weekday() in dias_semana:
-            semana_existente = Semana.query.filter_by(data=data_atual).first()
-            if not semana_existente:
-                semana = Semana(
-                    data=data_atual,
-                    descricao=f'Jogo de Vôlei - {data_atual.strftime("%d/%m/%Y")}',
-                    lista_aberta=True,
-                    max_times=2,
-                    max_jogadores_por_time=6
-                )
-                db.session.add(semana)
-                semanas_criadas += 1
-                print(f"  ➕ Semana criada para {data_atual.strftime('%d/%m/%Y')} ({get_dia_semana_curto(data_atual.weekday())})")
-        
-        data_atual += timedelta(days=1)
+    db.session.commit()
+    return len(novas), removidas
+
+def sincronizar_semanas_automaticas():
+    """Cria as semanas do período configurado; desfaz a transação e propaga erros"""
+    periodo = periodo_calendario()
+    if not periodo:
+        return 0
+    inicio, fim, dias_semana = periodo
+    
+    print(f"📅 Período de criação: {format_date_func(inicio)} até {format_date_func(fim)}")
+    print(f"🎯 Dias de jogo configurados: {', '.join([get_dia_semana_curto(d) for d in sorted(dias_semana)])}")
     
     try:
-        db.session.commit()
-        if semanas_criadas > 0:
-            print(f"✅ {semanas_criadas} semanas criadas automaticamente")
-        else:
-            print("ℹ️ Nenhuma semana nova criada")
-    except Exception as e:
+        try:
+            semanas_criadas, _ = sincronizar_calendario(inicio, fim, dias_semana)
+        except IntegrityError:
+            # Outro processo criou parte das datas ao mesmo tempo: refaz com o estado atual
+            db.session.rollback()
+            semanas_criadas, _ = sincronizar_calendario(inicio, fim, dias_semana)
+    except Exception:
         db.session.rollback()
-        print(f"❌ Erro ao criar semanas: {e}")
+        raise
     
+    if semanas_criadas > 0:
+        print(f"✅ {semanas_criadas} semanas criadas automaticamente")
+    else:
+        print("ℹ️ Nenhuma semana nova criada (todas já existiam)")
     return semanas_criadas
+
+def criar_semanas_automaticas():
+    """Cria semanas automaticamente baseado nos dias fixos configurados e ciclo ativo"""
+    try:
+        return sincronizar_semanas_automaticas()
+    except Exception as e:
+        print(f"❌ Erro ao criar semanas: {e}")
+        return 0
     
 @app.route('/admin/limpar_semanas_fora_ciclo')
 @admin_required
@@ -707,35 +1421,16 @@ def limpar_semanas_fora_ciclo():
     
     print(f"🔍 Buscando semanas após o fim do ciclo ({format_date_func(ciclo_fim)})...")
     
-    # Busca semanas criadas após o fim do ciclo
-    semanas_fora_ciclo = Semana.query.filter(
-        Semana.data > ciclo_fim
-    ).order_by(Semana.data).all()
-    
-    if not semanas_fora_ciclo:
+    if not Semana.query.filter(Semana.data > ciclo_fim).first():
         flash(f'Não há semanas após o fim do ciclo atual ({format_date_func(ciclo_fim)})!', 'info')
         return redirect(url_for('admin_configuracoes'))
     
-    # Remove semanas fora do ciclo usando a função segura
-    removidas = 0
-    for semana in semanas_fora_ciclo:
-        try:
-            # Impede remoção de semanas com draft finalizado que já aconteceram
-            if semana.draft_finalizado and semana.data < date.today():
-                print(f"⚠️ Mantida semana de {format_date_func(semana.data)} (draft finalizado no passado)")
-                continue
-            
-            # Usa função de limpeza segura
-            if limpar_semana_completa(semana.id):
-                # Remove a semana
-                db.session.delete(semana)
-                removidas += 1
-                print(f"🗑️ Removida semana de {format_date_func(semana.data)} (fora do ciclo)")
-        except Exception as e:
-            print(f"⚠️ Erro ao remover semana {semana.id}: {e}")
+    # Remove de uma vez as semanas vazias; as que já têm confirmações, times ou draft ficam
+    removidas = remover_semanas_vazias(Semana.data > ciclo_fim)
+    db.session.commit()
     
     if removidas > 0:
-        db.session.commit()
+        print(f"🗑️ {removidas} semana(s) removida(s) após o fim do ciclo")
         flash(f'{removidas} semana(s) removida(s) por estarem após o fim do ciclo!', 'success')
     else:
         flash('Nenhuma semana removida.', 'info')
@@ -802,29 +1497,129 @@ def get_semana_atual():
         db.session.rollback()
         return Semana.query.filter_by(data=hoje).first()
 
-def atualizar_mensalidades_periodo(data_inicio, data_fim):
+def atualizar_mensalidades_periodo(data_inicio, data_fim, simular=False):
     """Atualiza período da mensalidade para todos os mensalistas"""
-    mensalistas = Jogador.query.filter_by(mensalista=True, ativo=True).all()
-    
-    for jogador in mensalistas:
-        jogador.data_inicio_mensalidade = data_inicio
-        jogador.data_fim_mensalidade = data_fim
-    
-    db.session.commit()
-    return len(mensalistas)
+    resultado = atualizar_jogadores_em_lote(
+        [Jogador.mensalista == True, Jogador.ativo == True],
+        {'data_inicio_mensalidade': data_inicio, 'data_fim_mensalidade': data_fim},
+        simular
+    )
+    if not simular:
+        db.session.commit()
+    return resultado
+
+# ======================================================
+# TRANSMISSÃO DO DRAFT (SALAS POR AUDIÊNCIA)
+# ======================================================
+# Eventos enviados em sequência dentro desta janela (segundos) saem num
+# único frame 'draft_lote'; 0 envia imediatamente
+JANELA_COALESCENCIA = float(os.getenv("DRAFT_JANELA_COALESCENCIA", "0.05"))
+
+SALAS_AUDIENCIA = {
+    'capitao': 'draft_{}',
+    'publico': 'draft_public_{}',
+    'admin': 'draft_admin_{}',
+}
+
+# Eventos que descrevem o estado completo: só o mais recente importa
+EVENTOS_DE_ESTADO = {'draft_status_update', 'draft_status_public'}
+
+
+class TransmissorDraft:
+    """Agrupa os eventos do draft por semana e audiência antes de emitir.
+
+    Cada evento é serializado uma única vez por grupo de salas que recebe a
+    mesma sequência (capitães e admin costumam compartilhar o frame), e o
+    pacote codificado é reaproveitado para todos os sockets dessas salas.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.pendentes = {}
+        self.agendados = set()
+        self.sequencias = {}
+
+    def sequencia(self, semana_id):
+        """Contador de eventos da semana; muda a cada envio"""
+        return self.sequencias.get(semana_id, 0)
+
+    def enviar(self, semana_id, evento, dados, audiencias=('capitao', 'admin')):
+        audiencias = tuple(audiencias)
+        with self.lock:
+            self.sequencias[semana_id] = self.sequencias.get(semana_id, 0) + 1
+            fila = self.pendentes.setdefault(semana_id, [])
+            if evento in EVENTOS_DE_ESTADO:
+                fila[:] = [
+                    item for item in fila
+                    if not (item[1] == evento and item[0] == audiencias)
+                ]
+            fila.append((audiencias, evento, dados))
+            agendar = semana_id not in self.agendados
+            self.agendados.add(semana_id)
+
+        if not agendar:
+            return
+        if JANELA_COALESCENCIA <= 0:
+            self.descarregar(semana_id)
+        else:
+            socketio.start_background_task(self._descarregar_apos_janela, semana_id)
+
+    def _descarregar_apos_janela(self, semana_id):
+        socketio.sleep(JANELA_COALESCENCIA)
+        self.descarregar(semana_id)
+
+    def descarregar(self, semana_id):
+        """Emite tudo o que estiver pendente para a semana"""
+        with self.lock:
+            fila = self.pendentes.pop(semana_id, [])
+            self.agendados.discard(semana_id)
+        if not fila:
+            return
+
+        # Sequência de eventos (índices da fila) que cada audiência recebe
+        sequencias = {}
+        for indice, (audiencias, _, _) in enumerate(fila):
+            for audiencia in audiencias:
+                sequencias.setdefault(audiencia, []).append(indice)
+
+        # Audiências com a mesma sequência recebem o mesmo frame
+        grupos = {}
+        for audiencia, indices in sequencias.items():
+            grupos.setdefault(tuple(indices), []).append(
+                SALAS_AUDIENCIA[audiencia].format(semana_id)
+            )
+
+        for indices, salas in grupos.items():
+            try:
+                if len(indices) == 1:
+                    _, evento, dados = fila[indices[0]]
+                    socketio.emit(evento, dados, to=salas)
+                else:
+                    socketio.emit('draft_lote', {
+                        'semana_id': semana_id,
+                        'eventos': [
+                            {'evento': fila[i][1], 'dados': fila[i][2]}
+                            for i in indices
+                        ]
+                    }, to=salas)
+            except Exception as e:
+                print(f"❌ Erro ao transmitir draft {semana_id} para {salas}: {e}")
+
+
+transmissor_draft = TransmissorDraft()
+
 
 def emitir_atualizacao_publica(semana_id, jogador_id, jogador_nome, time_id, time_nome):
     """Emite atualização específica para o público"""
     try:
-        socketio.emit('player_selected_public', {
+        transmissor_draft.enviar(semana_id, 'player_selected_public', {
             'semana_id': semana_id,
             'jogador_id': jogador_id,
             'jogador_nome': jogador_nome,
             'time_id': time_id,
             'time_nome': time_nome,
             'timestamp': datetime.utcnow().isoformat()
-        }, room=f'draft_public_{semana_id}')
-        print(f"📢 Emitido player_selected_public para draft_public_{semana_id}")
+        }, audiencias=('publico',))
     except Exception as e:
         print(f"❌ Erro ao emitir para público: {e}")
 
@@ -973,19 +1768,41 @@ def atualizar_lista_espera_automaticamente(semana):
     
     db.session.commit()
 
+def expirar_mensalidades_vencidas(hoje=None):
+    """Remove de mensalista quem está com a mensalidade vencida e não paga (um UPDATE)"""
+    hoje = hoje or date.today()
+    return Jogador.query.filter(
+        Jogador.mensalista == True,
+        Jogador.ativo == True,
+        Jogador.data_fim_mensalidade < hoje,
+        or_(Jogador.mensalidade_paga == False, Jogador.mensalidade_paga.is_(None))
+    ).update({'mensalista': False, 'mensalidade_paga': False}, synchronize_session=False)
+
+def preencher_fim_mensalidades():
+    """Define a data de fim de mensalistas pagos que só têm data de início"""
+    sem_fim = db.session.query(Jogador.id, Jogador.data_inicio_mensalidade).filter(
+        Jogador.mensalista == True,
+        Jogador.ativo == True,
+        Jogador.mensalidade_paga == True,
+        Jogador.data_inicio_mensalidade.isnot(None),
+        Jogador.data_fim_mensalidade.is_(None)
+    ).all()
+    if sem_fim:
+        config_global = ConfiguracaoGlobal.query.first()
+        duracao = config_global.duracao_mensalidade_dias if config_global else 30
+        db.session.execute(update(Jogador), [
+            {'id': jogador_id, 'data_fim_mensalidade': inicio + timedelta(days=duracao - 1)}
+            for jogador_id, inicio in sem_fim
+        ])
+    return len(sem_fim)
+
 def verificar_mensalidades_vencidas():
     """Verifica e atualiza status de mensalistas vencidos"""
-    hoje = date.today()
-    mensalistas = Jogador.query.filter_by(mensalista=True, ativo=True).all()
-    
-    for jogador in mensalistas:
-        if jogador.data_fim_mensalidade and jogador.data_fim_mensalidade < hoje:
-            # Se a mensalidade está vencida e não foi paga, remove de mensalista
-            if not jogador.mensalidade_paga:
-                jogador.mensalista = False
-                jogador.mensalidade_paga = False
-                db.session.commit()
-                print(f"⚠️ Jogador {jogador.nome} removido de mensalista - mensalidade vencida")
+    vencidos = expirar_mensalidades_vencidas()
+    db.session.commit()
+    if vencidos:
+        print(f"⚠️ {vencidos} jogador(es) removido(s) de mensalista - mensalidade vencida")
+    return vencidos
 
 def inicializar_draft(semana, tempo_por_escolha=None, modo_draft=None, max_times=None, max_jogadores_por_time=None):
     """Inicializa o draft com os times e status - ATUALIZADA PARA SINCRONIZAR CAPITÃES"""
@@ -1075,6 +1892,7 @@ def inicializar_draft(semana, tempo_por_escolha=None, modo_draft=None, max_times
         # Remove dados anteriores do draft
         EscolhaDraft.query.filter_by(semana_id=semana.id).delete()
         Time.query.filter_by(semana_id=semana.id).delete()
+        marcar_semana_analise(semana.id)
         DraftStatus.query.filter_by(semana_id=semana.id).delete()
         HistoricoDraft.query.filter_by(semana_id=semana.id).delete()
         
@@ -1183,6 +2001,15 @@ def inicializar_draft(semana, tempo_por_escolha=None, modo_draft=None, max_times
     
     db.session.commit()
     
+    # Monta o pool de disponíveis uma vez, já sem os capitães
+    descartar_pool_disponiveis(semana.id)
+    obter_pool_disponiveis(semana)
+    
+    # Modo automático: os times são formados na hora, balanceados
+    if semana.modo_draft == 'auto':
+        completar_draft_automatico(semana)
+        return times, draft_status
+    
     # Emite atualização inicial
     emitir_status_draft_atualizado(semana.id)
     
@@ -1191,6 +2018,108 @@ def inicializar_draft(semana, tempo_por_escolha=None, modo_draft=None, max_times
     
     return times, draft_status
 
+# ======================================================
+# ELEGIBILIDADE E PONTUAÇÃO DE CAPITÃES
+# ======================================================
+# Usado pela página de sorteio, pela API de prioridade, pelo sorteio
+# automático e pela troca de capitão, para que todos mostrem e usem a
+# mesma pontuação.
+
+PONTOS_MENSALISTA = 100
+PONTOS_CAPITAO_FIXO = 50
+PENALIDADE_VEZES_CAPITAO = 20
+SEMANAS_COOLDOWN_CAPITAO = 2
+
+def avaliar_candidatos_capitao(semana):
+    """Elegibilidade e pontuação de todos os confirmados da semana.
+    
+    Três consultas no total: confirmados com jogador, vezes como capitão
+    (agrupado) e capitães de drafts finalizados no período de cool-down.
+    Retorna dicts na ordem de prioridade da confirmação.
+    """
+    linhas = db.session.query(Confirmacao, Jogador).join(
+        Jogador, Jogador.id == Confirmacao.jogador_id
+    ).filter(
+        Confirmacao.semana_id == semana.id,
+        Confirmacao.confirmado == True
+    ).order_by(Confirmacao.prioridade.desc(), Confirmacao.id).all()
+    if not linhas:
+        return []
+    
+    ids = [jogador.id for _, jogador in linhas]
+    vezes = dict(db.session.query(Time.capitao_id, func.count(Time.id)).filter(
+        Time.capitao_id.in_(ids)
+    ).group_by(Time.capitao_id).all())
+    
+    # Capitão em draft finalizado no período de cool-down -> não elegível
+    inicio_cooldown = date.today() - timedelta(weeks=SEMANAS_COOLDOWN_CAPITAO)
+    recentes = dict(db.session.query(Time.capitao_id, func.max(Semana.data)).join(
+        Semana, Semana.id == Time.semana_id
+    ).filter(
+        Time.capitao_id.in_(ids),
+        Semana.data >= inicio_cooldown,
+        Semana.draft_finalizado == True
+    ).group_by(Time.capitao_id).all())
+    
+    vezes_capitao = [vezes.get(jogador_id, 0) for jogador_id in ids]
+    pontuacoes = [
+        PONTOS_MENSALISTA * bool(jogador.mensalista)
+        + PONTOS_CAPITAO_FIXO * bool(jogador.capitao)
+        - PENALIDADE_VEZES_CAPITAO * vezes_jogador
+        for (_, jogador), vezes_jogador in zip(linhas, vezes_capitao)
+    ]
+    
+    return [{
+        'jogador': jogador,
+        'confirmacao': conf,
+        'elegivel': jogador.id not in recentes,
+        'ultima_vez_capitao': recentes.get(jogador.id),
+        'vezes_capitao': vezes_jogador,
+        'pontuacao': pontuacao
+    } for (conf, jogador), vezes_jogador, pontuacao in zip(linhas, vezes_capitao, pontuacoes)]
+
+# Sorteio reproduzível: cada candidato recebe um bônus aleatório de 0 a
+# VARIACAO_SORTEIO - 1 gerado a partir da semente, na ordem registrada.
+# Mesma semente + mesmos candidatos = mesmo resultado.
+VARIACAO_SORTEIO = 50
+MAX_SIMULACOES_SORTEIO = 20000
+
+def sortear_capitaes(candidatos, quantidade, semente):
+    """Seleciona `quantidade` capitães entre [(jogador_id, pontuacao), ...].
+    
+    Retorna [(jogador_id, pontuacao_final), ...] em ordem de seleção; empates
+    ficam com quem vem primeiro na lista de candidatos.
+    """
+    rng = random.Random(semente)
+    finais = [(pontuacao + rng.randrange(VARIACAO_SORTEIO), -indice, jogador_id)
+              for indice, (jogador_id, pontuacao) in enumerate(candidatos)]
+    finais.sort(reverse=True)
+    return [(jogador_id, pontuacao) for pontuacao, _, jogador_id in finais[:quantidade]]
+
+def simular_sorteios(candidatos, quantidade, simulacoes, semente):
+    """Quantas vezes cada candidato seria sorteado em `simulacoes` sorteios.
+    
+    A simulação i usa a semente f'{semente}:{i}', então qualquer uma delas
+    pode ser reproduzida com sortear_capitaes.
+    """
+    selecionados = Counter()
+    for i in range(simulacoes):
+        for jogador_id, _ in sortear_capitaes(candidatos, quantidade, f'{semente}:{i}'):
+            selecionados[jogador_id] += 1
+    return selecionados
+
+def reproduzir_sorteio(registro):
+    """Refaz um sorteio registrado e confere com o resultado gravado"""
+    candidatos = [tuple(c) for c in json.loads(registro.candidatos)]
+    resultado = [jogador_id for jogador_id, _ in sortear_capitaes(candidatos, registro.quantidade, registro.semente)]
+    return resultado, resultado == json.loads(registro.capitaes)
+
+def semente_da_requisicao():
+    """Semente enviada pelo admin (JSON ou formulário) ou uma nova aleatória"""
+    dados = request.get_json(silent=True) or {}
+    semente = str(dados.get('semente') or request.form.get('semente') or '').strip()
+    return semente[:64] or secrets.token_hex(8)
+
 @app.route('/admin/sorteio_capitaes')
 @admin_required
 def admin_sorteio_capitaes():
@@ -1209,61 +2138,11 @@ def admin_sorteio_capitaes():
     # SEMPRE permite acesso, mesmo com draft em andamento
     # (apenas mostra mensagem informativa se draft já começou)
     
-    # Buscar jogadores confirmados com informações para sorteio
-    confirmacoes = Confirmacao.query.filter_by(
-        semana_id=semana.id,
-        confirmado=True
-    ).order_by(Confirmacao.prioridade.desc()).all()
-    
-    # Processar jogadores para o sorteio
+    # Jogadores confirmados com elegibilidade (cool-down) e pontuação
     jogadores_sorteio = []
-    for conf in confirmacoes:
-        jogador = conf.jogador
-        
-        # Verificar elegibilidade (cool-down de 2 semanas)
-        elegivel = True
-        ultima_vez_capitao = "Nunca"
-        
-        # Buscar se foi capitão nas últimas 2 semanas
-        duas_semanas_atras = date.today() - timedelta(weeks=2)
-        ultimas_semanas = Semana.query.filter(
-            Semana.data >= duas_semanas_atras,
-            Semana.draft_finalizado == True
-        ).order_by(Semana.data.desc()).all()
-        
-        # Buscar se foi capitão nessas semanas
-        foi_capitao_recente = False
-        for s in ultimas_semanas:
-            time = Time.query.filter_by(
-                semana_id=s.id,
-                capitao_id=jogador.id
-            ).first()
-            if time:
-                foi_capitao_recente = True
-                ultima_vez_capitao = format_date_func(s.data)
-                break
-        
-        # Se foi capitão nas últimas 2 semanas, não é elegível
-        if foi_capitao_recente:
-            elegivel = False
-        
-        # Calcular pontuação base
-        pontuacao = 0
-        if jogador.mensalista:
-            pontuacao += 100
-        if jogador.capitao:  # Capitão fixo no sistema
-            pontuacao += 50
-        
-        # Contar vezes que já foi capitão (histórico)
-        vezes_capitao = Time.query.filter_by(capitao_id=jogador.id).count()
-        pontuacao -= vezes_capitao * 10  # Diminui pontuação de quem já foi muito
-        
-        # Adicionar pontuação baseada na frequência de confirmações
-        total_confirmacoes = Confirmacao.query.filter_by(
-            jogador_id=jogador.id,
-            confirmado=True
-        ).count()
-        pontuacao += total_confirmacoes * 5
+    for candidato in avaliar_candidatos_capitao(semana):
+        jogador = candidato['jogador']
+        ultima_vez = candidato['ultima_vez_capitao']
         
         jogadores_sorteio.append({
             'id': jogador.id,
@@ -1271,14 +2150,14 @@ def admin_sorteio_capitaes():
             'apelido': jogador.apelido,
             'posicao': jogador.posicao,
             'nivel': jogador.nivel,
-            'foto_perfil': jogador.foto_perfil,
+            'foto_perfil': url_foto(jogador.foto_perfil, 'avatar'),
             'mensalista': jogador.mensalista,
             'capitao': jogador.capitao,  # Capitão fixo
-            'elegivel': elegivel,
-            'pontuacao': pontuacao,
-            'vezes_capitao': vezes_capitao,
-            'ultima_vez_capitao': ultima_vez_capitao,
-            'confirmacao': conf
+            'elegivel': candidato['elegivel'],
+            'pontuacao': candidato['pontuacao'],
+            'vezes_capitao': candidato['vezes_capitao'],
+            'ultima_vez_capitao': format_date_func(ultima_vez) if ultima_vez else "Nunca",
+            'confirmacao': candidato['confirmacao']
         })
     
     # Ordenar por pontuação (maior primeiro)
@@ -1314,26 +2193,534 @@ def admin_sorteio_capitaes():
 
 def get_jogadores_disponiveis_draft(semana):
     """Retorna jogadores disponíveis para draft (excluindo capitães já em times)"""
-    # Jogadores confirmados
-    confirmados = Confirmacao.query.filter_by(
-        semana_id=semana.id,
-        confirmado=True
-    ).all()
-    
-    jogadores_confirmados_ids = [c.jogador_id for c in confirmados]
+    return obter_pool_disponiveis(semana).listar()
+
+# ======================================================
+# POOL DE JOGADORES DISPONÍVEIS (DRAFT)
+# ======================================================
+# Cada semana com draft mantém em memória os confirmados ativos ainda não
+# escolhidos. O pool é montado uma vez (no início do draft ou no primeiro
+# acesso) e cada escolha gravada apenas o remove do pool. Mudanças em
+# confirmações, jogadores ou remoção de escolhas descartam o pool, que é
+# remontado no próximo acesso.
+
+CAMPOS_POOL = ('id', 'nome', 'apelido', 'posicao', 'nivel', 'foto_perfil',
+               'mensalista', 'capitao', 'rating')
+ORDEM_NIVEL = {'avancado': 0, 'intermediario': 1, 'iniciante': 2}
+MAX_POOLS_DISPONIVEIS = 8
+POR_PAGINA_DISPONIVEIS = 20
+MAX_POR_PAGINA_DISPONIVEIS = 100
+
+def normalizar_busca(texto):
+    """Minúsculas e sem acentos, para busca por prefixo"""
+    decomposto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).casefold().strip()
+
+class JogadorDisponivel:
+    """Cópia somente leitura dos campos do jogador usados no draft"""
+    __slots__ = CAMPOS_POOL
+
+    def __init__(self, **campos):
+        for campo in CAMPOS_POOL:
+            setattr(self, campo, campos.get(campo))
+
+    def __repr__(self):
+        return f'<JogadorDisponivel {self.nome}>'
+
+class PoolDisponiveis:
+    """Jogadores disponíveis de uma semana com índices por posição, nível e mensalista"""
+
+    def __init__(self, semana_id, jogadores):
+        self.semana_id = semana_id
+        self.jogadores = {}
+        self.por_posicao = {}
+        self.por_nivel = {}
+        self.mensalistas = set()
+        for jogador in jogadores:
+            self._indexar(jogador)
+
+        # Índices ordenados, montados uma vez; removidos são pulados na leitura
+        # Mesma ordem do ORDER BY nome original
+        self.ordem_nome = sorted(self.jogadores, key=lambda i: (self.jogadores[i].nome, i))
+        self.ordem_rating = sorted(
+            self.jogadores,
+            key=lambda i: (-(self.jogadores[i].rating or 0), self.jogadores[i].nome, i)
+        )
+        self.posicao_na_ordem = {
+            'nome': {i: n for n, i in enumerate(self.ordem_nome)},
+            'rating': {i: n for n, i in enumerate(self.ordem_rating)},
+        }
+        self.ratings = sorted((j.rating or 0, i) for i, j in self.jogadores.items())
+        # Prefixos do nome completo, de cada palavra do nome e do apelido
+        chaves = set()
+        for i, j in self.jogadores.items():
+            nome = normalizar_busca(j.nome)
+            chaves.add((nome, i))
+            chaves.update((palavra, i) for palavra in nome.split())
+            if j.apelido:
+                chaves.add((normalizar_busca(j.apelido), i))
+        self.chaves_busca = sorted(chaves)
+
+    def _indexar(self, jogador):
+        self.jogadores[jogador.id] = jogador
+        self.por_posicao.setdefault(jogador.posicao, set()).add(jogador.id)
+        self.por_nivel.setdefault(jogador.nivel, set()).add(jogador.id)
+        if jogador.mensalista:
+            self.mensalistas.add(jogador.id)
+
+    def __len__(self):
+        return len(self.jogadores)
+
+    def __contains__(self, jogador_id):
+        return jogador_id in self.jogadores
+
+    def remover(self, jogador_id):
+        """Tira o jogador do pool (O(1)); retorna False se já não estava"""
+        jogador = self.jogadores.pop(jogador_id, None)
+        if jogador is None:
+            return False
+        self.por_posicao.get(jogador.posicao, set()).discard(jogador_id)
+        self.por_nivel.get(jogador.nivel, set()).discard(jogador_id)
+        self.mensalistas.discard(jogador_id)
+        return True
+
+    def _buscar_prefixo(self, busca):
+        prefixo = normalizar_busca(busca)
+        inicio = bisect_left(self.chaves_busca, (prefixo,))
+        encontrados = set()
+        for chave, jogador_id in self.chaves_busca[inicio:]:
+            if not chave.startswith(prefixo):
+                break
+            encontrados.add(jogador_id)
+        return encontrados
+
+    def _faixa_rating(self, rating_min, rating_max):
+        inicio = 0 if rating_min is None else bisect_left(self.ratings, (rating_min,))
+        fim = len(self.ratings) if rating_max is None else bisect_right(self.ratings, (rating_max, float('inf')))
+        return {jogador_id for _, jogador_id in self.ratings[inicio:fim]}
+
+    def _filtrar(self, posicao=None, nivel=None, mensalista=None,
+                 rating_min=None, rating_max=None, busca=None):
+        """Ids que passam nos filtros, ou None quando não há filtro"""
+        candidatos = None
+
+        def restringir(ids):
+            nonlocal candidatos
+            candidatos = set(ids) if candidatos is None else candidatos & ids
+
+        if busca:
+            restringir(self._buscar_prefixo(busca))
+        if rating_min is not None or rating_max is not None:
+            restringir(self._faixa_rating(rating_min, rating_max))
+        if posicao is not None:
+            restringir(self.por_posicao.get(posicao, set()))
+        if nivel is not None:
+            restringir(self.por_nivel.get(nivel, set()))
+        if mensalista is not None:
+            if mensalista:
+                restringir(self.mensalistas)
+            else:
+                base = self.jogadores.keys() if candidatos is None else candidatos
+                candidatos = {i for i in base if i not in self.mensalistas}
+        return candidatos
+
+    def consultar(self, ordenar='nome', pagina=1, por_pagina=POR_PAGINA_DISPONIVEIS, **filtros):
+        """Página de jogadores filtrados e ordenados; retorna (jogadores, total)"""
+        ordem = self.ordem_rating if ordenar == 'rating' else self.ordem_nome
+        inicio = (max(pagina, 1) - 1) * por_pagina
+        candidatos = self._filtrar(**filtros)
+
+        if candidatos is None:
+            # Sem filtro: percorre o índice só até completar a página
+            pagina_ids = []
+            vistos = 0
+            for jogador_id in ordem:
+                if jogador_id not in self.jogadores:
+                    continue
+                if vistos >= inicio:
+                    pagina_ids.append(jogador_id)
+                    if len(pagina_ids) == por_pagina:
+                        break
+                vistos += 1
+            return [self.jogadores[i] for i in pagina_ids], len(self.jogadores)
+
+        posicoes = self.posicao_na_ordem['rating' if ordenar == 'rating' else 'nome']
+        ids = sorted((i for i in candidatos if i in self.jogadores), key=posicoes.__getitem__)
+        return [self.jogadores[i] for i in ids[inicio:inicio + por_pagina]], len(ids)
+
+    def listar(self, ordenar='nome', **filtros):
+        """Todos os jogadores disponíveis filtrados, em ordem de nome, nível ou rating"""
+        candidatos = self._filtrar(**filtros)
+        ordem = self.ordem_rating if ordenar == 'rating' else self.ordem_nome
+        jogadores = [
+            self.jogadores[i] for i in ordem
+            if i in self.jogadores and (candidatos is None or i in candidatos)
+        ]
+        if ordenar == 'nivel':
+            jogadores.sort(key=lambda j: ORDEM_NIVEL.get(j.nivel, len(ORDEM_NIVEL)))
+        return jogadores
+
+pools_disponiveis = {}
+# Geração por semana (chave None: todas), incrementada a cada invalidação.
+# Um pool montado fora do lock só é guardado se a geração não mudou.
+geracoes_pools_disponiveis = Counter()
+_pools_disponiveis_lock = Lock()
+
+def montar_pool_disponiveis(semana_id):
+    """Consulta o banco uma vez e monta o pool da semana"""
+    escolhido = db.session.query(EscolhaDraft.id).filter(
+        EscolhaDraft.semana_id == semana_id,
+        EscolhaDraft.jogador_id == Jogador.id
+    ).exists()
+    linhas = db.session.query(*[getattr(Jogador, campo) for campo in CAMPOS_POOL]).join(
+        Confirmacao, Confirmacao.jogador_id == Jogador.id
+    ).filter(
+        Confirmacao.semana_id == semana_id,
+        Confirmacao.confirmado == True,
+        Jogador.ativo == True,
+        ~escolhido
+    ).distinct().all()
+    return PoolDisponiveis(semana_id, [
+        JogadorDisponivel(**dict(zip(CAMPOS_POOL, linha))) for linha in linhas
+    ])
+
+def obter_pool_disponiveis(semana):
+    """Pool da semana, montado no primeiro acesso"""
+    with _pools_disponiveis_lock:
+        pool = pools_disponiveis.get(semana.id)
+        geracao = (geracoes_pools_disponiveis[None], geracoes_pools_disponiveis[semana.id])
+    if pool is not None:
+        return pool
+
+    pool = montar_pool_disponiveis(semana.id)
+    with _pools_disponiveis_lock:
+        if geracao != (geracoes_pools_disponiveis[None], geracoes_pools_disponiveis[semana.id]):
+            # Houve commit durante a montagem: usa o pool só nesta requisição
+            return pool
+        pools_disponiveis[semana.id] = pool
+        while len(pools_disponiveis) > MAX_POOLS_DISPONIVEIS:
+            pools_disponiveis.pop(next(iter(pools_disponiveis)))
+    return pool
+
+def descartar_pool_disponiveis(semana_id=None):
+    """Descarta o pool de uma semana (ou de todas) para remontar no próximo acesso"""
+    with _pools_disponiveis_lock:
+        geracoes_pools_disponiveis[semana_id] += 1
+        if semana_id is None:
+            pools_disponiveis.clear()
+        else:
+            pools_disponiveis.pop(semana_id, None)
+
+@event.listens_for(db.session, 'after_flush')
+def _coletar_mudancas_pool(session, flush_context):
+    """Separa escolhas novas (remoção O(1)) do que exige remontar o pool"""
+    escolhas = session.info.setdefault('pool_escolhas', [])
+    invalidar = session.info.setdefault('pool_invalidar', set())
+    for obj in session.new:
+        if isinstance(obj, EscolhaDraft):
+            escolhas.append((obj.semana_id, obj.jogador_id))
+        elif isinstance(obj, Confirmacao):
+            invalidar.add(obj.semana_id)
+        elif isinstance(obj, Jogador):
+            invalidar.add(None)
+    for obj in session.deleted:
+        if isinstance(obj, (EscolhaDraft, Confirmacao)):
+            invalidar.add(obj.semana_id)
+        elif isinstance(obj, Jogador):
+            invalidar.add(None)
+    for obj in session.dirty:
+        if isinstance(obj, (EscolhaDraft, Confirmacao)):
+            estado = db.inspect(obj)
+            campos = ('semana_id', 'jogador_id', 'confirmado') if isinstance(obj, Confirmacao) \
+                else ('semana_id', 'jogador_id')
+            if any(estado.attrs[c].history.has_changes() for c in campos):
+                invalidar.add(obj.semana_id)
+                invalidar.update(v for v in (estado.attrs.semana_id.history.deleted or ()) if v)
+        elif isinstance(obj, Jogador):
+            estado = db.inspect(obj)
+            if any(estado.attrs[c].history.has_changes() for c in CAMPOS_POOL + ('ativo',)):
+                invalidar.add(None)
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _invalidar_pool_em_massa(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        tabela = getattr(orm_execute_state.statement, 'table', None)
+        if tabela is not None and tabela.name in (
+                EscolhaDraft.__tablename__, Confirmacao.__tablename__, Jogador.__tablename__):
+            orm_execute_state.session.info.setdefault('pool_invalidar', set()).add(None)
+
+@event.listens_for(db.session, 'after_commit')
+def _aplicar_mudancas_pool(session):
+    escolhas = session.info.pop('pool_escolhas', None) or []
+    invalidar = session.info.pop('pool_invalidar', None) or set()
+    if None in invalidar:
+        descartar_pool_disponiveis()
+        return
+    for semana_id in invalidar:
+        descartar_pool_disponiveis(semana_id)
+    with _pools_disponiveis_lock:
+        for semana_id, jogador_id in escolhas:
+            geracoes_pools_disponiveis[semana_id] += 1
+            pool = pools_disponiveis.get(semana_id)
+            if pool is not None:
+                pool.remover(jogador_id)
+
+@event.listens_for(db.session, 'after_rollback')
+def _descartar_mudancas_pool(session):
+    session.info.pop('pool_escolhas', None)
+    session.info.pop('pool_invalidar', None)
+
+# ======================================================
+# BALANCEAMENTO DE TIMES (AUTO-DRAFT)
+# ======================================================
+# A força de cada jogador é o rating ajustado pelo nível. O motor distribui
+# os jogadores de forma gulosa (mais fortes primeiro, para o time com menos
+# jogadores e menor soma, priorizando posições que faltam) e depois faz
+# trocas entre pares de times enquanto o custo cair. Custo = variância das
+# somas de força + penalidade por posição essencial ausente em cada time.
+
+RATING_PADRAO = 1000
+AJUSTE_NIVEL = {'iniciante': -100, 'intermediario': 0, 'avancado': 100}
+POSICOES_ESSENCIAIS = ('levantador', 'ponteiro', 'central')
+PESO_COBERTURA = 40000  # equivale a ~200 pontos de desvio na soma do time
+MAX_PASSADAS_BALANCEAMENTO = 50
+
+def forca_jogador(rating, nivel):
+    return (rating if rating is not None else RATING_PADRAO) + AJUSTE_NIVEL.get(nivel, 0)
+
+def _faltas_posicao(contagem):
+    return sum(1 for posicao in POSICOES_ESSENCIAIS if not contagem.get(posicao))
+
+def _faltas_apos_troca(contagem, faltas, sai, entra):
+    """Faltas de posição de um time se `sai` for trocado por `entra`"""
+    if sai in POSICOES_ESSENCIAIS and contagem.get(sai) == 1:
+        faltas += 1
+    if entra in POSICOES_ESSENCIAIS and not contagem.get(entra):
+        faltas -= 1
+    return faltas
+
+def balancear_times(jogadores, num_times, tamanho_time, fixos=None):
+    """Divide jogadores em times equilibrados.
+
+    jogadores: lista de (id, forca, posicao) a distribuir.
+    fixos: lista com os (id, forca, posicao) já presos a cada time (capitães
+    e escolhas feitas); não são movidos.
+    Retorna a lista de ids de cada time (fixos + distribuídos).
+    """
+    fixos = fixos or [[] for _ in range(num_times)]
+    membros = [list(f) for f in fixos]
+    moveis = [[] for _ in range(num_times)]
+    somas = [sum(j[1] for j in f) for f in fixos]
+    posicoes = [Counter(j[2] for j in f) for f in fixos]
+    
+    # Fase gulosa
+    for jogador in sorted(jogadores, key=lambda j: (-j[1], j[0])):
+        candidatos = [t for t in range(num_times) if len(membros[t]) < tamanho_time]
+        if not candidatos:
+            break
+        t = min(candidatos, key=lambda t: (
+            len(membros[t]),
+            0 if jogador[2] in POSICOES_ESSENCIAIS and not posicoes[t].get(jogador[2]) else 1,
+            somas[t],
+            t
+        ))
+        membros[t].append(jogador)
+        moveis[t].append(jogador)
+        somas[t] += jogador[1]
+        posicoes[t][jogador[2]] += 1
+    
+    # Busca local: melhor troca entre pares de times a cada passada
+    media = sum(somas) / num_times if num_times else 0
+    for _ in range(MAX_PASSADAS_BALANCEAMENTO):
+        melhor = None
+        melhor_delta = -1e-9
+        for a in range(num_times):
+            for b in range(a + 1, num_times):
+                faltas_a = _faltas_posicao(posicoes[a])
+                faltas_b = _faltas_posicao(posicoes[b])
+                base = ((somas[a] - media) ** 2 + (somas[b] - media) ** 2
+                        + PESO_COBERTURA * (faltas_a + faltas_b))
+                for i, ja in enumerate(moveis[a]):
+                    for k, jb in enumerate(moveis[b]):
+                        diferenca = jb[1] - ja[1]
+                        custo = (somas[a] + diferenca - media) ** 2 + (somas[b] - diferenca - media) ** 2
+                        if ja[2] != jb[2]:
+                            custo += PESO_COBERTURA * (
+                                _faltas_apos_troca(posicoes[a], faltas_a, ja[2], jb[2])
+                                + _faltas_apos_troca(posicoes[b], faltas_b, jb[2], ja[2])
+                            )
+                        else:
+                            custo += PESO_COBERTURA * (faltas_a + faltas_b)
+                        delta = custo - base
+                        if delta < melhor_delta:
+                            melhor_delta = delta
+                            melhor = (a, b, i, k)
+        if melhor is None:
+            break
+        
+        a, b, i, k = melhor
+        ja, jb = moveis[a][i], moveis[b][k]
+        moveis[a][i], moveis[b][k] = jb, ja
+        membros[a][membros[a].index(ja)] = jb
+        membros[b][membros[b].index(jb)] = ja
+        somas[a] += jb[1] - ja[1]
+        somas[b] += ja[1] - jb[1]
+        posicoes[a][ja[2]] -= 1
+        posicoes[a][jb[2]] += 1
+        posicoes[b][jb[2]] -= 1
+        posicoes[b][ja[2]] += 1
+    
+    return [[j[0] for j in time] for time in membros]
+
+def avaliar_equilibrio(times):
+    """Métricas de equilíbrio de times dados como listas de (id, forca, posicao).
+
+    A pontuação (0 a 100) perde 5 pontos a cada 10 de diferença entre a maior
+    e a menor força média e 5 pontos por posição essencial ausente.
+    """
+    medias = [sum(j[1] for j in t) / len(t) if t else 0 for t in times]
+    somas = [sum(j[1] for j in t) for t in times]
+    faltas = [_faltas_posicao(Counter(j[2] for j in t)) for t in times]
+    diferenca = (max(medias) - min(medias)) if medias else 0
+    pontuacao = max(0.0, 100 - diferenca / 2 - 5 * sum(faltas))
+    return {
+        'somas': somas,
+        'medias': [round(m, 1) for m in medias],
+        'diferenca_media': round(diferenca, 1),
+        'faltas_posicao': faltas,
+        'pontuacao': round(pontuacao, 1)
+    }
+
+def _dados_balanceamento(semana):
+    """Times da semana com os jogadores já escolhidos, como (id, forca, posicao)"""
+    times = Time.query.filter_by(semana_id=semana.id).order_by(Time.ordem_escolha).all()
+    linhas = db.session.query(
+        EscolhaDraft.time_id, Jogador.id, Jogador.rating, Jogador.nivel, Jogador.posicao
+    ).join(Jogador, Jogador.id == EscolhaDraft.jogador_id).filter(
+        EscolhaDraft.semana_id == semana.id
+    ).order_by(EscolhaDraft.ordem_escolha).all()
+    
+    por_time = {t.id: [] for t in times}
+    for time_id, jogador_id, rating, nivel, posicao in linhas:
+        if time_id in por_time:
+            por_time[time_id].append((jogador_id, forca_jogador(rating, nivel), posicao))
+    return times, [por_time[t.id] for t in times]
+
+def _restantes_por_prioridade(semana, vagas):
+    """Disponíveis que entram no auto-draft, pela ordem de prioridade da lista"""
+    pool = obter_pool_disponiveis(semana)
+    ordem = [jogador_id for (jogador_id,) in db.session.query(Confirmacao.jogador_id).filter(
+        Confirmacao.semana_id == semana.id,
+        Confirmacao.confirmado == True
+    ).order_by(Confirmacao.prioridade.desc(), Confirmacao.confirmado_em, Confirmacao.id)]
+    
+    escolhidos = []
+    for jogador_id in ordem:
+        if jogador_id in pool and len(escolhidos) < vagas:
+            j = pool.jogadores[jogador_id]
+            escolhidos.append((j.id, forca_jogador(j.rating, j.nivel), j.posicao))
+    return escolhidos
+
+def completar_draft_automatico(semana):
+    """Preenche as vagas restantes com times balanceados e finaliza o draft"""
+    draft_status = DraftStatus.query.filter_by(semana_id=semana.id).first()
+    if not semana.draft_em_andamento or not draft_status:
+        raise ValueError('Draft não está em andamento!')
+    
+    times, fixos = _dados_balanceamento(semana)
+    if len(times) < 2:
+        raise ValueError('É necessário pelo menos 2 times!')
+    
+    tamanho = semana.max_jogadores_por_time
+    vagas = sum(max(0, tamanho - len(f)) for f in fixos)
+    restantes = _restantes_por_prioridade(semana, vagas)
+    ids_fixos = [{j[0] for j in f} for f in fixos]
+    distribuicao = balancear_times(restantes, len(times), tamanho, fixos)
+    
+    ordem = draft_status.escolha_atual
+    agora = datetime.utcnow()
+    for time, ids, ja_no_time in zip(times, distribuicao, ids_fixos):
+        rodada = len(ja_no_time)
+        for jogador_id in ids:
+            if jogador_id in ja_no_time:
+                continue
+            db.session.add(EscolhaDraft(
+                semana_id=semana.id,
+                jogador_id=jogador_id,
+                time_id=time.id,
+                ordem_escolha=ordem,
+                round_num=rodada,
+                escolhido_em=agora
+            ))
+            db.session.add(HistoricoDraft(
+                semana_id=semana.id,
+                jogador_id=jogador_id,
+                time_id=time.id,
+                acao='auto_draft',
+                detalhes=f'Distribuído automaticamente para o {time.nome}'
+            ))
+            ordem += 1
+            rodada += 1
+    
+    draft_status.escolha_atual = ordem
+    draft_status.finalizado = True
+    semana.draft_em_andamento = False
+    semana.draft_finalizado = True
+    db.session.commit()
     
-    # Jogadores já escolhidos
-    escolhidos = EscolhaDraft.query.filter_by(semana_id=semana.id).all()
-    jogadores_escolhidos_ids = [e.jogador_id for e in escolhidos]
+    emitir_status_draft_atualizado(semana.id)
+    return len(restantes)
+
+@app.route('/admin/draft/<int:semana_id>/auto', methods=['POST'])
+@admin_required
+def auto_draft(semana_id):
+    """Completa o draft em andamento com times balanceados"""
+    semana = Semana.query.get_or_404(semana_id)
+    try:
+        distribuidos = completar_draft_automatico(semana)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)})
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Erro no draft automático: {e}")
+        return jsonify({'success': False, 'message': f'Erro: {str(e)}'})
     
-    # Jogadores disponíveis
-    disponiveis = Jogador.query.filter(
-        Jogador.id.in_(jogadores_confirmados_ids),
-        ~Jogador.id.in_(jogadores_escolhidos_ids),
-        Jogador.ativo == True
-    ).order_by(Jogador.nome).all()
+    return jsonify({
+        'success': True,
+        'message': f'Draft completado automaticamente: {distribuidos} jogadores distribuídos.'
+    })
+
+@app.route('/api/draft/<int:semana_id>/balanceamento')
+@login_required
+def api_draft_balanceamento(semana_id):
+    """Pontuação de equilíbrio dos times e, com draft em andamento, a projeção balanceada"""
+    etag = etag_dados((Semana, Time, EscolhaDraft, Confirmacao, Jogador), semana_id)
+    
+    def montar():
+        semana = Semana.query.get_or_404(semana_id)
+        times, membros = _dados_balanceamento(semana)
+        resposta = {
+            'success': True,
+            'times': [{'id': t.id, 'nome': t.nome} for t in times],
+            'atual': avaliar_equilibrio(membros) if times else None,
+            'projecao': None
+        }
+        
+        if semana.draft_em_andamento and len(times) >= 2:
+            tamanho = semana.max_jogadores_por_time
+            vagas = sum(max(0, tamanho - len(m)) for m in membros)
+            restantes = _restantes_por_prioridade(semana, vagas)
+            distribuicao = balancear_times(restantes, len(times), tamanho, membros)
+            por_id = {j[0]: j for m in membros for j in m}
+            por_id.update((j[0], j) for j in restantes)
+            projecao = [[por_id[i] for i in ids] for ids in distribuicao]
+            resposta['projecao'] = avaliar_equilibrio(projecao)
+            resposta['projecao']['times'] = distribuicao
+        
+        return jsonify(resposta)
     
-    return disponiveis
+    return resposta_condicional(etag, montar, privado=True)
 
 # ======================================================
 # FUNÇÕES AUXILIARES (ADICIONAR/ATUALIZAR)
@@ -1400,30 +2787,38 @@ def get_semana_atual():
     # Fallback
     return Semana.query.filter(Semana.data >= hoje).order_by(Semana.data).first()
 
-def emitir_status_draft_atualizado(semana_id):
-    """Emite atualização do status do draft via SocketIO - CORRIGIDA"""
-    semana = Semana.query.get(semana_id)
-    if not semana:
-        return
-    
-    draft_status = DraftStatus.query.filter_by(semana_id=semana.id).first()
-    if not draft_status:
-        return
-    
-    # Busca todos os times
+def montar_status_draft(semana, draft_status):
+    """Monta o status do draft uma vez e deriva a versão do público.
+
+    Retorna (completo, publico): o completo vai para capitães e admin, o
+    público leva só a contagem de jogadores de cada time.
+    """
     times = Time.query.filter_by(semana_id=semana.id).order_by(Time.ordem_escolha).all()
-    
+    escolhas = EscolhaDraft.query.filter_by(
+        semana_id=semana.id
+    ).order_by(EscolhaDraft.ordem_escolha).all()
+
+    ids_jogadores = {e.jogador_id for e in escolhas}
+    ids_jogadores.update(t.capitao_id for t in times if t.capitao_id)
+    if draft_status.vez_capitao_id:
+        ids_jogadores.add(draft_status.vez_capitao_id)
+    jogadores_por_id = {
+        j.id: j for j in Jogador.query.filter(Jogador.id.in_(ids_jogadores)).all()
+    } if ids_jogadores else {}
+
+    escolhas_por_time = {}
+    for escolha in escolhas:
+        escolhas_por_time.setdefault(escolha.time_id, []).append(escolha)
+
     times_info = []
+    times_publico = []
     for time in times:
-        capitao = Jogador.query.get(time.capitao_id)
-        escolhas = EscolhaDraft.query.filter_by(
-            semana_id=semana.id,
-            time_id=time.id
-        ).order_by(EscolhaDraft.ordem_escolha).all()
-        
+        capitao = jogadores_por_id.get(time.capitao_id)
         jogadores = []
-        for escolha in escolhas:
-            jogador = Jogador.query.get(escolha.jogador_id)
+        for escolha in escolhas_por_time.get(time.id, []):
+            jogador = jogadores_por_id.get(escolha.jogador_id)
+            if not jogador:
+                continue
             jogadores.append({
                 'id': jogador.id,
                 'nome': jogador.nome,
@@ -1431,7 +2826,7 @@ def emitir_status_draft_atualizado(semana_id):
                 'posicao': jogador.posicao,
                 'nivel': jogador.nivel
             })
-        
+
         times_info.append({
             'id': time.id,
             'nome': time.nome,
@@ -1441,26 +2836,49 @@ def emitir_status_draft_atualizado(semana_id):
             'jogadores': jogadores,
             'total_jogadores': len(jogadores)
         })
-    
-    # Verifica quem é o próximo capitão
-    proximo_capitao = None
-    if draft_status.vez_capitao_id:
-        capitao_obj = Jogador.query.get(draft_status.vez_capitao_id)
-        if capitao_obj:
-            proximo_capitao = capitao_obj.nome
-    
-    # Emite atualização para todos conectados ao draft
-    socketio.emit('draft_status_update', {
+        times_publico.append({
+            'id': time.id,
+            'nome': time.nome,
+            'cor': time.cor,
+            'total_jogadores': len(jogadores)
+        })
+
+    capitao_atual = jogadores_por_id.get(draft_status.vez_capitao_id)
+
+    completo = {
         'semana_id': semana.id,
         'draft_em_andamento': semana.draft_em_andamento,
         'finalizado': draft_status.finalizado,
         'rodada_atual': draft_status.rodada_atual,
         'escolha_atual': draft_status.escolha_atual,
         'tempo_restante': draft_status.tempo_restante if semana.tempo_escolha > 0 else None,
+        'tempo_configurado': semana.tempo_escolha,
         'vez_capitao_id': draft_status.vez_capitao_id,
-        'capitao_atual': proximo_capitao,
+        'capitao_atual': capitao_atual.nome if capitao_atual else None,
         'times': times_info
-    }, room=f'draft_{semana.id}')
+    }
+    publico = {
+        'semana_id': semana.id,
+        'rodada_atual': draft_status.rodada_atual,
+        'escolha_atual': draft_status.escolha_atual,
+        'vez_capitao_id': draft_status.vez_capitao_id,
+        'times': times_publico
+    }
+    return completo, publico
+
+def emitir_status_draft_atualizado(semana_id):
+    """Emite o status do draft para capitães, admin e público"""
+    semana = Semana.query.get(semana_id)
+    if not semana:
+        return
+    
+    draft_status = DraftStatus.query.filter_by(semana_id=semana.id).first()
+    if not draft_status:
+        return
+    
+    completo, publico = montar_status_draft(semana, draft_status)
+    transmissor_draft.enviar(semana.id, 'draft_status_update', completo)
+    transmissor_draft.enviar(semana.id, 'draft_status_public', publico, audiencias=('publico',))
 
 
 @app.route('/admin/recriar_semanas_automaticas')
@@ -1468,33 +2886,18 @@ def emitir_status_draft_atualizado(semana_id):
 def recriar_semanas_automaticas():
     """Força a recriação de semanas automaticamente"""
     try:
-        hoje = date.today()
-        semanas_futuras = Semana.query.filter(Semana.data >= hoje).all()
-        
-        removidas = 0
-        for semana in semanas_futuras:
-            try:
-                # Não remove semanas com draft em andamento ou finalizado
-                if semana.draft_em_andamento or semana.draft_finalizado:
-                    continue
-                
-                # **CORREÇÃO: Usa função segura de limpeza**
-                if limpar_semana_completa(semana.id):
-                    # Remove a semana
-                    db.session.delete(semana)
-                    removidas += 1
-            except:
-                pass
+        periodo = periodo_calendario()
+        if not periodo:
+            flash('Nenhuma nova semana criada. Verifique a configuração do ciclo e dias da semana.', 'info')
+            return redirect(url_for('admin_configuracoes'))
         
+        # Remove as semanas futuras vazias fora do calendário e cria as que faltam
+        semanas_criadas, removidas = sincronizar_calendario(*periodo, remover=True)
         if removidas > 0:
-            db.session.commit()
             print(f"🗑️ {removidas} semanas futuras removidas")
         
-        # Cria semanas automaticamente
-        semanas_criadas = criar_semanas_automaticas()
-        
-        if semanas_criadas > 0:
-            flash(f'{semanas_criadas} semanas recriadas automaticamente dentro do ciclo ativo!', 'success')
+        if semanas_criadas > 0 or removidas > 0:
+            flash(f'Calendário recriado: {semanas_criadas} semana(s) criada(s) e {removidas} removida(s) dentro do ciclo ativo!', 'success')
         else:
             flash('Nenhuma nova semana criada. Verifique a configuração do ciclo e dias da semana.', 'info')
             
@@ -1520,16 +2923,16 @@ def excluir_semana(id):
         flash('Não é possível excluir semanas passadas com draft finalizado!', 'danger')
         return redirect(url_for('admin_todas_semanas'))
     
+    data_semana = semana.data
+    if request.args.get('simular'):
+        linhas = excluir_semanas([id], simular=True)
+        flash(f'Simulação: excluir a semana de {format_date_func(data_semana)} apagaria {descrever_exclusao(linhas)}.', 'info')
+        return redirect(url_for('admin_todas_semanas'))
+    
     try:
-        # Usa função segura para excluir dependências
-        if excluir_semana_seguro(id):
-            # Agora pode excluir a semana com segurança
-            db.session.delete(semana)
-            db.session.commit()
-            
-            flash(f'Semana de {format_date_func(semana.data)} excluída com sucesso!', 'success')
-        else:
-            flash('Erro ao excluir dependências da semana!', 'danger')
+        excluir_semanas([id])
+        db.session.commit()
+        flash(f'Semana de {format_date_func(data_semana)} excluída com sucesso!', 'success')
         
     except Exception as e:
         db.session.rollback()
@@ -1642,17 +3045,21 @@ def relatorio_por_dia():
     hoje = date.today()
     um_mes_atras = hoje - timedelta(days=30)
     
-    semanas = Semana.query.filter(
+    # Uma consulta: confirmados por semana no período
+    semanas = db.session.query(
+        Semana.data,
+        func.count(Confirmacao.id)
+    ).outerjoin(
+        Confirmacao, (Confirmacao.semana_id == Semana.id) & (Confirmacao.confirmado == True)
+    ).filter(
         Semana.data >= um_mes_atras,
         Semana.data <= hoje
-    ).all()
+    ).group_by(Semana.id, Semana.data).all()
     
     dados_por_dia = defaultdict(lambda: {'total': 0, 'confirmados': 0})
     
-    for semana in semanas:
-        dia_semana = semana.data.weekday()
-        confirmados = semana.confirmacoes.filter_by(confirmado=True).count()
-        
+    for data_semana, confirmados in semanas:
+        dia_semana = data_semana.weekday()
         dados_por_dia[dia_semana]['total'] += 1
         dados_por_dia[dia_semana]['confirmados'] += confirmados
     
@@ -1765,6 +3172,20 @@ def definir_ciclo_mensalidade():
             flash('A data de fim deve ser posterior à data de início!', 'danger')
             return redirect(url_for('definir_ciclo_mensalidade'))
         
+        # Simulação: mostra quem seria atualizado sem gravar nada
+        if request.form.get('simular'):
+            if acao == 'todos':
+                previa = atualizar_mensalidades_periodo(data_inicio, data_fim, simular=True)
+            elif acao == 'apenas_pagos':
+                previa = atualizar_jogadores_em_lote(
+                    [Jogador.mensalista == True, Jogador.mensalidade_paga == True, Jogador.ativo == True],
+                    {}, simular=True
+                )
+            else:
+                previa = renovar_mensalidade_em_lote(jogadores_selecionados, data_inicio, data_fim, simular=True)
+            flash_previa_mensalidades(previa, f'receberiam o ciclo de {format_date_func(data_inicio)} a {format_date_func(data_fim)}')
+            return redirect(url_for('definir_ciclo_mensalidade'))
+        
         # NOVO: Define este ciclo como ciclo de referência ativo
         definir_ciclo_manual(data_inicio, data_fim, f"Ciclo criado via definição em lote")
         
@@ -1776,12 +3197,12 @@ def definir_ciclo_mensalidade():
             
         elif acao == 'apenas_pagos':
             # Apenas para mensalistas com pagamento confirmado
-            mensalistas_pagos = Jogador.query.filter_by(mensalista=True, mensalidade_paga=True, ativo=True).all()
-            for jogador in mensalistas_pagos:
-                jogador.data_inicio_mensalidade = data_inicio
-                jogador.data_fim_mensalidade = data_fim
+            quantos = atualizar_jogadores_em_lote(
+                [Jogador.mensalista == True, Jogador.mensalidade_paga == True, Jogador.ativo == True],
+                {'data_inicio_mensalidade': data_inicio, 'data_fim_mensalidade': data_fim}
+            )
             db.session.commit()
-            flash(f'Ciclo definido para {len(mensalistas_pagos)} mensalistas com pagamento confirmado e salvo como ciclo ativo do sistema!', 'success')
+            flash(f'Ciclo definido para {quantos} mensalistas com pagamento confirmado e salvo como ciclo ativo do sistema!', 'success')
             
         elif acao == 'apenas_selecionados' and jogadores_selecionados:
             # Para jogadores específicos selecionados
@@ -1829,17 +3250,11 @@ def definir_ciclo_mensalidade():
 def renovar_mensalidades_vencidas():
     """Renova automaticamente mensalidades vencidas para novo ciclo"""
     hoje = date.today()
-    
-    # Busca mensalistas vencidos
-    mensalistas_vencidos = Jogador.query.filter(
+    vencidos = [
         Jogador.mensalista == True,
         Jogador.ativo == True,
         Jogador.data_fim_mensalidade < hoje
-    ).all()
-    
-    if not mensalistas_vencidos:
-        flash('Não há mensalistas vencidos para renovar!', 'info')
-        return redirect(url_for('admin_mensalidades'))
+    ]
     
     # Calcula novo ciclo
     config_global = ConfiguracaoGlobal.query.first()
@@ -1853,20 +3268,47 @@ def renovar_mensalidades_vencidas():
     
     data_fim = data_inicio + timedelta(days=duracao - 1)
     
-    # Renova cada mensalista vencido
-    renovados = 0
-    for jogador in mensalistas_vencidos:
-        jogador.mensalista = True
-        jogador.mensalidade_paga = False  # Marca como não pago para novo ciclo
-        jogador.data_inicio_mensalidade = data_inicio
-        jogador.data_fim_mensalidade = data_fim
-        renovados += 1
+    if request.form.get('simular'):
+        previa = atualizar_jogadores_em_lote(vencidos, {}, simular=True)
+        flash_previa_mensalidades(previa, f'seriam renovados para {format_date_func(data_inicio)} a {format_date_func(data_fim)}')
+        return redirect(url_for('admin_mensalidades'))
     
+    # Renova todos os vencidos num único UPDATE (não pago para o novo ciclo)
+    renovados = atualizar_jogadores_em_lote(vencidos, {
+        'mensalista': True,
+        'mensalidade_paga': False,
+        'data_inicio_mensalidade': data_inicio,
+        'data_fim_mensalidade': data_fim
+    })
     db.session.commit()
     
+    if not renovados:
+        flash('Não há mensalistas vencidos para renovar!', 'info')
+        return redirect(url_for('admin_mensalidades'))
+    
     flash(f'{renovados} mensalistas vencidos renovados para novo ciclo ({format_date_func(data_inicio)} a {format_date_func(data_fim)})!', 'success')
     return redirect(url_for('admin_mensalidades'))
 
+def filtrar_mensalistas(query, status_filter, hoje):
+    """Aplica o filtro de status do relatório de mensalidades a uma query sobre Jogador"""
+    if status_filter == 'pagos':
+        return query.filter(Jogador.mensalista == True, Jogador.mensalidade_paga == True)
+    if status_filter == 'pendentes':
+        return query.filter(Jogador.mensalista == True, Jogador.mensalidade_paga == False)
+    if status_filter == 'vencidos':
+        return query.filter(
+            Jogador.mensalista == True,
+            Jogador.data_fim_mensalidade < hoje
+        )
+    if status_filter == 'ativos':
+        return query.filter(
+            Jogador.mensalista == True,
+            Jogador.mensalidade_paga == True,
+            Jogador.data_fim_mensalidade >= hoje
+        )
+    # 'todos'
+    return query.filter(Jogador.mensalista == True)
+
 @app.route('/admin/mensalidade/relatorio')
 @admin_required
 def relatorio_mensalidades():
@@ -1879,25 +3321,7 @@ def relatorio_mensalidades():
     ano_filter = request.args.get('ano', str(hoje.year))
     
     # Query base
-    query = Jogador.query.filter_by(ativo=True)
-    
-    if status_filter == 'pagos':
-        query = query.filter_by(mensalista=True, mensalidade_paga=True)
-    elif status_filter == 'pendentes':
-        query = query.filter_by(mensalista=True, mensalidade_paga=False)
-    elif status_filter == 'vencidos':
-        query = query.filter(
-            Jogador.mensalista == True,
-            Jogador.data_fim_mensalidade < hoje
-        )
-    elif status_filter == 'ativos':
-        query = query.filter(
-            Jogador.mensalista == True,
-            Jogador.mensalidade_paga == True,
-            Jogador.data_fim_mensalidade >= hoje
-        )
-    else:  # 'todos'
-        query = query.filter_by(mensalista=True)
+    query = filtrar_mensalistas(Jogador.query.filter_by(ativo=True), status_filter, hoje)
     
     jogadores = query.order_by(Jogador.nome).all()
     
@@ -1907,8 +3331,8 @@ def relatorio_mensalidades():
     vencidos = sum(1 for j in jogadores if j.data_fim_mensalidade and j.data_fim_mensalidade < hoje)
     ativos = sum(1 for j in jogadores if j.mensalidade_paga and j.data_fim_mensalidade and j.data_fim_mensalidade >= hoje)
     
-    # Valores totais (exemplo: R$ 50,00 por mensalidade)
-    valor_mensalidade = 22.00
+    # Valores totais
+    valor_mensalidade = VALOR_MENSALIDADE
     valor_total = total * valor_mensalidade
     valor_recebido = pagos * valor_mensalidade
     valor_pendente = (total - pagos) * valor_mensalidade
@@ -1924,12 +3348,21 @@ def relatorio_mensalidades():
                          valor_recebido=valor_recebido,
                          valor_pendente=valor_pendente,
                          status_filter=status_filter,
+                         mes=mes_filter,
+                         ano=ano_filter,
                          hoje=hoje)
 
 @app.route('/api/mensalidades/status')
 @admin_required
 def api_mensalidades_status():
     """API para status das mensalidades (usado no dashboard) - SIMPLIFICADA"""
+    return resposta_condicional(
+        etag_dados(MODELOS_MENSALIDADES, date.today()),
+        _montar_api_mensalidades_status,
+        privado=True
+    )
+
+def _montar_api_mensalidades_status():
     resumo = obter_resumo_mensalidades()
     
     # Formata as datas para exibição
@@ -2065,13 +3498,19 @@ def definir_periodo_mensalidade():
             flash('A data de fim deve ser posterior à data de início!', 'danger')
             return redirect(url_for('definir_periodo_mensalidade'))
         
+        if request.form.get('simular'):
+            previa = atualizar_mensalidades_periodo(data_inicio, data_fim, simular=True)
+            flash_previa_mensalidades(previa, f'receberiam o período de {format_date_func(data_inicio)} a {format_date_func(data_fim)}')
+            return redirect(url_for('definir_periodo_mensalidade'))
+        
         # Atualiza todos os mensalistas
         quantos = atualizar_mensalidades_periodo(data_inicio, data_fim)
         
         flash(f'Período definido para {quantos} mensalistas! De {format_date_func(data_inicio)} a {format_date_func(data_fim)}', 'success')
         return redirect(url_for('admin_jogadores'))
     
-    return render_template('admin/definir_periodo_mensalidade.html')
+    total_mensalistas = Jogador.query.filter_by(mensalista=True, ativo=True).count()
+    return render_template('admin/definir_periodo_mensalidade.html', total_mensalistas=total_mensalistas)
 
   
 
@@ -2086,24 +3525,18 @@ def remover_nao_mensalista(id):
         flash(f'{jogador.nome} é mensalista! Use "Inativar" em vez de "Remover".', 'warning')
         return redirect(url_for('admin_jogadores'))
     
-    # Verifica se tem confirmações
-    tem_confirmacoes = Confirmacao.query.filter_by(jogador_id=jogador.id).first()
+    # Verifica se tem confirmações (inclusive em semanas arquivadas)
+    tem_confirmacoes = Confirmacao.query.filter_by(jogador_id=jogador.id).first() \
+        or ArquivoJogador.query.filter_by(jogador_id=jogador.id).first()
     if tem_confirmacoes:
         flash(f'{jogador.nome} tem histórico de presenças. Use "Inativar" para manter o histórico.', 'warning')
         return redirect(url_for('admin_jogadores'))
     
     nome_jogador = jogador.nome
     
+    foto = jogador.foto_perfil
+    
     try:
-        # Remove foto se existir
-        if jogador.foto_perfil:
-            old_path = os.path.join(app.static_folder, jogador.foto_perfil.lstrip('/'))
-            if os.path.exists(old_path):
-                try:
-                    os.remove(old_path)
-                except:
-                    pass
-        
         # Remove pagamentos do cofre associados a este jogador
         PagamentoCofre.query.filter_by(jogador_id=id).delete()
         
@@ -2115,6 +3548,9 @@ def remover_nao_mensalista(id):
         db.session.delete(jogador)
         db.session.commit()
         
+        # Remove a foto se ninguém mais a usa
+        remover_foto(foto)
+        
         flash(f'Jogador {nome_jogador} removido com sucesso!', 'success')
         
     except Exception as e:
@@ -2218,6 +3654,7 @@ def admin_configuracoes():
                         # Remove dados relacionados
                         Confirmacao.query.filter_by(semana_id=semana.id).delete()
                         ListaEspera.query.filter_by(semana_id=semana.id).delete()
+                        marcar_semana_analise(semana.id)
                         
                         # Remove a semana
                         db.session.delete(semana)
@@ -2367,90 +3804,6 @@ def admin_configuracoes():
                          duracao_total_ciclo=duracao_total_ciclo,
                          hoje=hoje)  # Passa hoje para o template
     
-def criar_semanas_automaticas():
-    """Cria semanas automaticamente baseado nos dias fixos configurados e ciclo ativo - CORRIGIDA"""
-    config_global = ConfiguracaoGlobal.query.first()
-    if not config_global:
-        print("⚠️ Configuração global não encontrada")
-        return 0
-    
-    hoje = date.today()
-    
-    # Busca o ciclo ativo do sistema
-    ciclo_inicio, ciclo_fim, ciclo_existe = obter_ciclo_sistema_ativo()
-    
-    # Dias da semana configurados
-    dias_semana = []
-    if config_global.dias_semana_fixos:
-        dias_semana = config_global.get_dias_semana()
-    else:
-        # Se não houver dias configurados, não cria semanas
-        print("⚠️ Nenhum dia da semana configurado. Configure os dias em /admin/configuracoes")
-        return 0
-    
-    if not dias_semana:
-        print("⚠️ Nenhum dia da semana selecionado.")
-        return 0
-    
-    # Determina período de criação
-    if ciclo_existe and ciclo_inicio and ciclo_fim:
-        # IMPORTANTE: Cria semanas apenas para os DIAS RESTANTES do ciclo
-        # Começa de HOJE (ou início do ciclo se ainda não começou)
-        data_inicio_criacao = max(hoje, ciclo_inicio)
-        data_limite = ciclo_fim  # Até o fim do ciclo
-        
-        # Verifica se o ciclo ainda é válido
-        if data_inicio_criacao > ciclo_fim:
-            print(f"⚠️ Ciclo já terminou: {format_date_func(ciclo_fim)}")
-            return 0
-            
-        dias_no_periodo = (data_limite - data_inicio_criacao).days + 1
-        print(f"✅ Criando semanas para os próximos {dias_no_periodo} dias (até {format_date_func(data_limite)})")
-    else:
-        # Se não há ciclo ativo, usa os próximos 30 dias (comportamento padrão)
-        data_inicio_criacao = hoje
-        data_limite = hoje + timedelta(days=30)
-        dias_no_periodo = 30
-        print(f"✅ Sem ciclo ativo: criando semanas para os próximos 30 dias")
-    
-    print(f"📅 Período de criação: {format_date_func(data_inicio_criacao)} até {format_date_func(data_limite)}")
-    print(f"🎯 Dias de jogo configurados: {', '.join([get_dia_semana_curto(d) for d in dias_semana])}")
-    
-    semanas_criadas = 0
-    data_atual = data_inicio_criacao
-    
-    # Cria semanas apenas para dias úteis configurados dentro do período
-    while data_atual <= data_limite:
-        if data_atual.weekday() in dias_semana:
-            semana_existente = Semana.query.filter_by(data=data_atual).first()
-            if not semana_existente:
-                semana = Semana(
-                    data=data_atual,
-                    descricao=f'Jogo de Vôlei - {data_atual.strftime("%d/%m/%Y")}',
-                    lista_aberta=True,
-                    max_times=2,
-                    max_jogadores_por_time=6
-                )
-                db.session.add(semana)
-                semanas_criadas += 1
-                print(f"  ➕ Criada semana para {format_date_func(data_atual)} ({get_dia_semana_curto(data_atual.weekday())})")
-            else:
-                print(f"  ⏭️ Semana já existe para {format_date_func(data_atual)}")
-        
-        data_atual += timedelta(days=1)
-    
-    try:
-        db.session.commit()
-        if semanas_criadas > 0:
-            print(f"✅ {semanas_criadas} semanas criadas automaticamente")
-        else:
-            print("ℹ️ Nenhuma semana nova criada (todas já existiam)")
-    except Exception as e:
-        db.session.rollback()
-        print(f"❌ Erro ao criar semanas: {e}")
-    
-    return semanas_criadas
-
 @app.route('/admin/iniciar_draft', methods=['POST'])
 @admin_required
 def iniciar_draft():
@@ -3655,33 +5008,10 @@ def cofre_principal():
     times = Time.query.filter_by(semana_id=semana.id).order_by(Time.nome).all()
     
     # Calcular saldo total do cofre
-    entradas = db.session.query(func.sum(MovimentoCofre.valor)).filter(
-        MovimentoCofre.tipo.in_(['entrada', 'deposito', 'ajuste'])
-    ).scalar() or 0
-    
-    saidas = db.session.query(func.sum(MovimentoCofre.valor)).filter(
-        MovimentoCofre.tipo.in_(['saida', 'retirada'])
-    ).scalar() or 0
-    
-    saldo_total = entradas - saidas
+    saldo_total = calcular_saldo_cofre()
     
-    # Estatísticas da semana
-    pagamentos_semana = PagamentoCofre.query.filter_by(semana_id=semana.id).all()
-    
-    semana_info = {
-        'total': len(pagamentos_semana),
-        'pagos': sum(1 for p in pagamentos_semana if p.pago),
-        'pendentes': sum(1 for p in pagamentos_semana if not p.pago),
-        'arrecadado': sum(p.valor for p in pagamentos_semana if p.pago)
-    }
-    
-    # Resumo por método de pagamento
-    resumo_metodos = {
-        'dinheiro': sum(p.valor for p in pagamentos_semana if p.pago and p.metodo_pagamento == 'dinheiro'),
-        'pix': sum(p.valor for p in pagamentos_semana if p.pago and p.metodo_pagamento == 'pix'),
-        'cartao': sum(p.valor for p in pagamentos_semana if p.pago and p.metodo_pagamento == 'cartao'),
-        'outro': sum(p.valor for p in pagamentos_semana if p.pago and p.metodo_pagamento == 'outro')
-    }
+    # Estatísticas da semana e resumo por método de pagamento
+    semana_info, resumo_metodos = calcular_agregados_cofre(semana.id)
     
     # Movimentos recentes
     movimentos = MovimentoCofre.query.order_by(MovimentoCofre.created_at.desc()).limit(20).all()
@@ -3736,62 +5066,17 @@ def cofre_principal():
 @admin_required
 def exportar_relatorio_mensal(ano, mes):
     """Exporta relatório mensal em CSV"""
-    # Buscar semanas do mês
-    semanas = Semana.query.filter(
-        db.extract('year', Semana.data) == ano,
-        db.extract('month', Semana.data) == mes
-    ).all()
-    
-    import csv
-    from io import StringIO
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Cabeçalho
-    writer.writerow(['Relatório Mensal', f'{mes:02d}/{ano}'])
-    writer.writerow(['Data de geração:', datetime.now().strftime("%d/%m/%Y %H:%M")])
-    writer.writerow([])
-    writer.writerow(['Semana', 'Jogadores', 'Arrecadado (R$)', 'Pagamentos', 'Taxa'])
-    
-    total_jogadores = 0
-    total_arrecadado = 0
-    total_pagamentos = 0
-    
-    # Dados por semana
-    for semana in semanas:
-        pagamentos = PagamentoCofre.query.filter_by(semana_id=semana.id).all()
-        total = len(pagamentos)
-        pagos = sum(1 for p in pagamentos if p.pago)
-        arrecadado = sum(p.valor for p in pagamentos if p.pago)
-        taxa = (pagos / total * 100) if total > 0 else 0
-        
-        writer.writerow([
-            semana.data.strftime("%d/%m/%Y"),
-            total,
-            f'{arrecadado:.2f}',
-            f'{pagos}/{total}',
-            f'{taxa:.1f}%'
-        ])
-        
-        total_jogadores += total
-        total_arrecadado += arrecadado
-        total_pagamentos += pagos
-    
-    writer.writerow([])
-    writer.writerow(['TOTAL', total_jogadores, f'{total_arrecadado:.2f}', 
-                     f'{total_pagamentos}/{total_jogadores}', 
-                     f'{(total_pagamentos / total_jogadores * 100) if total_jogadores > 0 else 0:.1f}%'])
-    
-    output.seek(0)
-    
-    from flask import make_response
+    inicio, fim = intervalo_datas(ano=ano, mes=mes)
     
-    response = make_response(output.getvalue())
-    response.headers["Content-Disposition"] = f"attachment; filename=relatorio_mes_{mes:02d}_{ano}.csv"
-    response.headers["Content-type"] = "text/csv"
+    cabecalho = [
+        ['Relatório Mensal', f'{mes:02d}/{ano}'],
+        ['Data de geração:', datetime.now().strftime("%d/%m/%Y %H:%M")],
+    ]
     
-    return response    
+    return resposta_csv_streaming(
+        f"relatorio_mes_{mes:02d}_{ano}.csv",
+        linhas_resumo_semanas_cofre(inicio, fim, cabecalho)
+    )
 
 @app.route('/api/cofre/pagar', methods=['POST'])
 @admin_required
@@ -3906,62 +5191,43 @@ def api_cofre_pagar_todos():
         return jsonify({'success': False, 'message': 'Semana não especificada!'})
     
     try:
-        # Buscar todos os jogadores não-mensalistas confirmados
-        confirmacoes = Confirmacao.query.filter_by(
-            semana_id=semana_id,
-            confirmado=True
-        ).all()
-        
-        jogadores_processados = 0
-        valor_total = 0
-        
-        for conf in confirmacoes:
-            jogador = conf.jogador
-            
-            # Processar apenas não-mensalistas
-            if not jogador.mensalista:
-                # Buscar ou criar pagamento
-                pagamento = PagamentoCofre.query.filter_by(
-                    semana_id=semana_id,
-                    jogador_id=jogador.id
-                ).first()
-                
-                if not pagamento:
-                    pagamento = PagamentoCofre(
-                        semana_id=semana_id,
-                        jogador_id=jogador.id,
-                        valor=valor_padrao,
-                        metodo_pagamento='dinheiro',
-                        registrado_por=current_user.username
-                    )
-                    db.session.add(pagamento)
-                
-                if not pagamento.pago:
-                    pagamento.pago = True
-                    pagamento.pago_em = datetime.utcnow()
-                    pagamento.valor = valor_padrao
-                    pagamento.updated_at = datetime.utcnow()
-                    
-                    # Registrar movimento
-                    movimento = MovimentoCofre(
-                        tipo='entrada',
-                        valor=valor_padrao,
-                        descricao=f'Pagamento em lote: {jogador.nome}',
-                        semana_id=semana_id,
-                        observacao='Processamento em lote',
-                        usuario=current_user.username
-                    )
-                    db.session.add(movimento)
-                    
-                    jogadores_processados += 1
-                    valor_total += valor_padrao
+        # Jogadores não-mensalistas confirmados (uma consulta, sem lazy-load)
+        jogadores_ids = [jogador_id for (jogador_id,) in db.session.query(Confirmacao.jogador_id).join(Jogador).filter(
+            Confirmacao.semana_id == semana_id,
+            Confirmacao.confirmado == True,
+            or_(Jogador.mensalista == False, Jogador.mensalista.is_(None))
+        ).all()]
+        
+        # Apenas quem ainda não pagou
+        ja_pagos = {jogador_id for (jogador_id,) in db.session.query(PagamentoCofre.jogador_id).filter(
+            PagamentoCofre.semana_id == semana_id,
+            PagamentoCofre.pago == True
+        ).all()}
+        
+        operacoes = [
+            {'acao': 'pagar', 'jogador_id': jogador_id, 'valor': valor_padrao}
+            for jogador_id in jogadores_ids if jogador_id not in ja_pagos
+        ]
+        
+        pagamentos, erros, jogadores_processados = aplicar_operacoes_cofre(
+            semana_id, operacoes, current_user.username,
+            descricao_entrada='Pagamento em lote: {nome}',
+            observacao_entrada='Processamento em lote'
+        )
+        valor_total = sum(p['valor'] for p in pagamentos if p['pago'])
         
         db.session.commit()
         
+        semana_info, resumo_metodos = calcular_agregados_cofre(semana_id)
+        
         return jsonify({
             'success': True, 
             'message': f'{jogadores_processados} jogadores marcados como pagos!',
-            'total': valor_total
+            'total': valor_total,
+            'pagamentos': pagamentos,
+            'semana_info': semana_info,
+            'resumo_metodos': resumo_metodos,
+            'saldo_total': calcular_saldo_cofre()
         })
         
     except Exception as e:
@@ -3995,11 +5261,289 @@ def api_cofre_salvar_observacao():
             return jsonify({'success': True, 'message': 'Observação salva!'})
         else:
             return jsonify({'success': False, 'message': 'Pagamento não encontrado!'})
-            
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Erro: {str(e)}'})
+
+METODOS_PAGAMENTO_COFRE = ('dinheiro', 'pix', 'cartao', 'outro')
+
+TIPOS_MOVIMENTO_CREDITO = ('entrada', 'deposito', 'ajuste')
+TIPOS_MOVIMENTO_DEBITO = ('saida', 'retirada')
+
+def calcular_saldo_cofre(antes_de=None):
+    """Saldo total do cofre (entradas - saídas) em uma única consulta"""
+    query = db.session.query(func.sum(case(
+        (MovimentoCofre.tipo.in_(TIPOS_MOVIMENTO_CREDITO), MovimentoCofre.valor),
+        (MovimentoCofre.tipo.in_(TIPOS_MOVIMENTO_DEBITO), -MovimentoCofre.valor),
+        else_=0
+    )))
+    arquivado = db.session.query(func.sum(ArquivoSemana.saldo_movimentos))
+    if antes_de:
+        query = query.filter(MovimentoCofre.created_at < antes_de)
+        arquivado = arquivado.filter(ArquivoSemana.ultimo_movimento_em < antes_de)
+    return (query.scalar() or 0) + (arquivado.scalar() or 0)
+
+def calcular_agregados_cofre(semana_id):
+    """Resumo de pagamentos da semana agrupado por status e método"""
+    linhas = db.session.query(
+        PagamentoCofre.pago,
+        PagamentoCofre.metodo_pagamento,
+        func.count(PagamentoCofre.id),
+        func.sum(PagamentoCofre.valor)
+    ).filter(
+        PagamentoCofre.semana_id == semana_id
+    ).group_by(PagamentoCofre.pago, PagamentoCofre.metodo_pagamento).all()
+
+    semana_info = {'total': 0, 'pagos': 0, 'pendentes': 0, 'arrecadado': 0}
+    resumo_metodos = {metodo: 0 for metodo in METODOS_PAGAMENTO_COFRE}
+
+    for pago, metodo, quantidade, soma in linhas:
+        semana_info['total'] += quantidade
+        if pago:
+            semana_info['pagos'] += quantidade
+            semana_info['arrecadado'] += soma or 0
+            if metodo in resumo_metodos:
+                resumo_metodos[metodo] += soma or 0
+        else:
+            semana_info['pendentes'] += quantidade
+
+    # Semana arquivada: os pagamentos (todos quitados) estão no resumo do arquivo
+    registro = db.session.get(ArquivoSemana, semana_id) if not linhas else None
+    if registro:
+        semana_info['total'] = semana_info['pagos'] = registro.pagamentos or 0
+        semana_info['arrecadado'] = registro.valor_pago or 0
+        for metodo, (_, valor) in json.loads(registro.pagamentos_metodo or '{}').items():
+            if metodo in resumo_metodos:
+                resumo_metodos[metodo] += valor
+
+    return semana_info, resumo_metodos
+
+def aplicar_operacoes_cofre(semana_id, operacoes, usuario,
+                            descricao_entrada='Pagamento de {nome}', observacao_entrada=None):
+    """Aplica uma lista de operações do cofre com inserts/updates em lote.
+
+    Ações aceitas: pagar, desmarcar, metodo, observacao, valor.
+    Não faz commit - quem chama controla a transação.
+    Retorna (pagamentos alterados, lista de erros, quantidade processada).
+    """
+    jogadores_ids = set()
+    for op in operacoes:
+        try:
+            jogadores_ids.add(int(op.get('jogador_id')))
+        except (TypeError, ValueError):
+            pass
+
+    nomes = dict(db.session.query(Jogador.id, Jogador.nome).filter(
+        Jogador.id.in_(jogadores_ids)
+    ).all()) if jogadores_ids else {}
+
+    # Jogadores confirmados ou escalados na semana (uma consulta): só eles
+    # podem ganhar um pagamento novo, como nas telas de pagamento individual
+    vinculados = {jogador_id for (jogador_id,) in db.session.query(Confirmacao.jogador_id).filter(
+        Confirmacao.semana_id == semana_id,
+        Confirmacao.confirmado == True,
+        Confirmacao.jogador_id.in_(jogadores_ids)
+    ).union(db.session.query(EscolhaDraft.jogador_id).filter(
+        EscolhaDraft.semana_id == semana_id,
+        EscolhaDraft.jogador_id.in_(jogadores_ids)
+    ))} if jogadores_ids else set()
+
+    # Estado atual dos pagamentos desta semana (uma consulta)
+    estado = {}
+    if jogadores_ids:
+        for p in PagamentoCofre.query.filter(
+            PagamentoCofre.semana_id == semana_id,
+            PagamentoCofre.jogador_id.in_(jogadores_ids)
+        ).all():
+            estado[p.jogador_id] = {
+                'id': p.id,
+                'jogador_id': p.jogador_id,
+                'valor': p.valor,
+                'pago': bool(p.pago),
+                'pago_em': p.pago_em,
+                'metodo_pagamento': p.metodo_pagamento,
+                'observacao': p.observacao
+            }
+
+    agora = datetime.utcnow()
+    novos = {}
+    alterados = set()
+    movimentos = []
+    erros = []
+    processadas = 0
+
+    for op in operacoes:
+        acao = op.get('acao')
+        try:
+            jogador_id = int(op.get('jogador_id'))
+        except (TypeError, ValueError):
+            erros.append({'jogador_id': op.get('jogador_id'), 'acao': acao, 'message': 'Jogador inválido!'})
+            continue
+
+        nome = nomes.get(jogador_id)
+        if nome is None:
+            erros.append({'jogador_id': jogador_id, 'acao': acao, 'message': 'Jogador não encontrado!'})
+            continue
+
+        if acao not in ('pagar', 'desmarcar', 'metodo', 'observacao', 'valor'):
+            erros.append({'jogador_id': jogador_id, 'acao': acao, 'message': 'Ação inválida!'})
+            continue
+
+        registro = estado.get(jogador_id)
+        novo = registro is None
+        if novo:
+            if jogador_id not in vinculados:
+                erros.append({'jogador_id': jogador_id, 'acao': acao,
+                              'message': 'Jogador não está confirmado nem escalado nesta semana!'})
+                continue
+            if acao == 'desmarcar':
+                erros.append({'jogador_id': jogador_id, 'acao': acao,
+                              'message': 'Pagamento não encontrado ou já está pendente!'})
+                continue
+            registro = {
+                'semana_id': semana_id,
+                'jogador_id': jogador_id,
+                'valor': VALOR_PADRAO_JOGO,
+                'pago': False,
+                'pago_em': None,
+                'metodo_pagamento': 'dinheiro',
+                'observacao': None,
+                'registrado_por': usuario
+            }
+
+        if 'valor' in op and acao in ('pagar', 'valor'):
+            try:
+                valor = float(op['valor'])
+            except (TypeError, ValueError):
+                valor = -1
+            if valor < 0:
+                erros.append({'jogador_id': jogador_id, 'acao': acao, 'message': 'Valor inválido!'})
+                continue
+        else:
+            valor = registro['valor']
+
+        metodo = op.get('metodo_pagamento') or registro['metodo_pagamento'] or 'dinheiro'
+        if metodo not in METODOS_PAGAMENTO_COFRE:
+            erros.append({'jogador_id': jogador_id, 'acao': acao, 'message': 'Método de pagamento inválido!'})
+            continue
+
+        if acao == 'pagar':
+            if registro['pago']:
+                erros.append({'jogador_id': jogador_id, 'acao': acao, 'message': 'Pagamento já registrado!'})
+                continue
+            registro.update(pago=True, pago_em=agora, valor=valor, metodo_pagamento=metodo)
+            movimentos.append({
+                'tipo': 'entrada',
+                'valor': valor,
+                'descricao': descricao_entrada.format(nome=nome),
+                'semana_id': semana_id,
+                'observacao': observacao_entrada or f'Método: {metodo}',
+                'usuario': usuario
+            })
+
+        elif acao == 'desmarcar':
+            if not registro['pago']:
+                erros.append({'jogador_id': jogador_id, 'acao': acao,
+                              'message': 'Pagamento não encontrado ou já está pendente!'})
+                continue
+            registro.update(pago=False, pago_em=None)
+            movimentos.append({
+                'tipo': 'ajuste',
+                'valor': -registro['valor'],
+                'descricao': f'Ajuste: Cancelamento de pagamento de {nome}',
+                'semana_id': semana_id,
+                'observacao': 'Pagamento cancelado',
+                'usuario': usuario
+            })
+
+        elif acao == 'metodo':
+            registro['metodo_pagamento'] = metodo
+
+        elif acao == 'observacao':
+            registro['observacao'] = (op.get('observacao') or '')[:200]
+
+        elif acao == 'valor':
+            # Pagamento já lançado: registra a diferença no cofre
+            if registro['pago'] and valor != registro['valor']:
+                movimentos.append({
+                    'tipo': 'ajuste',
+                    'valor': valor - registro['valor'],
+                    'descricao': f'Ajuste: Valor de pagamento de {nome}',
+                    'semana_id': semana_id,
+                    'observacao': f'De R$ {registro["valor"]:.2f} para R$ {valor:.2f}',
+                    'usuario': usuario
+                })
+            registro['valor'] = valor
+
+        # Só entra no lote depois de passar pelas validações
+        if novo:
+            estado[jogador_id] = registro
+            novos[jogador_id] = registro
+        alterados.add(jogador_id)
+        processadas += 1
+
+    if novos:
+        db.session.bulk_insert_mappings(PagamentoCofre, list(novos.values()))
+
+    atualizacoes = [
+        dict(estado[jogador_id], updated_at=agora)
+        for jogador_id in alterados if jogador_id not in novos
+    ]
+    if atualizacoes:
+        db.session.bulk_update_mappings(PagamentoCofre, atualizacoes)
+
+    if movimentos:
+        db.session.bulk_insert_mappings(MovimentoCofre, movimentos)
+
+    pagamentos = [{
+        'jogador_id': jogador_id,
+        'valor': estado[jogador_id]['valor'],
+        'pago': estado[jogador_id]['pago'],
+        'pago_em': estado[jogador_id]['pago_em'].isoformat() if estado[jogador_id]['pago_em'] else None,
+        'metodo_pagamento': estado[jogador_id]['metodo_pagamento'],
+        'observacao': estado[jogador_id]['observacao'] or ''
+    } for jogador_id in sorted(alterados)]
+
+    return pagamentos, erros, processadas
+
+@app.route('/api/cofre/lote', methods=['POST'])
+@admin_required
+def api_cofre_lote():
+    """API para aplicar várias operações do cofre em uma única transação"""
+    data = request.get_json() or {}
+
+    semana_id = data.get('semana_id')
+    operacoes = data.get('operacoes') or []
+
+    if not semana_id or not isinstance(operacoes, list) or not operacoes:
+        return jsonify({'success': False, 'message': 'Dados incompletos!'})
+
+    if not db.session.get(Semana, semana_id):
+        return jsonify({'success': False, 'message': 'Semana não encontrada!'})
+
+    try:
+        pagamentos, erros, processadas = aplicar_operacoes_cofre(
+            semana_id, operacoes, current_user.username
+        )
+        db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Erro: {str(e)}'})
 
+    semana_info, resumo_metodos = calcular_agregados_cofre(semana_id)
+
+    return jsonify({
+        'success': True,
+        'message': f'{processadas} operação(ões) aplicada(s)!',
+        'processadas': processadas,
+        'erros': erros,
+        'pagamentos': pagamentos,
+        'semana_info': semana_info,
+        'resumo_metodos': resumo_metodos,
+        'saldo_total': calcular_saldo_cofre()
+    })
+
 @app.route('/api/cofre/deposito', methods=['POST'])
 @admin_required
 def api_cofre_deposito():
@@ -4058,15 +5602,7 @@ def api_cofre_saque():
         return jsonify({'success': False, 'message': 'Valor inválido!'})
     
     # Verificar saldo
-    entradas = db.session.query(func.sum(MovimentoCofre.valor)).filter(
-        MovimentoCofre.tipo.in_(['entrada', 'deposito', 'ajuste'])
-    ).scalar() or 0
-    
-    saidas = db.session.query(func.sum(MovimentoCofre.valor)).filter(
-        MovimentoCofre.tipo.in_(['saida', 'retirada'])
-    ).scalar() or 0
-    
-    saldo_disponivel = entradas - saidas
+    saldo_disponivel = calcular_saldo_cofre()
     
     if valor > saldo_disponivel:
         return jsonify({
@@ -4183,14 +5719,510 @@ def api_cofre_adicionar_jogador_manual():
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Erro: {str(e)}'})
 
+# ======================================================
+# RELATÓRIOS PDF
+# ======================================================
+# Os PDFs são gerados por um escritor mínimo em Python puro, fora da
+# requisição (threads nativas do gevent), e ficam em cache no disco. A chave do cache
+# inclui uma assinatura dos dados do período, então qualquer alteração em
+# pagamentos ou times gera um novo arquivo e uma semana fechada é renderizada
+# uma única vez.
+
+PDF_CACHE_DIR = os.path.join(BASE_DIR, "instance", "relatorios_pdf")
+PDF_ESPERA_MAXIMA = 20  # segundos que a requisição aguarda a renderização
+VERSAO_LAYOUT_PDF = 1  # incrementar ao mudar o layout para invalidar o cache
+
+pdf_jobs = {}
+pdf_jobs_lock = Lock()
+
+def executar_fora_do_loop(funcao, *args):
+    """Roda a função numa thread nativa do pool do gevent e devolve um AsyncResult.
+    
+    No worker gevent o módulo threading é monkey-patched: um
+    ThreadPoolExecutor comum roda em greenlets e o trabalho de CPU trava o
+    loop de eventos (sockets, timers do draft) até terminar.
+    """
+    return gevent.get_hub().threadpool.spawn(funcao, *args)
+
+def aguardar_resultado(resultado, timeout):
+    """Espera um AsyncResult; levanta concurrent.futures.TimeoutError se não terminar a tempo"""
+    try:
+        return resultado.get(timeout=timeout)
+    except gevent.Timeout:
+        raise FuturesTimeoutError()
+
+class DocumentoPDF:
+    """Gerador mínimo de PDF (texto, tabelas simples e linhas) sem dependências externas"""
+    LARGURA, ALTURA = 595, 842  # A4 em pontos
+    MARGEM = 45
+    
+    def __init__(self, titulo):
+        self.titulo = titulo
+        self.paginas = []
+        self._nova_pagina()
+    
+    def _nova_pagina(self):
+        self.comandos = []
+        self.paginas.append(self.comandos)
+        self.y = self.ALTURA - self.MARGEM
+    
+    def _garantir_espaco(self, altura):
+        if self.y - altura < self.MARGEM + 15:
+            self._nova_pagina()
+    
+    @staticmethod
+    def _escapar(texto):
+        texto = str(texto).encode('cp1252', errors='replace').decode('latin-1')
+        return texto.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    
+    @staticmethod
+    def _cortar(texto, largura, tamanho):
+        # Largura média da Helvetica ~0.5em; suficiente para não invadir a coluna vizinha
+        max_chars = max(int(largura / (tamanho * 0.52)), 1)
+        texto = str(texto)
+        return texto if len(texto) <= max_chars else texto[:max_chars - 1] + '…'
+    
+    def _texto_em(self, x, y, texto, tamanho, negrito=False, cor=None):
+        fonte = 'F2' if negrito else 'F1'
+        cor_cmd = f'{cor[0]:.2f} {cor[1]:.2f} {cor[2]:.2f} rg ' if cor else ''
+        self.comandos.append(
+            f'BT {cor_cmd}/{fonte} {tamanho} Tf {x:.1f} {y:.1f} Td ({self._escapar(texto)}) Tj ET'
+        )
+    
+    def titulo_secao(self, texto, tamanho=13):
+        self._garantir_espaco(tamanho + 24)
+        self.y -= tamanho + 8
+        self._texto_em(self.MARGEM, self.y, texto, tamanho, negrito=True, cor=(0.10, 0.25, 0.45))
+        self.y -= 4
+        self.separador()
+    
+    def texto(self, conteudo, tamanho=10, negrito=False, recuo=0):
+        largura = self.LARGURA - 2 * self.MARGEM - recuo
+        max_chars = max(int(largura / (tamanho * 0.5)), 10)
+        palavras = str(conteudo).split()
+        linha = ''
+        linhas = []
+        for palavra in palavras:
+            candidata = f'{linha} {palavra}'.strip()
+            if len(candidata) > max_chars and linha:
+                linhas.append(linha)
+                linha = palavra
+            else:
+                linha = candidata
+        linhas.append(linha)
+        for linha in linhas:
+            self._garantir_espaco(tamanho + 4)
+            self.y -= tamanho + 4
+            self._texto_em(self.MARGEM + recuo, self.y, linha, tamanho, negrito)
+    
+    def tabela(self, cabecalho, linhas, larguras, tamanho=9, alinhar_direita=()):
+        """Tabela simples; larguras em frações da área útil. Repete o cabeçalho a cada página."""
+        util = self.LARGURA - 2 * self.MARGEM
+        colunas = [l * util for l in larguras]
+        
+        def desenhar(valores, negrito=False):
+            x = self.MARGEM
+            for i, (valor, largura) in enumerate(zip(valores, colunas)):
+                valor = self._cortar(valor, largura - 4, tamanho)
+                if i in alinhar_direita:
+                    pos = x + largura - 4 - len(valor) * tamanho * 0.5
+                else:
+                    pos = x
+                self._texto_em(pos, self.y, valor, tamanho, negrito)
+                x += largura
+        
+        def desenhar_cabecalho():
+            self.y -= tamanho + 6
+            desenhar(cabecalho, negrito=True)
+            self.y -= 3
+            self.separador(espessura=0.5)
+        
+        self._garantir_espaco(2 * (tamanho + 6))
+        desenhar_cabecalho()
+        for valores in linhas:
+            if self.y - (tamanho + 5) < self.MARGEM + 15:
+                self._nova_pagina()
+                desenhar_cabecalho()
+            self.y -= tamanho + 5
+            desenhar(valores, negrito=valores is linhas[-1] and str(valores[0]).upper() == 'TOTAL')
+    
+    def separador(self, espessura=0.8):
+        self.comandos.append(
+            f'{espessura} w 0.6 0.6 0.6 RG {self.MARGEM} {self.y:.1f} m '
+            f'{self.LARGURA - self.MARGEM} {self.y:.1f} l S'
+        )
+        self.y -= 4
+    
+    def espaco(self, altura=8):
+        self.y -= altura
+    
+    def gerar(self):
+        """Serializa o documento e devolve os bytes do PDF"""
+        total = len(self.paginas)
+        gerado_em = datetime.now().strftime('%d/%m/%Y %H:%M')
+        for numero, comandos in enumerate(self.paginas, 1):
+            self.comandos = comandos
+            self._texto_em(self.MARGEM, 25, f'{self.titulo} - gerado em {gerado_em}', 7, cor=(0.4, 0.4, 0.4))
+            self._texto_em(self.LARGURA - self.MARGEM - 50, 25, f'Página {numero} de {total}', 7, cor=(0.4, 0.4, 0.4))
+        
+        objetos = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            None,  # páginas, preenchido abaixo
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        ]
+        kids = []
+        for comandos in self.paginas:
+            conteudo = zlib.compress('\n'.join(comandos).encode('latin-1'))
+            objetos.append(
+                b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(conteudo) + conteudo + b'\nendstream'
+            )
+            objetos.append((
+                f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.LARGURA} {self.ALTURA}] '
+                f'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {len(objetos)} 0 R >>'
+            ).encode('latin-1'))
+            kids.append(f'{len(objetos)} 0 R')
+        objetos[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {total} >>'.encode('latin-1')
+        
+        saida = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for numero, corpo in enumerate(objetos, 1):
+            offsets.append(len(saida))
+            saida += b'%d 0 obj\n' % numero + corpo + b'\nendobj\n'
+        inicio_xref = len(saida)
+        saida += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objetos) + 1)
+        for offset in offsets:
+            saida += b'%010d 00000 n \n' % offset
+        info = self._escapar(self.titulo).encode('latin-1')
+        saida += (b'trailer\n<< /Size %d /Root 1 0 R /Info << /Title (' % (len(objetos) + 1)
+                  + info + b') /Producer (Volei Draft) >> >>\nstartxref\n%d\n%%%%EOF\n' % inicio_xref)
+        return bytes(saida)
+
+def versao_dados_cofre(inicio, fim):
+    """Assinatura dos dados que entram nos relatórios do período (muda a cada alteração)"""
+    pagamentos = db.session.query(
+        func.count(PagamentoCofre.id),
+        func.max(PagamentoCofre.updated_at),
+        func.sum(PagamentoCofre.valor),
+        func.sum(case((PagamentoCofre.pago == True, 1), else_=0))
+    ).join(Semana, Semana.id == PagamentoCofre.semana_id).filter(
+        Semana.data >= inicio, Semana.data <= fim
+    ).one()
+    escolhas = db.session.query(
+        func.count(EscolhaDraft.id),
+        func.max(EscolhaDraft.id),
+        func.sum(EscolhaDraft.time_id)
+    ).join(Semana, Semana.id == EscolhaDraft.semana_id).filter(
+        Semana.data >= inicio, Semana.data <= fim
+    ).one()
+    times = db.session.query(
+        func.count(Time.id),
+        func.max(Time.id),
+        func.sum(Time.capitao_id)
+    ).join(Semana, Semana.id == Time.semana_id).filter(
+        Semana.data >= inicio, Semana.data <= fim
+    ).one()
+    assinatura = repr((VERSAO_LAYOUT_PDF, tuple(pagamentos), tuple(escolhas), tuple(times)))
+    return hashlib.sha1(assinatura.encode()).hexdigest()[:12]
+
+def resumo_metodos_periodo(inicio, fim):
+    """Pagamentos confirmados agrupados por método no período (inclui semanas arquivadas)"""
+    metodos = {metodo: [quantidade, valor or 0] for metodo, quantidade, valor in db.session.query(
+        PagamentoCofre.metodo_pagamento,
+        func.count(PagamentoCofre.id),
+        func.sum(PagamentoCofre.valor)
+    ).join(Semana, Semana.id == PagamentoCofre.semana_id).filter(
+        Semana.data >= inicio, Semana.data <= fim,
+        PagamentoCofre.pago == True
+    ).group_by(PagamentoCofre.metodo_pagamento)}
+    
+    for (resumo,) in db.session.query(ArquivoSemana.pagamentos_metodo).join(
+        Semana, Semana.id == ArquivoSemana.semana_id
+    ).filter(Semana.data >= inicio, Semana.data <= fim, ArquivoSemana.pagamentos > 0):
+        for metodo, (quantidade, valor) in json.loads(resumo or '{}').items():
+            total = metodos.setdefault(metodo, [0, 0])
+            total[0] += quantidade
+            total[1] += valor
+    return sorted(((metodo, quantidade, valor) for metodo, (quantidade, valor) in metodos.items()),
+                  key=lambda item: item[2], reverse=True)
+
+def resumo_semanas_cofre(inicio, fim):
+    """(data, pagamentos, pagos, arrecadado) por semana no período (inclui semanas arquivadas)"""
+    # Semana arquivada não tem pagamento pendente: todos os do resumo estão pagos
+    arquivados = func.coalesce(func.max(ArquivoSemana.pagamentos), 0)
+    query = db.session.query(
+        Semana.data,
+        func.count(PagamentoCofre.id) + arquivados,
+        func.coalesce(func.sum(case((PagamentoCofre.pago == True, 1), else_=0)), 0) + arquivados,
+        func.coalesce(func.sum(case((PagamentoCofre.pago == True, PagamentoCofre.valor), else_=0)), 0)
+        + func.coalesce(func.max(ArquivoSemana.valor_pago), 0)
+    ).outerjoin(
+        PagamentoCofre, PagamentoCofre.semana_id == Semana.id
+    ).outerjoin(
+        ArquivoSemana, ArquivoSemana.semana_id == Semana.id
+    ).group_by(Semana.id, Semana.data).order_by(Semana.data)
+    return filtrar_periodo(query, Semana.data, inicio, fim)
+
+def pendencias_cofre(inicio, fim):
+    """Jogadores com jogos não pagos no período.
+    
+    Conta pagamentos marcados como pendentes e também jogadores avulsos que
+    jogaram (estão em um time) e ainda não têm registro no cofre.
+    """
+    devedores = {}
+    
+    pendentes = db.session.query(
+        Jogador.id, Jogador.nome, func.count(PagamentoCofre.id), func.sum(PagamentoCofre.valor)
+    ).join(PagamentoCofre, PagamentoCofre.jogador_id == Jogador.id).join(
+        Semana, Semana.id == PagamentoCofre.semana_id
+    ).filter(
+        Semana.data >= inicio, Semana.data <= fim,
+        PagamentoCofre.pago == False
+    ).group_by(Jogador.id, Jogador.nome).all()
+    for jogador_id, nome, jogos, valor in pendentes:
+        devedores[jogador_id] = {'nome': nome, 'jogos': jogos, 'valor': valor or 0}
+    
+    sem_registro = db.session.query(
+        Jogador.id, Jogador.nome, func.count(EscolhaDraft.id)
+    ).join(EscolhaDraft, EscolhaDraft.jogador_id == Jogador.id).join(
+        Semana, Semana.id == EscolhaDraft.semana_id
+    ).outerjoin(
+        PagamentoCofre,
+        (PagamentoCofre.semana_id == EscolhaDraft.semana_id) & (PagamentoCofre.jogador_id == Jogador.id)
+    ).filter(
+        Semana.data >= inicio, Semana.data <= fim,
+        or_(Jogador.mensalista == False, Jogador.mensalista.is_(None)),
+        PagamentoCofre.id.is_(None)
+    ).group_by(Jogador.id, Jogador.nome).all()
+    for jogador_id, nome, jogos in sem_registro:
+        item = devedores.setdefault(jogador_id, {'nome': nome, 'jogos': 0, 'valor': 0})
+        item['jogos'] += jogos
+        item['valor'] += jogos * VALOR_PADRAO_JOGO
+    
+    return sorted(devedores.values(), key=lambda d: (-d['valor'], d['nome']))
+
+def escalacoes_periodo(inicio, fim):
+    """Times formados no período com seus jogadores, agrupados por semana"""
+    capitao = db.aliased(Jogador)
+    times = db.session.query(
+        Time.id, Time.nome, Semana.data, capitao.nome
+    ).join(Semana, Semana.id == Time.semana_id).outerjoin(
+        capitao, capitao.id == Time.capitao_id
+    ).filter(
+        Semana.data >= inicio, Semana.data <= fim
+    ).order_by(Semana.data, Time.ordem_escolha).all()
+    
+    jogadores_por_time = {}
+    escolhas = db.session.query(
+        EscolhaDraft.time_id, Jogador.nome, Jogador.posicao
+    ).join(Jogador, Jogador.id == EscolhaDraft.jogador_id).join(
+        Semana, Semana.id == EscolhaDraft.semana_id
+    ).filter(
+        Semana.data >= inicio, Semana.data <= fim
+    ).order_by(EscolhaDraft.ordem_escolha).all()
+    for time_id, nome, posicao in escolhas:
+        jogadores_por_time.setdefault(time_id, []).append((nome, posicao))
+    for linha in escolhas_arquivadas(arquivos_semanas(inicio, fim)):
+        jogadores_por_time.setdefault(linha[1], []).append((linha[6], linha[7]))
+    
+    semanas = {}
+    for time_id, nome, data_semana, capitao_nome in times:
+        semanas.setdefault(data_semana, []).append({
+            'nome': nome or 'Time',
+            'capitao': capitao_nome,
+            'jogadores': jogadores_por_time.get(time_id, [])
+        })
+    return semanas
+
+def _pdf_metodos_e_pendencias(doc, inicio, fim):
+    doc.titulo_secao('Pagamentos por método')
+    metodos = resumo_metodos_periodo(inicio, fim)
+    total_valor = sum(valor or 0 for _, _, valor in metodos)
+    linhas = [
+        [(metodo or 'outro').capitalize(), qtd, f'R$ {valor or 0:.2f}',
+         f'{((valor or 0) / total_valor * 100) if total_valor else 0:.1f}%']
+        for metodo, qtd, valor in metodos
+    ]
+    linhas.append(['TOTAL', sum(qtd for _, qtd, _ in metodos), f'R$ {total_valor:.2f}', '100.0%' if total_valor else '0.0%'])
+    doc.tabela(['Método', 'Pagamentos', 'Valor', '%'], linhas, [0.4, 0.2, 0.25, 0.15], alinhar_direita=(1, 2, 3))
+    
+    doc.titulo_secao('Pendências')
+    pendencias = pendencias_cofre(inicio, fim)
+    if pendencias:
+        linhas = [[p['nome'], p['jogos'], f"R$ {p['valor']:.2f}"] for p in pendencias]
+        linhas.append(['TOTAL', sum(p['jogos'] for p in pendencias), f"R$ {sum(p['valor'] for p in pendencias):.2f}"])
+        doc.tabela(['Jogador', 'Jogos não pagos', 'Valor devido'], linhas, [0.55, 0.2, 0.25], alinhar_direita=(1, 2))
+    else:
+        doc.texto('Nenhuma pendência no período.')
+
+def renderizar_pdf_semana(semana_id):
+    """Monta o PDF do relatório semanal do cofre"""
+    semana = db.session.get(Semana, semana_id)
+    data_txt = semana.data.strftime('%d/%m/%Y')
+    doc = DocumentoPDF(f'Relatório do Cofre - Semana {data_txt}')
+    
+    doc.texto(f'Relatório do Cofre - Semana {data_txt}', tamanho=18, negrito=True)
+    if semana.descricao:
+        doc.texto(semana.descricao, tamanho=10)
+    
+    semana_info, _ = calcular_agregados_cofre(semana_id)
+    doc.titulo_secao('Resumo')
+    doc.tabela(
+        ['Jogadores', 'Pagos', 'Pendentes', 'Arrecadado'],
+        [[semana_info['total'], semana_info['pagos'], semana_info['pendentes'],
+          f"R$ {semana_info['arrecadado']:.2f}"]],
+        [0.25, 0.25, 0.25, 0.25], alinhar_direita=(0, 1, 2, 3)
+    )
+    
+    _pdf_metodos_e_pendencias(doc, semana.data, semana.data)
+    
+    doc.titulo_secao('Pagamentos')
+    pagamentos = db.session.query(
+        Jogador.nome, PagamentoCofre.valor, PagamentoCofre.metodo_pagamento,
+        PagamentoCofre.pago, PagamentoCofre.pago_em
+    ).outerjoin(Jogador, Jogador.id == PagamentoCofre.jogador_id).filter(
+        PagamentoCofre.semana_id == semana_id
+    ).order_by(Jogador.nome).all()
+    if not pagamentos:
+        pagamentos = sorted((linha[1:6] for linha in pagamentos_arquivados(arquivos_semanas(semana_id=semana_id))),
+                            key=lambda p: p[0] or '')
+    if pagamentos:
+        doc.tabela(
+            ['Jogador', 'Valor', 'Método', 'Status', 'Pago em'],
+            [[nome or 'Jogador Manual', f'R$ {valor:.2f}', metodo or '', 'Pago' if pago else 'Pendente',
+              pago_em.strftime('%d/%m %H:%M') if pago_em else ''] for nome, valor, metodo, pago, pago_em in pagamentos],
+            [0.36, 0.14, 0.16, 0.14, 0.2], alinhar_direita=(1,)
+        )
+    else:
+        doc.texto('Nenhum pagamento registrado.')
+    
+    doc.titulo_secao('Times')
+    times = escalacoes_periodo(semana.data, semana.data).get(semana.data, [])
+    if not times:
+        doc.texto('Nenhum time formado nesta semana.')
+    for time in times:
+        doc.espaco(4)
+        doc.texto(f"{time['nome']}" + (f" (capitão: {time['capitao']})" if time['capitao'] else ''), tamanho=11, negrito=True)
+        for ordem, (nome, posicao) in enumerate(time['jogadores'], 1):
+            doc.texto(f'{ordem}. {nome}' + (f' - {posicao}' if posicao else ''), tamanho=9, recuo=12)
+    
+    return doc.gerar()
+
+def renderizar_pdf_mes(ano, mes):
+    """Monta o PDF do relatório mensal do cofre"""
+    inicio, fim = intervalo_datas(ano=ano, mes=mes)
+    doc = DocumentoPDF(f'Relatório do Cofre - {mes:02d}/{ano}')
+    doc.texto(f'Relatório do Cofre - {mes:02d}/{ano}', tamanho=18, negrito=True)
+    
+    doc.titulo_secao('Semanas')
+    semanas = resumo_semanas_cofre(inicio, fim).all()
+    linhas = [
+        [data_semana.strftime('%d/%m/%Y'), total, f'{pagos}/{total}', f'R$ {arrecadado:.2f}',
+         f'{(pagos / total * 100) if total else 0:.1f}%']
+        for data_semana, total, pagos, arrecadado in semanas
+    ]
+    total_jogadores = sum(s[1] for s in semanas)
+    total_pagos = sum(s[2] for s in semanas)
+    linhas.append(['TOTAL', total_jogadores, f'{total_pagos}/{total_jogadores}',
+                   f'R$ {sum(s[3] for s in semanas):.2f}',
+                   f'{(total_pagos / total_jogadores * 100) if total_jogadores else 0:.1f}%'])
+    doc.tabela(['Semana', 'Jogadores', 'Pagamentos', 'Arrecadado', 'Taxa'], linhas,
+               [0.24, 0.16, 0.2, 0.24, 0.16], alinhar_direita=(1, 2, 3, 4))
+    
+    _pdf_metodos_e_pendencias(doc, inicio, fim)
+    
+    doc.titulo_secao('Times')
+    escalacoes = escalacoes_periodo(inicio, fim)
+    if not escalacoes:
+        doc.texto('Nenhum time formado no mês.')
+    for data_semana, times in escalacoes.items():
+        doc.espaco(4)
+        doc.texto(data_semana.strftime('%d/%m/%Y'), tamanho=11, negrito=True)
+        for time in times:
+            nomes = ', '.join(nome for nome, _ in time['jogadores']) or '-'
+            capitao = f" (cap. {time['capitao']})" if time['capitao'] else ''
+            doc.texto(f"{time['nome']}{capitao}: {nomes}", tamanho=9, recuo=12)
+    
+    return doc.gerar()
+
+def _renderizar_e_salvar_pdf(caminho, prefixo, renderizar, args):
+    """Executado no pool: renderiza, grava atomicamente e remove versões antigas"""
+    with app.app_context():
+        conteudo = renderizar(*args)
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'wb') as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+    for nome in os.listdir(PDF_CACHE_DIR):
+        antigo = os.path.join(PDF_CACHE_DIR, nome)
+        if nome.startswith(f'{prefixo}_') and nome.endswith('.pdf') and antigo != caminho:
+            os.remove(antigo)
+    return caminho
+
+def obter_relatorio_pdf(prefixo, versao, renderizar, *args):
+    """Devolve o caminho do PDF em cache, renderizando no pool se necessário.
+    
+    Requisições simultâneas pela mesma versão compartilham a mesma renderização.
+    Levanta concurrent.futures.TimeoutError se não terminar a tempo.
+    """
+    caminho = os.path.join(PDF_CACHE_DIR, f'{prefixo}_{versao}.pdf')
+    if os.path.exists(caminho):
+        return caminho
+    
+    with pdf_jobs_lock:
+        resultado = pdf_jobs.get(caminho)
+        if resultado is None:
+            resultado = executar_fora_do_loop(_renderizar_e_salvar_pdf, caminho, prefixo, renderizar, args)
+            pdf_jobs[caminho] = resultado
+            # Roda no hub quando a thread termina; não pode bloquear (sem lock)
+            resultado.rawlink(lambda _: pdf_jobs.pop(caminho, None))
+    return aguardar_resultado(resultado, PDF_ESPERA_MAXIMA)
+
+def _responder_pdf(prefixo, versao, nome_download, renderizar, *args, voltar_para):
+    try:
+        caminho = obter_relatorio_pdf(prefixo, versao, renderizar, *args)
+    except FuturesTimeoutError:
+        flash('O relatório ainda está sendo gerado. Tente novamente em alguns segundos.', 'info')
+        return redirect(voltar_para)
+    except Exception as e:
+        print(f"❌ Erro ao gerar PDF {prefixo}: {e}")
+        flash('Erro ao gerar o relatório em PDF.', 'danger')
+        return redirect(voltar_para)
+    
+    return send_file(caminho, mimetype='application/pdf', download_name=nome_download)
+
 @app.route('/admin/cofre/relatorio/semana/<int:semana_id>/pdf')
 @admin_required
 def gerar_relatorio_semanal_pdf(semana_id):
     """Gera relatório PDF da semana"""
-    # Esta função seria implementada com uma biblioteca como ReportLab ou WeasyPrint
-    # Por enquanto, retornamos uma mensagem
-    flash('Funcionalidade de PDF em desenvolvimento!', 'info')
-    return redirect(url_for('cofre_principal', semana_id=semana_id))
+    semana = Semana.query.get_or_404(semana_id)
+    versao = versao_dados_cofre(semana.data, semana.data)
+    
+    return _responder_pdf(
+        f'semana_{semana_id}', versao,
+        f"relatorio_semana_{semana.data.strftime('%Y%m%d')}.pdf",
+        renderizar_pdf_semana, semana_id,
+        voltar_para=url_for('cofre_principal', semana_id=semana_id)
+    )
+
+@app.route('/admin/cofre/relatorio/mes/<int:ano>/<int:mes>/pdf')
+@admin_required
+def gerar_relatorio_mensal_pdf(ano, mes):
+    """Gera relatório PDF do mês"""
+    if not 1 <= mes <= 12:
+        flash('Mês inválido!', 'danger')
+        return redirect(url_for('cofre_principal'))
+    
+    inicio, fim = intervalo_datas(ano=ano, mes=mes)
+    versao = versao_dados_cofre(inicio, fim)
+    
+    return _responder_pdf(
+        f'mes_{ano}{mes:02d}', versao,
+        f'relatorio_mes_{mes:02d}_{ano}.pdf',
+        renderizar_pdf_mes, ano, mes,
+        voltar_para=url_for('cofre_principal')
+    )
 
 @app.route('/admin/cofre/relatorio/semana/<int:semana_id>/exportar')
 @admin_required
@@ -4198,131 +6230,987 @@ def exportar_relatorio_semanal(semana_id):
     """Exporta relatório da semana em CSV"""
     semana = Semana.query.get_or_404(semana_id)
     
-    # Buscar pagamentos da semana
-    pagamentos = PagamentoCofre.query.filter_by(semana_id=semana_id).all()
-    
-    import csv
-    from io import StringIO
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Cabeçalho
-    writer.writerow(['Relatório de Pagamentos', f'Semana: {semana.data.strftime("%d/%m/%Y")}'])
-    writer.writerow(['Data de geração:', datetime.now().strftime("%d/%m/%Y %H:%M")])
-    writer.writerow([])
-    writer.writerow(['Nome', 'Valor (R$)', 'Método', 'Status', 'Data Pagamento', 'Observação'])
-    
-    # Dados
-    for p in pagamentos:
-        writer.writerow([
-            p.jogador.nome if p.jogador else 'Jogador Manual',
-            f'{p.valor:.2f}',
-            p.metodo_pagamento,
-            'Pago' if p.pago else 'Pendente',
-            p.pago_em.strftime("%d/%m/%Y %H:%M") if p.pago_em else '',
-            p.observacao or ''
-        ])
-    
-    output.seek(0)
-    
-    from flask import make_response
-    
-    response = make_response(output.getvalue())
-    response.headers["Content-Disposition"] = f"attachment; filename=relatorio_semana_{semana.data.strftime('%Y%m%d')}.csv"
-    response.headers["Content-type"] = "text/csv"
+    cabecalho = [
+        ['Relatório de Pagamentos', f'Semana: {semana.data.strftime("%d/%m/%Y")}'],
+        ['Data de geração:', datetime.now().strftime("%d/%m/%Y %H:%M")],
+    ]
     
-    return response
+    return resposta_csv_streaming(
+        f"relatorio_semana_{semana.data.strftime('%Y%m%d')}.csv",
+        linhas_pagamentos_cofre(cabecalho, semana_id=semana_id)
+    )
 
 # ======================================================
-# ROTAS PARA JOGADORES
+# EXPORTAÇÃO CSV (STREAMING)
 # ======================================================
+# As exportações leem o banco em lotes (yield_per) e enviam o CSV em pedaços,
+# então o consumo de memória não depende do tamanho do período exportado.
+
+LOTE_EXPORTACAO = 500  # linhas lidas do cursor / enviadas por pedaço
+
+class _LinhaCSV:
+    """Destino do csv.writer que devolve a linha formatada em vez de acumulá-la"""
+    def write(self, valor):
+        return valor
+
+def resposta_csv_streaming(nome_arquivo, linhas):
+    """Monta uma resposta CSV enviada em pedaços a partir de um gerador de linhas"""
+    writer = csv.writer(_LinhaCSV())
+    
+    def gerar():
+        pedaco = []
+        for linha in linhas:
+            pedaco.append(writer.writerow(linha))
+            if len(pedaco) >= LOTE_EXPORTACAO:
+                yield ''.join(pedaco)
+                pedaco = []
+        if pedaco:
+            yield ''.join(pedaco)
+    
+    response = Response(stream_with_context(gerar()), mimetype='text/csv')
+    response.headers["Content-Disposition"] = f"attachment; filename={nome_arquivo}"
+    return response
 
-@app.route('/redefinir_senha_usuario', methods=['POST'])
-@login_required
-def redefinir_senha_usuario():
-    """Permite ao usuário redefinir sua própria senha"""
-    try:
-        data = request.get_json()
-        
-        if not data:
-            return jsonify({'success': False, 'message': 'Dados inválidos!'}), 400
-        
-        senha_atual = data.get('senha_atual')
-        nova_senha = data.get('nova_senha')
-        confirmar_senha = data.get('confirmar_senha')
-        
-        # Validações
-        if not senha_atual or not nova_senha or not confirmar_senha:
-            return jsonify({'success': False, 'message': 'Preencha todos os campos!'}), 400
-        
-        if nova_senha != confirmar_senha:
-            return jsonify({'success': False, 'message': 'As novas senhas não coincidem!'}), 400
-        
-        if len(nova_senha) < 6:
-            return jsonify({'success': False, 'message': 'A nova senha deve ter pelo menos 6 caracteres!'}), 400
-        
-        # Verificar senha atual
-        if not check_password_hash(current_user.password, senha_atual):
-            return jsonify({'success': False, 'message': 'Senha atual incorreta!'}), 401
-        
-        # Atualizar senha
-        current_user.password = generate_password_hash(nova_senha)
-        db.session.commit()
-        
-        print(f"✅ Senha redefinida para usuário: {current_user.username}")
-        return jsonify({'success': True, 'message': 'Senha alterada com sucesso!'})
-        
-    except Exception as e:
-        db.session.rollback()
-        print(f"❌ Erro ao redefinir senha: {e}")
-        return jsonify({'success': False, 'message': f'Erro interno: {str(e)}'}), 500
-
-@app.route('/admin/jogadores')
-@admin_required
-def admin_jogadores():
-    """Lista de jogadores para administração"""
-    # Busca todos os jogadores separados por categoria
-    todos_jogadores = Jogador.query.order_by(Jogador.nome).all()
-    
-    # Separa jogadores por categoria
-    mensalistas_ativos = []
-    nao_mensalistas = []
-    inativos = []
+def intervalo_datas(ano=None, mes=None, inicio=None, fim=None):
+    """Converte filtros de ano/mês em um intervalo fechado de datas.
     
-    for jogador in todos_jogadores:
-        if not jogador.ativo:
-            inativos.append(jogador)
-        elif jogador.mensalista:
-            mensalistas_ativos.append(jogador)
+    Datas explícitas (inicio/fim) têm precedência; None significa intervalo aberto.
+    """
+    if ano and not inicio and not fim:
+        if mes:
+            inicio = date(ano, mes, 1)
+            fim = (date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)) - timedelta(days=1)
         else:
-            nao_mensalistas.append(jogador)
+            inicio, fim = date(ano, 1, 1), date(ano, 12, 31)
+    return inicio, fim
+
+def periodo_exportacao():
+    """Lê o período da query string (inicio/fim no formato AAAA-MM-DD, ou ano/mes).
     
-    return render_template('admin/jogadores.html',
-                         mensalistas_ativos=mensalistas_ativos,
-                         nao_mensalistas=nao_mensalistas,
-                         inativos=inativos)
+    Levanta ValueError se alguma data for inválida.
+    """
+    inicio = request.args.get('inicio')
+    fim = request.args.get('fim')
+    inicio = datetime.strptime(inicio, '%Y-%m-%d').date() if inicio else None
+    fim = datetime.strptime(fim, '%Y-%m-%d').date() if fim else None
+    if inicio and fim and inicio > fim:
+        raise ValueError('Data inicial maior que a final')
+    
+    mes = request.args.get('mes', type=int)
+    if mes is not None and not 1 <= mes <= 12:
+        raise ValueError('Mês inválido')
+    return intervalo_datas(request.args.get('ano', type=int), mes, inicio, fim)
 
-@app.route('/admin/jogador/<int:id>/gerenciar_mensalidade', methods=['GET', 'POST'])
-@admin_required
-def gerenciar_mensalidade(id):
-    """Gerencia a mensalidade de um jogador"""
-    jogador = Jogador.query.get_or_404(id)
+def filtrar_periodo(query, coluna, inicio, fim):
+    """Restringe uma query a coluna entre inicio e fim (inclusive)"""
+    if inicio:
+        query = query.filter(coluna >= inicio)
+    if fim:
+        query = query.filter(coluna <= fim)
+    return query
+
+def sufixo_periodo(inicio, fim):
+    """Sufixo do nome do arquivo exportado de acordo com o período"""
+    return f"{inicio.strftime('%Y%m%d') if inicio else 'inicio'}_{fim.strftime('%Y%m%d') if fim else 'hoje'}"
+
+def descricao_periodo(inicio, fim):
+    return f"{inicio.strftime('%d/%m/%Y') if inicio else 'início'} a {fim.strftime('%d/%m/%Y') if fim else 'hoje'}"
+
+def linhas_resumo_semanas_cofre(inicio, fim, cabecalho):
+    """Resumo de arrecadação por semana, agregado no banco"""
+    yield from cabecalho
+    yield []
+    yield ['Semana', 'Jogadores', 'Arrecadado (R$)', 'Pagamentos', 'Taxa']
     
-    # Busca informações do ciclo atual usando a nova função
-    ciclo_atual_inicio, ciclo_atual_fim = obter_ciclo_das_configuracoes()
-    dias_restantes_ciclo = 0
+    query = resumo_semanas_cofre(inicio, fim)
     
-    if ciclo_atual_inicio and ciclo_atual_fim:
-        hoje = date.today()
-        # Calcula dias do ciclo (não dias restantes)
-        dias_total_ciclo = (ciclo_atual_fim - ciclo_atual_inicio).days + 1
-        
-        # Calcula em que dia do ciclo estamos
-        if ciclo_atual_inicio <= hoje <= ciclo_atual_fim:
-            dias_no_ciclo = (hoje - ciclo_atual_inicio).days + 1
-            dias_restantes_ciclo = dias_total_ciclo - dias_no_ciclo + 1
-        elif hoje < ciclo_atual_inicio:
+    total_jogadores = 0
+    total_arrecadado = 0
+    total_pagamentos = 0
+    
+    for data_semana, total, pagos, arrecadado in query.yield_per(LOTE_EXPORTACAO):
+        taxa = (pagos / total * 100) if total > 0 else 0
+        yield [
+            data_semana.strftime("%d/%m/%Y"),
+            total,
+            f'{arrecadado:.2f}',
+            f'{pagos}/{total}',
+            f'{taxa:.1f}%'
+        ]
+        total_jogadores += total
+        total_arrecadado += arrecadado
+        total_pagamentos += pagos
+    
+    yield []
+    yield ['TOTAL', total_jogadores, f'{total_arrecadado:.2f}',
+           f'{total_pagamentos}/{total_jogadores}',
+           f'{(total_pagamentos / total_jogadores * 100) if total_jogadores > 0 else 0:.1f}%']
+
+def linhas_pagamentos_cofre(cabecalho, semana_id=None, inicio=None, fim=None):
+    """Pagamentos individuais do cofre de uma semana ou de um período"""
+    por_periodo = semana_id is None
+    
+    yield from cabecalho
+    yield []
+    colunas = ['Nome', 'Valor (R$)', 'Método', 'Status', 'Data Pagamento', 'Observação']
+    yield (['Semana'] + colunas) if por_periodo else colunas
+    
+    query = db.session.query(
+        Semana.data,
+        Jogador.nome,
+        PagamentoCofre.valor,
+        PagamentoCofre.metodo_pagamento,
+        PagamentoCofre.pago,
+        PagamentoCofre.pago_em,
+        PagamentoCofre.observacao
+    ).join(
+        Semana, Semana.id == PagamentoCofre.semana_id
+    ).outerjoin(
+        Jogador, Jogador.id == PagamentoCofre.jogador_id
+    )
+    if por_periodo:
+        query = filtrar_periodo(query, Semana.data, inicio, fim).order_by(Semana.data, PagamentoCofre.id)
+        arquivados = pagamentos_arquivados(arquivos_semanas(inicio, fim))
+    else:
+        query = query.filter(PagamentoCofre.semana_id == semana_id).order_by(PagamentoCofre.id)
+        arquivados = pagamentos_arquivados(arquivos_semanas(semana_id=semana_id))
+    
+    for data_semana, nome, valor, metodo, pago, pago_em, observacao in heapq.merge(
+            query.yield_per(LOTE_EXPORTACAO), arquivados, key=itemgetter(0)):
+        linha = [
+            nome or 'Jogador Manual',
+            f'{valor:.2f}',
+            metodo,
+            'Pago' if pago else 'Pendente',
+            pago_em.strftime("%d/%m/%Y %H:%M") if pago_em else '',
+            observacao or ''
+        ]
+        yield ([data_semana.strftime("%d/%m/%Y")] + linha) if por_periodo else linha
+
+def linhas_movimentos_cofre(inicio, fim):
+    """Movimentações do cofre no período, com saldo acumulado"""
+    yield ['Movimentações do Cofre', descricao_periodo(inicio, fim)]
+    yield ['Data de geração:', datetime.now().strftime("%d/%m/%Y %H:%M")]
+    yield []
+    yield ['Data', 'Tipo', 'Valor (R$)', 'Descrição', 'Semana', 'Usuário', 'Observação', 'Saldo (R$)']
+    
+    # Saldo anterior ao período, para o acumulado começar do valor correto
+    saldo = calcular_saldo_cofre(antes_de=datetime.combine(inicio, datetime.min.time())) if inicio else 0
+    
+    query = db.session.query(
+        MovimentoCofre.created_at,
+        MovimentoCofre.tipo,
+        MovimentoCofre.valor,
+        MovimentoCofre.descricao,
+        Semana.data,
+        MovimentoCofre.usuario,
+        MovimentoCofre.observacao
+    ).outerjoin(Semana, Semana.id == MovimentoCofre.semana_id)
+    if inicio:
+        query = query.filter(MovimentoCofre.created_at >= datetime.combine(inicio, datetime.min.time()))
+    if fim:
+        query = query.filter(MovimentoCofre.created_at < datetime.combine(fim + timedelta(days=1), datetime.min.time()))
+    query = query.order_by(MovimentoCofre.created_at, MovimentoCofre.id)
+    
+    for criado_em, tipo, valor, descricao, data_semana, usuario, observacao in query.yield_per(LOTE_EXPORTACAO):
+        if tipo in TIPOS_MOVIMENTO_CREDITO:
+            saldo += valor
+        elif tipo in TIPOS_MOVIMENTO_DEBITO:
+            saldo -= valor
+        yield [
+            criado_em.strftime("%d/%m/%Y %H:%M") if criado_em else '',
+            tipo,
+            f'{valor:.2f}',
+            descricao,
+            data_semana.strftime("%d/%m/%Y") if data_semana else '',
+            usuario or '',
+            observacao or '',
+            f'{saldo:.2f}'
+        ]
+
+def linhas_mensalidades(status_filter, inicio, fim):
+    """Relatório de mensalidades com os mesmos filtros da tela de relatório"""
+    hoje = date.today()
+    
+    yield ['Relatório de Mensalidades', f'Status: {status_filter}', f'Período: {descricao_periodo(inicio, fim)}']
+    yield ['Data de geração:', datetime.now().strftime("%d/%m/%Y %H:%M")]
+    yield []
+    yield ['Nome', 'Mensalista', 'Pagamento', 'Período Início', 'Período Fim', 'Dias Restantes', 'Status', 'Valor (R$)']
+    
+    query = db.session.query(
+        Jogador.nome,
+        Jogador.mensalista,
+        Jogador.mensalidade_paga,
+        Jogador.data_inicio_mensalidade,
+        Jogador.data_fim_mensalidade
+    ).filter(Jogador.ativo == True)
+    query = filtrar_mensalistas(query, status_filter, hoje)
+    # Ciclos que se sobrepõem ao período pedido
+    if inicio:
+        query = query.filter(Jogador.data_fim_mensalidade >= inicio)
+    if fim:
+        query = query.filter(Jogador.data_inicio_mensalidade <= fim)
+    query = query.order_by(Jogador.nome)
+    
+    total = pagos = ativos = vencidos = 0
+    for nome, mensalista, paga, data_inicio, data_fim in query.yield_per(LOTE_EXPORTACAO):
+        if mensalista and data_fim and data_fim < hoje:
+            situacao = 'Vencida'
+        elif mensalista and data_fim:
+            situacao = 'Ativa' if paga else 'Pendente'
+        else:
+            situacao = 'Não Mensalista'
+        
+        total += 1
+        pagos += 1 if paga else 0
+        ativos += 1 if paga and data_fim and data_fim >= hoje else 0
+        vencidos += 1 if data_fim and data_fim < hoje else 0
+        
+        yield [
+            nome,
+            'SIM' if mensalista else 'NÃO',
+            'PAGA' if paga else 'PENDENTE',
+            data_inicio.strftime('%d/%m/%Y') if data_inicio else '',
+            data_fim.strftime('%d/%m/%Y') if data_fim else '',
+            (data_fim - hoje).days if data_fim else '',
+            situacao,
+            f'{VALOR_MENSALIDADE:.2f}'
+        ]
+    
+    yield []
+    yield ['TOTAL MENSALISTAS', total]
+    yield ['MENSALIDADES PAGAS', pagos]
+    yield ['ATIVAS (NÃO VENCIDAS)', ativos]
+    yield ['VENCIDAS', vencidos]
+    yield ['VALOR TOTAL ESPERADO', '', '', '', '', '', '', f'R$ {total * VALOR_MENSALIDADE:.2f}']
+    yield ['VALOR RECEBIDO', '', '', '', '', '', '', f'R$ {pagos * VALOR_MENSALIDADE:.2f}']
+    yield ['VALOR PENDENTE', '', '', '', '', '', '', f'R$ {(total - pagos) * VALOR_MENSALIDADE:.2f}']
+
+def linhas_historico_times(inicio, fim):
+    """Histórico de times formados (uma linha por escolha do draft)"""
+    yield ['Histórico de Times', descricao_periodo(inicio, fim)]
+    yield ['Data de geração:', datetime.now().strftime("%d/%m/%Y %H:%M")]
+    yield []
+    yield ['Semana', 'Time', 'Capitão', 'Ordem Escolha', 'Round', 'Jogador', 'Posição', 'Nível']
+    
+    capitao = db.aliased(Jogador)
+    query = db.session.query(
+        Semana.data,
+        Time.nome,
+        capitao.nome,
+        EscolhaDraft.ordem_escolha,
+        EscolhaDraft.round_num,
+        Jogador.nome,
+        Jogador.posicao,
+        Jogador.nivel
+    ).join(
+        Semana, Semana.id == EscolhaDraft.semana_id
+    ).join(
+        Time, Time.id == EscolhaDraft.time_id
+    ).join(
+        Jogador, Jogador.id == EscolhaDraft.jogador_id
+    ).outerjoin(
+        capitao, capitao.id == Time.capitao_id
+    ).filter(Semana.draft_finalizado == True)
+    query = filtrar_periodo(query, Semana.data, inicio, fim).order_by(
+        Semana.data.desc(), Time.ordem_escolha, EscolhaDraft.ordem_escolha
+    )
+    
+    # Semanas arquivadas entram na mesma ordem (data decrescente)
+    arquivadas = (linha[:1] + linha[2:] for linha in escolhas_arquivadas(arquivos_semanas(inicio, fim, decrescente=True)))
+    for data_semana, time_nome, capitao_nome, ordem, round_num, nome, posicao, nivel in heapq.merge(
+            query.yield_per(LOTE_EXPORTACAO), arquivadas, key=itemgetter(0), reverse=True):
+        yield [
+            data_semana.strftime("%d/%m/%Y"),
+            time_nome or '',
+            capitao_nome or '',
+            ordem,
+            round_num,
+            nome,
+            posicao or '',
+            nivel or ''
+        ]
+
+DIAS_SEMANA_PT = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+
+def linhas_presencas(inicio, fim):
+    """Confirmações e presenças por semana"""
+    yield ['Presenças', descricao_periodo(inicio, fim)]
+    yield ['Data de geração:', datetime.now().strftime("%d/%m/%Y %H:%M")]
+    yield []
+    yield ['Semana', 'Dia', 'Jogador', 'Mensalista', 'Confirmado', 'Confirmado em', 'Presente', 'Prioridade']
+    
+    query = db.session.query(
+        Semana.data,
+        Jogador.nome,
+        Jogador.mensalista,
+        Confirmacao.confirmado,
+        Confirmacao.confirmado_em,
+        Confirmacao.presente,
+        Confirmacao.prioridade
+    ).join(
+        Semana, Semana.id == Confirmacao.semana_id
+    ).join(
+        Jogador, Jogador.id == Confirmacao.jogador_id
+    )
+    query = filtrar_periodo(query, Semana.data, inicio, fim).order_by(Semana.data, Jogador.nome)
+    
+    for data_semana, nome, mensalista, confirmado, confirmado_em, presente, prioridade in heapq.merge(
+            query.yield_per(LOTE_EXPORTACAO), presencas_arquivadas(arquivos_semanas(inicio, fim)), key=itemgetter(0)):
+        yield [
+            data_semana.strftime("%d/%m/%Y"),
+            DIAS_SEMANA_PT[data_semana.weekday()],
+            nome,
+            'SIM' if mensalista else 'NÃO',
+            'SIM' if confirmado else 'NÃO',
+            confirmado_em.strftime("%d/%m/%Y %H:%M") if confirmado_em else '',
+            'SIM' if presente else 'NÃO',
+            prioridade or 0
+        ]
+
+def _exportar_periodo(prefixo, gerar_linhas):
+    """Trata o período da query string e devolve o CSV em streaming"""
+    try:
+        inicio, fim = periodo_exportacao()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Período inválido: {e}'}), 400
+    
+    return resposta_csv_streaming(
+        f"{prefixo}_{sufixo_periodo(inicio, fim)}.csv",
+        gerar_linhas(inicio, fim)
+    )
+
+@app.route('/admin/cofre/relatorio/periodo/exportar')
+@admin_required
+def exportar_relatorio_periodo():
+    """Exporta o resumo do cofre por semana em um período (?inicio=&fim= ou ?ano=)"""
+    def gerar_linhas(inicio, fim):
+        cabecalho = [
+            ['Relatório do Cofre', descricao_periodo(inicio, fim)],
+            ['Data de geração:', datetime.now().strftime("%d/%m/%Y %H:%M")],
+        ]
+        return linhas_resumo_semanas_cofre(inicio, fim, cabecalho)
+    
+    return _exportar_periodo('relatorio_cofre', gerar_linhas)
+
+@app.route('/admin/cofre/pagamentos/exportar')
+@admin_required
+def exportar_pagamentos_cofre():
+    """Exporta todos os pagamentos do cofre em um período"""
+    def gerar_linhas(inicio, fim):
+        cabecalho = [
+            ['Pagamentos do Cofre', descricao_periodo(inicio, fim)],
+            ['Data de geração:', datetime.now().strftime("%d/%m/%Y %H:%M")],
+        ]
+        return linhas_pagamentos_cofre(cabecalho, inicio=inicio, fim=fim)
+    
+    return _exportar_periodo('pagamentos_cofre', gerar_linhas)
+
+@app.route('/admin/cofre/movimentos/exportar')
+@admin_required
+def exportar_movimentos_cofre():
+    """Exporta as movimentações do cofre em um período"""
+    return _exportar_periodo('movimentos_cofre', linhas_movimentos_cofre)
+
+@app.route('/admin/mensalidade/relatorio/exportar')
+@admin_required
+def exportar_relatorio_mensalidades():
+    """Exporta o relatório de mensalidades (mesmos filtros da tela)"""
+    status_filter = request.args.get('status', 'todos')
+    return _exportar_periodo(
+        'relatorio_mensalidades',
+        lambda inicio, fim: linhas_mensalidades(status_filter, inicio, fim)
+    )
+
+@app.route('/admin/times/exportar')
+@admin_required
+def exportar_historico_times():
+    """Exporta o histórico de times formados em um período"""
+    return _exportar_periodo('historico_times', linhas_historico_times)
+
+@app.route('/admin/presencas/exportar')
+@admin_required
+def exportar_presencas():
+    """Exporta as confirmações/presenças em um período"""
+    return _exportar_periodo('presencas', linhas_presencas)
+
+# ======================================================
+# PROCESSAMENTO DE FOTOS
+# ======================================================
+# As fotos enviadas são processadas fora da requisição (pool de workers): a
+# orientação EXIF é aplicada, os metadados descartados e a imagem gravada em
+# JPEG com lado máximo fixo, junto com variantes quadradas de tamanho fixo
+# para cada uso (avatar nas listas, card nos perfis). O nome dos arquivos é o
+# hash do conteúdo enviado, então reenviar a mesma foto reaproveita os
+# arquivos e as URLs nunca mudam de conteúdo. Se o processamento passar do
+# tempo de espera, a requisição responde antes e a foto é aplicada ao
+# jogador quando o worker terminar. Sem Pillow, a foto é salva como veio.
+
+FOTOS_DIR = os.path.join(app.static_folder, "uploads", "fotos")
+FOTOS_URL = "/static/uploads/fotos"
+VARIANTES_FOTO = {'avatar': 96, 'card': 320}  # lado em pixels
+LADO_MAXIMO_FOTO = 800
+PIXELS_MAXIMOS_FOTO = 40_000_000  # evita descompactar imagens gigantes
+QUALIDADE_FOTO = 85
+FOTO_ESPERA_MAXIMA = 5  # segundos que a requisição aguarda o processamento
+
+if Image is not None and pil_features.check('webp'):
+    FORMATO_VARIANTE, EXTENSAO_VARIANTE = 'WEBP', 'webp'
+else:
+    FORMATO_VARIANTE, EXTENSAO_VARIANTE = 'JPEG', 'jpg'
+
+def url_foto(url, tamanho=None):
+    """URL da variante de uma foto; fotos não processadas ficam com a original"""
+    if not url or not tamanho or not url.startswith(FOTOS_URL + '/'):
+        return url
+    base = url.rsplit('.', 1)[0]
+    if '-' in base[len(FOTOS_URL):]:
+        return url  # já é uma variante
+    return f"{base}-{tamanho}.{EXTENSAO_VARIANTE}"
+
+def arquivos_foto(url):
+    """Caminhos no disco da foto e das suas variantes"""
+    urls = [url] + [url_foto(url, tamanho) for tamanho in VARIANTES_FOTO]
+    return list(dict.fromkeys(os.path.join(app.static_folder, u[len('/static/'):]) for u in urls))
+
+def _gravar_atomico(caminho, salvar):
+    """Grava num temporário e renomeia, para nunca servir um arquivo pela metade"""
+    temporario = f'{caminho}.{secrets.token_hex(4)}.tmp'
+    try:
+        salvar(temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+def _renovar_arquivos(caminhos):
+    """Atualiza o mtime de arquivos reaproveitados (a coleta poupa os recentes); False se algum sumiu"""
+    try:
+        for caminho in caminhos:
+            os.utime(caminho)
+    except FileNotFoundError:
+        return False
+    return True
+
+def _gravar_bytes(dados):
+    def salvar(caminho):
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(dados)
+    return salvar
+
+def _imagem_rgb(imagem):
+    """Converte para RGB, compondo a transparência sobre fundo branco"""
+    if imagem.mode in ('RGBA', 'LA', 'P'):
+        imagem = imagem.convert('RGBA')
+        fundo = Image.new('RGB', imagem.size, 'white')
+        fundo.paste(imagem, mask=imagem.getchannel('A'))
+        return fundo
+    return imagem.convert('RGB')
+
+def processar_foto(dados, extensao):
+    """Normaliza a foto enviada e gera as variantes; devolve a URL da foto principal"""
+    chave = hashlib.sha256(dados).hexdigest()[:24]
+    
+    if Image is None:
+        nome = f'{chave}.{extensao}'
+        caminho = os.path.join(app.static_folder, 'uploads', nome)
+        if not _renovar_arquivos([caminho]):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            _gravar_atomico(caminho, _gravar_bytes(dados))
+        return f'/static/uploads/{nome}'
+    
+    url = f'{FOTOS_URL}/{chave}.jpg'
+    caminhos = arquivos_foto(url)
+    if _renovar_arquivos(caminhos):
+        return url
+    
+    with Image.open(io.BytesIO(dados)) as original:
+        if original.width * original.height > PIXELS_MAXIMOS_FOTO:
+            raise ValueError('Imagem grande demais')
+        # JPEG: decodifica já reduzido quando a foto é muito maior que o necessário
+        original.draft('RGB', (LADO_MAXIMO_FOTO, LADO_MAXIMO_FOTO))
+        imagem = _imagem_rgb(ImageOps.exif_transpose(original))
+    
+    # Salvar sem exif/icc descarta os metadados (GPS, câmera etc.)
+    imagem.thumbnail((LADO_MAXIMO_FOTO, LADO_MAXIMO_FOTO), Image.LANCZOS)
+    os.makedirs(FOTOS_DIR, exist_ok=True)
+    _gravar_atomico(caminhos[0], lambda tmp: imagem.save(
+        tmp, 'JPEG', quality=QUALIDADE_FOTO, optimize=True, progressive=True))
+    
+    for tamanho, lado in VARIANTES_FOTO.items():
+        variante = ImageOps.fit(imagem, (lado, lado), Image.LANCZOS)
+        _gravar_atomico(
+            os.path.join(app.static_folder, url_foto(url, tamanho)[len('/static/'):]),
+            lambda tmp: variante.save(tmp, FORMATO_VARIANTE, quality=QUALIDADE_FOTO)
+        )
+    return url
+
+def remover_foto(url):
+    """Apaga os arquivos de uma foto que nenhum jogador ou usuário usa mais"""
+    if not url:
+        return
+    if (Jogador.query.filter_by(foto_perfil=url).first()
+            or User.query.filter_by(foto_perfil=url).first()):
+        return
+    _apagar_arquivos_foto(url)
+
+def fotos_em_uso(urls):
+    """Quais das URLs ainda são usadas por algum jogador ou usuário"""
+    if not urls:
+        return set()
+    em_uso = set()
+    for coluna in (Jogador.foto_perfil, User.foto_perfil):
+        em_uso.update(url for (url,) in db.session.query(coluna).filter(coluna.in_(urls)).distinct())
+    return em_uso
+
+def agendar_remocao_fotos(urls):
+    """Apaga os arquivos das fotos quando a transação atual for confirmada"""
+    if urls:
+        db.session.info.setdefault('fotos_para_remover', set()).update(urls)
+
+@event.listens_for(db.session, 'after_commit')
+def _remover_fotos_agendadas(session):
+    for url in session.info.pop('fotos_para_remover', ()):
+        _apagar_arquivos_foto(url)
+
+@event.listens_for(db.session, 'after_rollback')
+def _descartar_fotos_agendadas(session):
+    session.info.pop('fotos_para_remover', None)
+
+def _apagar_arquivos_foto(url):
+    for caminho in arquivos_foto(url):
+        if os.path.exists(caminho):
+            try:
+                os.remove(caminho)
+            except OSError as e:
+                print(f"⚠️ Não foi possível remover {caminho}: {e}")
+
+# Coleta de órfãs: as referências são as colunas foto_perfil de jogadores e
+# usuários, e qualquer arquivo em uploads cuja foto não é mais referenciada é
+# apagado numa única varredura. Arquivos recentes são preservados para não
+# apagar uma foto que ainda vai ser aplicada em segundo plano.
+FOTOS_IDADE_MINIMA_COLETA = 3600  # segundos
+
+def fotos_referenciadas():
+    """URLs de foto em uso por jogadores e usuários"""
+    urls = set()
+    for coluna in (Jogador.foto_perfil, User.foto_perfil):
+        urls.update(url for (url,) in db.session.query(coluna).filter(coluna.isnot(None)).distinct())
+    return urls
+
+def _url_da_foto(caminho):
+    """URL da foto a que um arquivo de uploads pertence (variantes contam como a principal)"""
+    url = '/static/' + os.path.relpath(caminho, app.static_folder).replace(os.sep, '/')
+    base = url.rsplit('.', 1)[0]
+    if url.startswith(FOTOS_URL + '/') and '-' in base[len(FOTOS_URL):]:
+        return base.rsplit('-', 1)[0] + '.jpg'
+    return url
+
+def coletar_fotos_orfas(simular=False, idade_minima=FOTOS_IDADE_MINIMA_COLETA):
+    """Apaga os arquivos de uploads sem referência; devolve (arquivos, bytes) liberados"""
+    referenciadas = fotos_referenciadas()
+    limite = time_module.time() - idade_minima
+    arquivos = liberados = 0
+    
+    for raiz, _, nomes in os.walk(os.path.join(app.static_folder, 'uploads')):
+        for nome in nomes:
+            if nome.startswith('.'):
+                continue
+            caminho = os.path.join(raiz, nome)
+            try:
+                info = os.stat(caminho)
+            except FileNotFoundError:
+                continue
+            if info.st_mtime > limite or _url_da_foto(caminho) in referenciadas:
+                continue
+            if not simular:
+                try:
+                    os.remove(caminho)
+                except OSError as e:
+                    print(f"⚠️ Não foi possível remover {caminho}: {e}")
+                    continue
+            arquivos += 1
+            liberados += info.st_size
+    return arquivos, liberados
+
+def migrar_fotos_antigas():
+    """Passa as fotos salvas no formato antigo (jogador_<id>_<data>) para o armazenamento por hash"""
+    migradas = 0
+    for url in fotos_referenciadas():
+        if url.startswith(FOTOS_URL + '/') or not url.startswith('/static/uploads/'):
+            continue
+        caminho = arquivos_foto(url)[0]
+        if not os.path.exists(caminho):
+            continue
+        with open(caminho, 'rb') as arquivo:
+            dados = arquivo.read()
+        try:
+            nova = processar_foto(dados, url.rsplit('.', 1)[-1].lower())
+        except Exception as e:
+            print(f"⚠️ Foto {url} não pôde ser migrada: {e}")
+            continue
+        if nova == url:
+            continue
+        for modelo in (Jogador, User):
+            db.session.execute(
+                update(modelo).where(modelo.foto_perfil == url).values(foto_perfil=nova)
+            )
+        migradas += 1
+    db.session.commit()
+    return migradas
+
+def tarefa_limpar_fotos():
+    """Remove do disco as fotos que nenhum jogador ou usuário usa"""
+    arquivos, liberados = coletar_fotos_orfas()
+    if arquivos:
+        print(f"🧹 Fotos órfãs removidas: {arquivos} arquivo(s), {liberados / 1024:.0f} KB")
+    return arquivos
+
+@app.cli.command('limpar-fotos')
+@click.option('--simular', is_flag=True, help='Só mostra o que seria removido')
+@click.option('--migrar', is_flag=True, help='Converte antes as fotos no formato antigo')
+def limpar_fotos_comando(simular, migrar):
+    """Remove as fotos órfãs de static/uploads numa única varredura"""
+    if migrar and not simular:
+        print(f"📦 Fotos migradas para o armazenamento por hash: {migrar_fotos_antigas()}")
+    arquivos, liberados = coletar_fotos_orfas(simular=simular)
+    acao = 'seriam removidos' if simular else 'removidos'
+    print(f"🧹 {arquivos} arquivo(s) {acao}, {liberados / 1024:.0f} KB")
+
+def aplicar_foto_jogador(jogador_id, url_anterior, url):
+    """Troca a foto do jogador se ela não mudou desde o envio; devolve se trocou"""
+    trocou = db.session.execute(
+        update(Jogador)
+        .where(Jogador.id == jogador_id, Jogador.foto_perfil == url_anterior)
+        .values(foto_perfil=url)
+    ).rowcount
+    db.session.commit()
+    if trocou and url_anterior != url:
+        remover_foto(url_anterior)
+    return bool(trocou)
+
+def _garantir_arquivos_foto(url, dados, extensao):
+    """Regrava a foto se os arquivos sumiram entre o processamento e o commit.
+    
+    Outro jogador pode ter largado a mesma foto (mesmo hash) nesse intervalo,
+    e remover_foto apaga os arquivos por ainda não haver referência a eles.
+    """
+    if all(os.path.exists(caminho) for caminho in arquivos_foto(url)):
+        return
+    print(f"⚠️ Arquivos da foto {url} removidos durante o envio, gerando de novo")
+    try:
+        aguardar_resultado(executar_fora_do_loop(processar_foto, dados, extensao), FOTO_ESPERA_MAXIMA)
+    except FuturesTimeoutError:
+        pass  # a thread termina de gravar sozinha
+
+def _aplicar_foto_em_segundo_plano(jogador_id, url_anterior, resultado, dados, extensao):
+    try:
+        url = resultado.get()
+    except Exception as e:
+        print(f"❌ Erro ao processar foto do jogador {jogador_id}: {e}")
+        return
+    with app.app_context():
+        if aplicar_foto_jogador(jogador_id, url_anterior, url):
+            _garantir_arquivos_foto(url, dados, extensao)
+            print(f"✅ Foto do jogador {jogador_id} processada em segundo plano: {url}")
+
+def receber_foto_jogador(jogador, arquivo):
+    """Processa a foto enviada e aplica no jogador.
+    
+    Devolve a URL aplicada, ou None se o processamento continua em segundo
+    plano. Erros de imagem inválida são propagados.
+    """
+    dados = arquivo.read()
+    extensao = arquivo.filename.rsplit('.', 1)[1].lower()
+    jogador_id, anterior = jogador.id, jogador.foto_perfil
+    
+    # Decodificar e redimensionar é CPU: roda numa thread nativa, fora do loop
+    resultado = executar_fora_do_loop(processar_foto, dados, extensao)
+    try:
+        url = aguardar_resultado(resultado, FOTO_ESPERA_MAXIMA)
+    except FuturesTimeoutError:
+        # O callback roda no hub e não pode bloquear: o commit fica num greenlet
+        resultado.rawlink(lambda r: gevent.spawn(
+            _aplicar_foto_em_segundo_plano, jogador_id, anterior, r, dados, extensao))
+        return None
+    
+    if aplicar_foto_jogador(jogador_id, anterior, url):
+        _garantir_arquivos_foto(url, dados, extensao)
+    return url
+
+def responder_upload_foto(jogador):
+    """Resposta JSON comum às rotas de envio/remoção de foto do jogador"""
+    if request.is_json:
+        if (request.get_json(silent=True) or {}).get('remover'):
+            anterior = jogador.foto_perfil
+            jogador.foto_perfil = None
+            db.session.commit()
+            remover_foto(anterior)
+            return jsonify({'success': True, 'message': 'Foto removida!'})
+        return jsonify({'success': False, 'message': 'Nenhum arquivo selecionado!'})
+    
+    if 'foto' not in request.files:
+        return jsonify({'success': False, 'message': 'Nenhum arquivo selecionado!'})
+    
+    file = request.files['foto']
+    
+    if file.filename == '':
+        return jsonify({'success': False, 'message': 'Nenhum arquivo selecionado!'})
+    
+    if not allowed_file(file.filename):
+        return jsonify({'success': False, 'message': 'Tipo de arquivo não permitido!'})
+    
+    try:
+        url = receber_foto_jogador(jogador, file)
+    except Exception as e:
+        print(f"❌ Erro ao processar foto do jogador {jogador.id}: {e}")
+        return jsonify({'success': False, 'message': 'Não foi possível ler a imagem enviada.'})
+    
+    if url is None:
+        return jsonify({'success': True, 'processando': True,
+                        'message': 'Foto recebida! Ela aparecerá em instantes.'})
+    return jsonify({'success': True, 'foto_url': url_foto(url, 'card')})
+
+# ======================================================
+# ARQUIVOS ESTÁTICOS COMPILADOS
+# ======================================================
+# CSS e JS de static/ são agrupados em pacotes, minificados, comprimidos
+# (gzip e, com o módulo brotli, br) e gravados em static/dist com o hash do
+# conteúdo no nome. Os templates usam url_estatico(), que aponta para a
+# versão compilada; como o nome muda a cada alteração, ela é servida com
+# cache imutável e o navegador não revalida nada em visitas seguintes.
+# A compilação roda na inicialização e pelo comando `flask compilar-estaticos`.
+# Em desenvolvimento os originais são servidos direto.
+
+ESTATICOS_DIST_DIR = os.path.join(app.static_folder, "dist")
+ESTATICOS_CACHE_SEGUNDOS = 365 * 24 * 3600
+
+# pacote -> arquivos de origem (relativos a static/), na ordem de concatenação
+PACOTES_ESTATICOS = {
+    'css/app.css': ['css/style.css', 'css/responsive.css'],
+    'css/draft.css': ['css/draft.css'],
+    'css/admin_dashboard.css': ['css/admin_dashboard.css'],
+    'js/main.js': ['js/main.js'],
+    'js/draft.js': ['draft.js'],
+}
+
+_manifesto_estaticos = None
+
+def _minificar_css(texto):
+    """Remove comentários e espaços sem significado"""
+    texto = re.sub(r'/\*.*?\*/', '', texto, flags=re.S)
+    partes = re.split(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')', texto)
+    for i in range(0, len(partes), 2):  # índices pares ficam fora de strings
+        trecho = re.sub(r'\s+', ' ', partes[i])
+        trecho = re.sub(r'\s*([{};,>])\s*', r'\1', trecho)
+        partes[i] = re.sub(r':\s+', ':', trecho).replace(';}', '}')
+    return ''.join(partes).strip()
+
+def _minificar_js(texto):
+    """Remove comentários de linha inteira, indentação e linhas vazias.
+    
+    Não reescreve código: as quebras de linha ficam (inserção automática de
+    ponto e vírgula) e linhas dentro de template strings ficam intactas.
+    """
+    linhas = []
+    em_template = em_comentario = False
+    for linha in texto.splitlines():
+        if em_template:
+            linhas.append(linha)
+        else:
+            limpa = linha.strip()
+            if limpa.startswith('/*') and not em_comentario:
+                em_comentario, limpa = True, limpa[2:]
+            if em_comentario:
+                if '*/' not in limpa:
+                    continue
+                em_comentario, limpa = False, limpa.split('*/', 1)[1].strip()
+            if not limpa or limpa.startswith('//'):
+                continue
+            linhas.append(limpa)
+        if linha.count('`') % 2:
+            em_template = not em_template
+    return '\n'.join(linhas)
+
+def compilar_estaticos():
+    """Gera os pacotes com hash e as versões comprimidas; devolve o manifesto"""
+    global _manifesto_estaticos
+    manifesto = {}
+    for pacote, fontes in PACOTES_ESTATICOS.items():
+        minificar = _minificar_css if pacote.endswith('.css') else _minificar_js
+        conteudo = []
+        for fonte in fontes:
+            with open(os.path.join(app.static_folder, fonte), encoding='utf-8') as arquivo:
+                conteudo.append(minificar(arquivo.read()))
+        dados = ('\n'.join(conteudo) + '\n').encode('utf-8')
+        
+        raiz, extensao = os.path.splitext(pacote)
+        nome = f'{raiz}.{hashlib.sha256(dados).hexdigest()[:12]}{extensao}'
+        caminho = os.path.join(ESTATICOS_DIST_DIR, nome)
+        if not os.path.exists(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            _gravar_atomico(caminho + '.gz', _gravar_bytes(gzip.compress(dados, 9, mtime=0)))
+            if brotli is not None:
+                _gravar_atomico(caminho + '.br', _gravar_bytes(brotli.compress(dados, quality=11)))
+            _gravar_atomico(caminho, _gravar_bytes(dados))
+        manifesto[pacote] = nome
+    
+    _gravar_atomico(os.path.join(ESTATICOS_DIST_DIR, 'manifesto.json'),
+                    _gravar_bytes(json.dumps(manifesto, indent=2, sort_keys=True).encode('utf-8')))
+    
+    # Versões antigas dos pacotes não são mais referenciadas
+    em_uso = {os.path.join(ESTATICOS_DIST_DIR, nome) for nome in manifesto.values()}
+    for raiz, _, nomes in os.walk(ESTATICOS_DIST_DIR):
+        for nome in nomes:
+            caminho = os.path.join(raiz, nome)
+            if nome != 'manifesto.json' and re.sub(r'\.(gz|br)$', '', caminho) not in em_uso:
+                os.remove(caminho)
+    
+    _manifesto_estaticos = manifesto
+    return manifesto
+
+def manifesto_estaticos():
+    """Manifesto da última compilação (vazio se nunca compilado)"""
+    global _manifesto_estaticos
+    if _manifesto_estaticos is None:
+        try:
+            with open(os.path.join(ESTATICOS_DIST_DIR, 'manifesto.json'), encoding='utf-8') as arquivo:
+                _manifesto_estaticos = json.load(arquivo)
+        except (OSError, ValueError):
+            _manifesto_estaticos = {}
+    return _manifesto_estaticos
+
+def url_estatico(nome):
+    """URL de um pacote estático: a versão compilada com hash, ou o original"""
+    compilado = None if FLASK_ENV == 'development' else manifesto_estaticos().get(nome)
+    if compilado is None:
+        return url_for('static', filename=PACOTES_ESTATICOS.get(nome, [nome])[0])
+    return url_for('estatico_compilado', nome=compilado)
+
+@app.route('/assets/<path:nome>')
+def estatico_compilado(nome):
+    """Serve um pacote compilado, na versão pré-comprimida aceita pelo navegador"""
+    mimetype = mimetypes.guess_type(nome)[0]
+    for codificacao, extensao in (('br', '.br'), ('gzip', '.gz')):
+        if (request.accept_encodings[codificacao]
+                and os.path.exists(os.path.join(ESTATICOS_DIST_DIR, nome + extensao))):
+            resposta = send_from_directory(ESTATICOS_DIST_DIR, nome + extensao, mimetype=mimetype,
+                                           max_age=ESTATICOS_CACHE_SEGUNDOS)
+            resposta.headers['Content-Encoding'] = codificacao
+            break
+    else:
+        resposta = send_from_directory(ESTATICOS_DIST_DIR, nome, mimetype=mimetype,
+                                       max_age=ESTATICOS_CACHE_SEGUNDOS)
+    
+    resposta.cache_control.immutable = True
+    resposta.vary.add('Accept-Encoding')
+    return resposta
+
+@app.after_request
+def cache_fotos_imutaveis(resposta):
+    """Fotos processadas têm o hash do conteúdo no nome e nunca mudam"""
+    if resposta.status_code == 200 and request.path.startswith(FOTOS_URL + '/'):
+        resposta.cache_control.no_cache = None
+        resposta.cache_control.public = True
+        resposta.cache_control.max_age = ESTATICOS_CACHE_SEGUNDOS
+        resposta.cache_control.immutable = True
+    return resposta
+
+@app.cli.command('compilar-estaticos')
+def compilar_estaticos_comando():
+    """Minifica, comprime e gera os nomes com hash dos CSS/JS"""
+    for pacote, nome in compilar_estaticos().items():
+        print(f"📦 {pacote} -> dist/{nome}")
+
+# ======================================================
+# ROTAS PARA JOGADORES
+# ======================================================
+
+@app.route('/redefinir_senha_usuario', methods=['POST'])
+@login_required
+def redefinir_senha_usuario():
+    """Permite ao usuário redefinir sua própria senha"""
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'success': False, 'message': 'Dados inválidos!'}), 400
+        
+        senha_atual = data.get('senha_atual')
+        nova_senha = data.get('nova_senha')
+        confirmar_senha = data.get('confirmar_senha')
+        
+        # Validações
+        if not senha_atual or not nova_senha or not confirmar_senha:
+            return jsonify({'success': False, 'message': 'Preencha todos os campos!'}), 400
+        
+        if nova_senha != confirmar_senha:
+            return jsonify({'success': False, 'message': 'As novas senhas não coincidem!'}), 400
+        
+        if len(nova_senha) < 6:
+            return jsonify({'success': False, 'message': 'A nova senha deve ter pelo menos 6 caracteres!'}), 400
+        
+        # Verificar senha atual
+        if not check_password_hash(current_user.password, senha_atual):
+            return jsonify({'success': False, 'message': 'Senha atual incorreta!'}), 401
+        
+        # Atualizar senha
+        current_user.password = generate_password_hash(nova_senha)
+        db.session.commit()
+        
+        print(f"✅ Senha redefinida para usuário: {current_user.username}")
+        return jsonify({'success': True, 'message': 'Senha alterada com sucesso!'})
+        
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Erro ao redefinir senha: {e}")
+        return jsonify({'success': False, 'message': f'Erro interno: {str(e)}'}), 500
+
+@app.route('/admin/jogadores')
+@admin_required
+def admin_jogadores():
+    """Lista de jogadores para administração"""
+    # Busca todos os jogadores separados por categoria
+    todos_jogadores = Jogador.query.order_by(Jogador.nome).all()
+    
+    # Separa jogadores por categoria
+    mensalistas_ativos = []
+    nao_mensalistas = []
+    inativos = []
+    
+    for jogador in todos_jogadores:
+        if not jogador.ativo:
+            inativos.append(jogador)
+        elif jogador.mensalista:
+            mensalistas_ativos.append(jogador)
+        else:
+            nao_mensalistas.append(jogador)
+    
+    return render_template('admin/jogadores.html',
+                         mensalistas_ativos=mensalistas_ativos,
+                         nao_mensalistas=nao_mensalistas,
+                         inativos=inativos)
+
+@app.route('/admin/jogador/<int:id>/gerenciar_mensalidade', methods=['GET', 'POST'])
+@admin_required
+def gerenciar_mensalidade(id):
+    """Gerencia a mensalidade de um jogador"""
+    jogador = Jogador.query.get_or_404(id)
+    
+    # Busca informações do ciclo atual usando a nova função
+    ciclo_atual_inicio, ciclo_atual_fim = obter_ciclo_das_configuracoes()
+    dias_restantes_ciclo = 0
+    
+    if ciclo_atual_inicio and ciclo_atual_fim:
+        hoje = date.today()
+        # Calcula dias do ciclo (não dias restantes)
+        dias_total_ciclo = (ciclo_atual_fim - ciclo_atual_inicio).days + 1
+        
+        # Calcula em que dia do ciclo estamos
+        if ciclo_atual_inicio <= hoje <= ciclo_atual_fim:
+            dias_no_ciclo = (hoje - ciclo_atual_inicio).days + 1
+            dias_restantes_ciclo = dias_total_ciclo - dias_no_ciclo + 1
+        elif hoje < ciclo_atual_inicio:
             # Ciclo ainda não começou
             dias_restantes_ciclo = dias_total_ciclo
         else:
@@ -4450,7 +7338,9 @@ def perfil():
                 'presente': conf.presente
             })
     
-    return render_template('perfil.html', jogador=jogador, historico=historico)
+    estatisticas = estatisticas_jogador(jogador.id) if jogador else None
+    
+    return render_template('perfil.html', jogador=jogador, historico=historico, estatisticas=estatisticas)
 
 @app.route('/completar_perfil', methods=['GET', 'POST'])
 def completar_perfil():
@@ -4564,35 +7454,8 @@ def completar_perfil():
                 # Verificar se um arquivo foi selecionado
                 if foto.filename != '' and allowed_file(foto.filename):
                     try:
-                        # Gerar nome único para o arquivo
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-                        extensao = foto.filename.rsplit('.', 1)[1].lower() if '.' in foto.filename else 'jpg'
-                        filename = secure_filename(f"jogador_{jogador.id}_{timestamp}.{extensao}")
-                        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                        
-                        # Garantir que a pasta de uploads existe
-                        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                        
-                        # Salvar arquivo
-                        foto.save(filepath)
-                        
-                        # Verificar se o arquivo foi salvo com sucesso
-                        if os.path.exists(filepath):
-                            # Remover foto anterior se existir
-                            if jogador.foto_perfil:
-                                old_path = os.path.join(app.static_folder, jogador.foto_perfil.lstrip('/'))
-                                if os.path.exists(old_path) and os.path.basename(old_path) != filename:
-                                    try:
-                                        os.remove(old_path)
-                                    except:
-                                        pass
-                            
-                            # Atualizar caminho da foto no banco de dados
-                            jogador.foto_perfil = f"/static/uploads/{filename}"
-                            print(f"✅ Foto salva: {jogador.foto_perfil}")
-                        else:
-                            print(f"❌ Erro: Arquivo não foi salvo em {filepath}")
-                            
+                        url = receber_foto_jogador(jogador, foto)
+                        print(f"✅ Foto salva: {url or 'processando em segundo plano'}")
                     except Exception as e:
                         print(f"❌ Erro ao processar foto: {str(e)}")
                         # Não interrompe o processo se houver erro na foto
@@ -4676,57 +7539,7 @@ def upload_foto_jogador():
     if not current_user.jogador_id:
         return jsonify({'success': False, 'message': 'Sem permissão!'})
     
-    # Verifica se é para remover a foto
-    if request.is_json:
-        data = request.get_json()
-        if data.get('remover'):
-            jogador = Jogador.query.get(current_user.jogador_id)
-            if jogador.foto_perfil:
-                old_path = os.path.join(app.static_folder, jogador.foto_perfil.lstrip('/'))
-                if os.path.exists(old_path):
-                    try:
-                        os.remove(old_path)
-                    except:
-                        pass
-                jogador.foto_perfil = None
-                db.session.commit()
-                return jsonify({'success': True, 'message': 'Foto removida!'})
-    
-    if 'foto' not in request.files:
-        return jsonify({'success': False, 'message': 'Nenhum arquivo selecionado!'})
-    
-    file = request.files['foto']
-    
-    if file.filename == '':
-        return jsonify({'success': False, 'message': 'Nenhum arquivo selecionado!'})
-    
-    if file and allowed_file(file.filename):
-        filename = secure_filename(f"jogador_{current_user.jogador_id}_{datetime.now().timestamp()}.{file.filename.rsplit('.', 1)[1].lower()}")
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        # Garante que a pasta existe
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        
-        file.save(filepath)
-        
-        # Atualiza foto do jogador
-        jogador = Jogador.query.get(current_user.jogador_id)
-        
-        # Remove foto anterior se existir
-        if jogador.foto_perfil:
-            old_path = os.path.join(app.static_folder, jogador.foto_perfil.lstrip('/'))
-            if os.path.exists(old_path) and os.path.basename(old_path) != filename:
-                try:
-                    os.remove(old_path)
-                except:
-                    pass
-        
-        jogador.foto_perfil = f"/static/uploads/{filename}"
-        db.session.commit()
-        
-        return jsonify({'success': True, 'foto_url': jogador.foto_perfil})
-    
-    return jsonify({'success': False, 'message': 'Tipo de arquivo não permitido!'})
+    return responder_upload_foto(Jogador.query.get(current_user.jogador_id))
 
 @app.route('/entrar_lista_espera', methods=['POST'])
 def entrar_lista_espera():
@@ -4892,39 +7705,18 @@ def sincronizar_todos_capitaes():
 @admin_required
 def api_capitao_prioridade(semana_id):
     """API para obter jogadores ordenados por prioridade"""
+    return resposta_condicional(
+        etag_dados((Semana, Confirmacao, Jogador, Time), semana_id, date.today()),
+        lambda: _montar_api_capitao_prioridade(semana_id),
+        privado=True
+    )
+
+def _montar_api_capitao_prioridade(semana_id):
     semana = Semana.query.get_or_404(semana_id)
     
-    confirmacoes = Confirmacao.query.filter_by(
-        semana_id=semana.id,
-        confirmado=True
-    ).order_by(Confirmacao.prioridade.desc()).all()
-    
     jogadores_info = []
-    for conf in confirmacoes:
-        jogador = conf.jogador
-        
-        # Verificar elegibilidade
-        elegivel = True
-        duas_semanas_atras = date.today() - timedelta(weeks=2)
-        ultimas_semanas = Semana.query.filter(
-            Semana.data >= duas_semanas_atras,
-            Semana.draft_finalizado == True
-        ).all()
-        
-        for s in ultimas_semanas:
-            if Time.query.filter_by(semana_id=s.id, capitao_id=jogador.id).first():
-                elegivel = False
-                break
-        
-        # Calcular pontuação
-        pontuacao = 0
-        if jogador.mensalista:
-            pontuacao += 100
-        if jogador.capitao:
-            pontuacao += 50
-        
-        vezes_capitao = Time.query.filter_by(capitao_id=jogador.id).count()
-        pontuacao -= vezes_capitao * 10
+    for candidato in avaliar_candidatos_capitao(semana):
+        jogador = candidato['jogador']
         
         jogadores_info.append({
             'id': jogador.id,
@@ -4932,13 +7724,13 @@ def api_capitao_prioridade(semana_id):
             'apelido': jogador.apelido,
             'posicao': jogador.posicao,
             'nivel': jogador.nivel,
-            'foto_perfil': jogador.foto_perfil,
+            'foto_perfil': url_foto(jogador.foto_perfil, 'avatar'),
             'mensalista': jogador.mensalista,
             'capitao': jogador.capitao,
-            'elegivel': elegivel,
-            'pontuacao': pontuacao,
-            'vezes_capitao': vezes_capitao,
-            'confirmacao': conf.confirmado
+            'elegivel': candidato['elegivel'],
+            'pontuacao': candidato['pontuacao'],
+            'vezes_capitao': candidato['vezes_capitao'],
+            'confirmacao': candidato['confirmacao'].confirmado
         })
     
     jogadores_info.sort(key=lambda x: x['pontuacao'], reverse=True)
@@ -4960,65 +7752,31 @@ def realizar_sorteio_capitaes(semana_id):
     
     try:
         # Buscar jogadores confirmados elegíveis (não em cool-down)
-        confirmacoes = Confirmacao.query.filter_by(
-            semana_id=semana.id,
-            confirmado=True
-        ).all()
+        elegiveis = [c for c in avaliar_candidatos_capitao(semana) if c['elegivel']]
         
-        jogadores_elegiveis = []
-        for conf in confirmacoes:
-            jogador = conf.jogador
-            
-            # Verificar cool-down (últimas 2 semanas)
-            elegivel = True
-            duas_semanas_atras = date.today() - timedelta(weeks=2)
-            ultimas_semanas = Semana.query.filter(
-                Semana.data >= duas_semanas_atras,
-                Semana.draft_finalizado == True
-            ).all()
-            
-            for s in ultimas_semanas:
-                if Time.query.filter_by(semana_id=s.id, capitao_id=jogador.id).first():
-                    elegivel = False
-                    break
-            
-            if elegivel:
-                jogadores_elegiveis.append({
-                    'id': jogador.id,
-                    'nome': jogador.nome,
-                    'mensalista': jogador.mensalista,
-                    'capitao_fixo': jogador.capitao,
-                    'pontuacao': 0
-                })
-        
-        if len(jogadores_elegiveis) < semana.max_times:
+        if len(elegiveis) < semana.max_times:
             return jsonify({
                 'success': False, 
-                'message': f'Precisa de pelo menos {semana.max_times} jogadores elegíveis! Disponíveis: {len(jogadores_elegiveis)}'
+                'message': f'Precisa de pelo menos {semana.max_times} jogadores elegíveis! Disponíveis: {len(elegiveis)}'
             })
         
-        # Calcular pontuações
-        for jogador in jogadores_elegiveis:
-            pontuacao = 0
-            if jogador['mensalista']:
-                pontuacao += 100
-            if jogador['capitao_fixo']:
-                pontuacao += 50
-            
-            # Contar vezes que já foi capitão
-            vezes_capitao = Time.query.filter_by(capitao_id=jogador['id']).count()
-            pontuacao -= vezes_capitao * 20  # Penalidade maior para quem já foi muito
-            
-            # Adicionar aleatoriedade controlada
-            pontuacao += secrets.randbelow(50)
-            
-            jogador['pontuacao'] = pontuacao
-        
-        # Ordenar por pontuação
-        jogadores_elegiveis.sort(key=lambda x: x['pontuacao'], reverse=True)
-        
-        # Selecionar os melhores
-        capitaes_selecionados = jogadores_elegiveis[:semana.max_times]
+        # Sorteio reproduzível a partir da semente (registrado para auditoria)
+        semente = semente_da_requisicao()
+        candidatos = [(c['jogador'].id, c['pontuacao']) for c in elegiveis]
+        nomes = {c['jogador'].id: c['jogador'].nome for c in elegiveis}
+        capitaes_selecionados = [
+            {'id': jogador_id, 'nome': nomes[jogador_id], 'pontuacao': pontuacao}
+            for jogador_id, pontuacao in sortear_capitaes(candidatos, semana.max_times, semente)
+        ]
+        registro = SorteioCapitaes(
+            semana_id=semana.id,
+            semente=semente,
+            candidatos=json.dumps(candidatos),
+            capitaes=json.dumps([c['id'] for c in capitaes_selecionados]),
+            quantidade=semana.max_times,
+            realizado_por=current_user.id
+        )
+        db.session.add(registro)
         
         # Criar times para cada capitão
         cores = ['#3498db', '#e74c3c', '#2ecc71', '#f39c12', '#9b59b6', '#1abc9c']
@@ -5067,12 +7825,14 @@ def realizar_sorteio_capitaes(semana_id):
         
         # Log do sorteio
         nomes_capitaes = [c['nome'] for c in capitaes_selecionados]
-        print(f"✅ Sorteio realizado para semana {semana.id}: {', '.join(nomes_capitaes)}")
+        print(f"✅ Sorteio realizado para semana {semana.id}: {', '.join(nomes_capitaes)} (semente {semente})")
         
         return jsonify({
             'success': True,
-            'message': f'Sorteio realizado com sucesso! {len(capitaes_selecionados)} capitães selecionados.',
-            'capitaes': nomes_capitaes
+            'message': f'Sorteio realizado com sucesso! {len(capitaes_selecionados)} capitães selecionados. Semente: {semente}',
+            'capitaes': nomes_capitaes,
+            'semente': semente,
+            'sorteio_id': registro.id
         })
         
     except Exception as e:
@@ -5080,6 +7840,82 @@ def realizar_sorteio_capitaes(semana_id):
         print(f"❌ Erro no sorteio: {e}")
         return jsonify({'success': False, 'message': f'Erro ao realizar sorteio: {str(e)}'})
     
+@app.route('/admin/sorteio_capitaes/<int:semana_id>/simular', methods=['POST'])
+@admin_required
+def simular_sorteio_capitaes(semana_id):
+    """Simula muitos sorteios com os candidatos atuais, sem gravar nada"""
+    semana = Semana.query.get_or_404(semana_id)
+    dados = request.get_json(silent=True) or {}
+    try:
+        simulacoes = int(dados.get('simulacoes', request.form.get('simulacoes', 1000)))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Número de simulações inválido!'})
+    if not 1 <= simulacoes <= MAX_SIMULACOES_SORTEIO:
+        return jsonify({'success': False, 'message': f'Simulações devem estar entre 1 e {MAX_SIMULACOES_SORTEIO}!'})
+    
+    elegiveis = [c for c in avaliar_candidatos_capitao(semana) if c['elegivel']]
+    if len(elegiveis) < semana.max_times:
+        return jsonify({
+            'success': False,
+            'message': f'Precisa de pelo menos {semana.max_times} jogadores elegíveis! Disponíveis: {len(elegiveis)}'
+        })
+    
+    semente = semente_da_requisicao()
+    candidatos = [(c['jogador'].id, c['pontuacao']) for c in elegiveis]
+    inicio = time_module.perf_counter()
+    selecionados = simular_sorteios(candidatos, semana.max_times, simulacoes, semente)
+    tempo_ms = (time_module.perf_counter() - inicio) * 1000
+    
+    return jsonify({
+        'success': True,
+        'semente': semente,
+        'simulacoes': simulacoes,
+        'tempo_ms': round(tempo_ms, 1),
+        'jogadores': [{
+            'id': c['jogador'].id,
+            'nome': c['jogador'].nome,
+            'pontuacao': c['pontuacao'],
+            'sorteado': selecionados[c['jogador'].id],
+            'percentual': round(100 * selecionados[c['jogador'].id] / simulacoes, 2)
+        } for c in elegiveis]
+    })
+
+@app.route('/api/sorteio_capitaes/<int:semana_id>/registros')
+@admin_required
+def api_registros_sorteio_capitaes(semana_id):
+    """Sorteios automáticos já realizados para a semana"""
+    registros = SorteioCapitaes.query.filter_by(semana_id=semana_id).order_by(
+        SorteioCapitaes.realizado_em.desc()
+    ).all()
+    
+    return jsonify({
+        'success': True,
+        'registros': [{
+            'id': r.id,
+            'semente': r.semente,
+            'candidatos': json.loads(r.candidatos),
+            'capitaes': json.loads(r.capitaes),
+            'quantidade': r.quantidade,
+            'realizado_por': r.realizado_por,
+            'realizado_em': r.realizado_em.isoformat() if r.realizado_em else None
+        } for r in registros]
+    })
+
+@app.route('/api/sorteio_capitaes/registro/<int:registro_id>/reproduzir')
+@admin_required
+def reproduzir_sorteio_capitaes(registro_id):
+    """Refaz um sorteio registrado a partir da semente e dos candidatos gravados"""
+    registro = SorteioCapitaes.query.get_or_404(registro_id)
+    resultado, confere = reproduzir_sorteio(registro)
+    
+    return jsonify({
+        'success': True,
+        'semente': registro.semente,
+        'capitaes': resultado,
+        'confere': confere,
+        'message': 'Resultado confere com o registrado.' if confere else 'Resultado DIFERENTE do registrado!'
+    })
+
 @app.route('/admin/sorteio_capitaes/<int:semana_id>/definir_manual', methods=['POST'])
 @admin_required
 def definir_capitaes_manual(semana_id):
@@ -5101,6 +7937,7 @@ def definir_capitaes_manual(semana_id):
         # Remover times existentes se houver
         EscolhaDraft.query.filter_by(semana_id=semana.id).delete()
         Time.query.filter_by(semana_id=semana.id).delete()
+        marcar_semana_analise(semana.id)
         
         # Criar novos times
         cores = ['#3498db', '#e74c3c', '#2ecc71', '#f39c12', '#9b59b6', '#1abc9c']
@@ -5277,14 +8114,14 @@ def trocar_capitao_time():
         # Emitir atualização via SocketIO se draft em andamento
         if semana.draft_em_andamento:
             try:
-                socketio.emit('draft_update', {
+                transmissor_draft.enviar(semana.id, 'draft_update', {
                     'semana_id': semana.id,
                     'acao': 'capitao_trocado',
                     'time_id': time.id,
                     'capitao_antigo_id': capitao_antigo_id,
                     'novo_capitao_id': novo_capitao_id,
                     'time_nome': time.nome
-                }, room=f'draft_{semana.id}')
+                })
                 
                 # Emitir status completo atualizado
                 emitir_status_draft_atualizado(semana.id)
@@ -5309,49 +8146,27 @@ def api_jogadores_disponiveis_troca(semana_id):
     """API para obter jogadores disponíveis para troca de capitão"""
     semana = Semana.query.get_or_404(semana_id)
     
-    # Buscar todos os jogadores confirmados
-    confirmacoes = Confirmacao.query.filter_by(
-        semana_id=semana.id,
-        confirmado=True
-    ).all()
+    # Capitães já definidos nesta semana ficam de fora
+    capitaes_semana = {capitao_id for (capitao_id,) in db.session.query(Time.capitao_id).filter(
+        Time.semana_id == semana.id
+    )}
     
     jogadores_info = []
-    for conf in confirmacoes:
-        jogador = conf.jogador
+    for candidato in avaliar_candidatos_capitao(semana):
+        jogador = candidato['jogador']
+        if jogador.id in capitaes_semana:
+            continue
         
-        # Verificar se já é capitão em algum time
-        ja_eh_capitao = Time.query.filter_by(
-            semana_id=semana.id,
-            capitao_id=jogador.id
-        ).first() is not None
-        
-        if not ja_eh_capitao:
-            # Verificar elegibilidade
-            elegivel = True
-            duas_semanas_atras = date.today() - timedelta(weeks=2)
-            ultimas_semanas = Semana.query.filter(
-                Semana.data >= duas_semanas_atras,
-                Semana.draft_finalizado == True
-            ).all()
-            
-            for s in ultimas_semanas:
-                if Time.query.filter_by(semana_id=s.id, capitao_id=jogador.id).first():
-                    elegivel = False
-                    break
-            
-            # Contar vezes que já foi capitão
-            vezes_capitao = Time.query.filter_by(capitao_id=jogador.id).count()
-            
-            jogadores_info.append({
-                'id': jogador.id,
-                'nome': jogador.nome,
-                'apelido': jogador.apelido,
-                'posicao': jogador.posicao,
-                'mensalista': jogador.mensalista,
-                'capitao': jogador.capitao,  # Capitão fixo no sistema
-                'elegivel': elegivel,
-                'vezes_capitao': vezes_capitao
-            })
+        jogadores_info.append({
+            'id': jogador.id,
+            'nome': jogador.nome,
+            'apelido': jogador.apelido,
+            'posicao': jogador.posicao,
+            'mensalista': jogador.mensalista,
+            'capitao': jogador.capitao,  # Capitão fixo no sistema
+            'elegivel': candidato['elegivel'],
+            'vezes_capitao': candidato['vezes_capitao']
+        })
     
     return jsonify({
         'success': True,
@@ -5376,6 +8191,7 @@ def limpar_sorteio_capitaes(semana_id):
         HistoricoDraft.query.filter_by(semana_id=semana.id).delete()
         EscolhaDraft.query.filter_by(semana_id=semana.id).delete()
         Time.query.filter_by(semana_id=semana.id).delete()
+        marcar_semana_analise(semana.id)
         
         # Reabrir lista
         semana.lista_aberta = True
@@ -5735,40 +8551,7 @@ def editar_jogador(id):
 @app.route('/admin/jogador/<int:id>/upload_foto', methods=['POST'])
 @admin_required
 def upload_foto_jogador_admin(id):
-    jogador = Jogador.query.get_or_404(id)
-    
-    if 'foto' not in request.files:
-        return jsonify({'success': False, 'message': 'Nenhum arquivo selecionado!'})
-    
-    file = request.files['foto']
-    
-    if file.filename == '':
-        return jsonify({'success': False, 'message': 'Nenhum arquivo selecionado!'})
-    
-    if file and allowed_file(file.filename):
-        filename = secure_filename(f"jogador_{jogador.id}_{datetime.now().timestamp()}.{file.filename.rsplit('.', 1)[1].lower()}")
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        # Garante que a pasta existe
-        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        
-        file.save(filepath)
-        
-        # Remove foto anterior se existir
-        if jogador.foto_perfil:
-            old_path = os.path.join(app.static_folder, jogador.foto_perfil.lstrip('/'))
-            if os.path.exists(old_path) and os.path.basename(old_path) != filename:
-                try:
-                    os.remove(old_path)
-                except:
-                    pass
-        
-        jogador.foto_perfil = f"/static/uploads/{filename}"
-        db.session.commit()
-        
-        return jsonify({'success': True, 'foto_url': jogador.foto_perfil})
-    
-    return jsonify({'success': False, 'message': 'Tipo de arquivo não permitido!'})
+    return responder_upload_foto(Jogador.query.get_or_404(id))
 
 @app.route('/admin/jogador/<int:id>/reset_password')
 @admin_required
@@ -5798,41 +8581,14 @@ def excluir_jogador(id):
     
     nome_jogador = jogador.nome
     
+    if request.args.get('simular'):
+        linhas = excluir_jogadores([id], simular=True)
+        flash(f'Simulação: excluir {nome_jogador} apagaria {descrever_exclusao(linhas)}.', 'info')
+        return redirect(url_for('admin_jogadores'))
+    
     try:
-        # Remove foto se existir
-        if jogador.foto_perfil:
-            old_path = os.path.join(app.static_folder, jogador.foto_perfil.lstrip('/'))
-            if os.path.exists(old_path):
-                try:
-                    os.remove(old_path)
-                except:
-                    pass
-        
-        # 1. Remove pagamentos do cofre associados a este jogador
-        PagamentoCofre.query.filter_by(jogador_id=id).delete()
-        
-        # 2. Remove confirmações associadas
-        Confirmacao.query.filter_by(jogador_id=id).delete()
-        
-        # 3. Remove escolhas de draft
-        EscolhaDraft.query.filter_by(jogador_id=id).delete()
-        
-        # 4. Remove histórico de draft
-        HistoricoDraft.query.filter_by(jogador_id=id).delete()
-        
-        # 5. Atualiza times onde é capitão (define como NULL ou outro valor)
-        times_como_capitao = Time.query.filter_by(capitao_id=id).all()
-        for time in times_como_capitao:
-            # Define o capitão como NULL ou 0
-            time.capitao_id = None
-        
-        # 6. Remove usuário associado se existir
-        if jogador.user:
-            db.session.delete(jogador.user)
-        
-        # 7. Remove o jogador
-        db.session.delete(jogador)
-        
+        # Pagamentos, confirmações, escolhas, históricos e usuário saem em lote
+        excluir_jogadores([id])
         db.session.commit()
         flash(f'Jogador {nome_jogador} excluído permanentemente!', 'success')
         
@@ -5843,6 +8599,47 @@ def excluir_jogador(id):
     
     return redirect(url_for('admin_jogadores'))
 
+@app.route('/api/admin/excluir/<tipo>', methods=['POST'])
+@admin_required
+def api_excluir_em_lote(tipo):
+    """Exclui um conjunto de semanas, times ou jogadores numa transação (ou simula)"""
+    excluir = {'semanas': excluir_semanas, 'times': excluir_times, 'jogadores': excluir_jogadores}.get(tipo)
+    if not excluir:
+        return jsonify({'success': False, 'message': 'Tipo inválido. Use semanas, times ou jogadores.'}), 400
+    
+    dados = request.get_json(silent=True) or {}
+    try:
+        ids = {int(id) for id in dados.get('ids', [])}
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Lista de ids inválida.'}), 400
+    if not ids:
+        return jsonify({'success': False, 'message': 'Informe os ids a excluir.'}), 400
+    simular = bool(dados.get('simular'))
+    
+    if tipo == 'semanas':
+        protegidas = Semana.query.filter(
+            Semana.id.in_(ids), Semana.data < date.today(), Semana.draft_finalizado == True
+        ).count()
+        if protegidas:
+            return jsonify({'success': False, 'message': f'{protegidas} semana(s) passada(s) com draft finalizado não podem ser excluídas.'}), 400
+    
+    try:
+        linhas = excluir(ids, simular=simular)
+        if simular:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Erro ao excluir: {str(e)}'}), 500
+    
+    return jsonify({
+        'success': True,
+        'simulacao': simular,
+        'linhas': linhas,
+        'message': f'{"Simulação" if simular else "Exclusão"}: {descrever_exclusao(linhas)}'
+    })
+
 @app.route('/admin/fechar_lista')
 @admin_required
 def fechar_lista():
@@ -5932,10 +8729,13 @@ def gerenciar_times():
         Jogador.ativo == True
     ).order_by(Jogador.nome).all()
     
+    resultados = {r.time_id: r for r in ResultadoTime.query.filter_by(semana_id=semana.id)}
+    
     return render_template('admin/gerenciar_times.html',
                          semana=semana,
                          times=times,
-                         jogadores_disponiveis=jogadores_disponiveis)
+                         jogadores_disponiveis=jogadores_disponiveis,
+                         resultados=resultados)
 
 @app.route('/admin/trocar_jogador', methods=['POST'])
 @admin_required
@@ -5997,13 +8797,13 @@ def trocar_jogador():
         
         # Emite atualização via SocketIO
         try:
-            socketio.emit('draft_update', {
+            transmissor_draft.enviar(semana_id, 'draft_update', {
                 'semana_id': semana_id,
                 'acao': 'jogador_trocado',
                 'jogador_id': jogador_id,
                 'time_origem_id': time_origem_id,
                 'time_destino_id': time_destino_id
-            }, room=f'draft_{semana_id}')
+            })
         except:
             pass
         
@@ -6141,19 +8941,8 @@ def promover_lista_espera(id):
     
     return redirect(url_for('admin_dashboard', semana_id=semana.id))
 
-@app.route('/api/draft/status_public')
-def api_draft_status_public():
-    """API para status do draft - versão pública"""
-    semana_id = request.args.get('semana_id', type=int)
-    
-    if semana_id:
-        semana = Semana.query.get(semana_id)
-    else:
-        semana = get_semana_atual()
-    
-    if not semana:
-        return jsonify({'success': False, 'message': 'Semana não encontrada'})
-    
+def montar_status_publico(semana):
+    """Dados completos do draft para espectadores (API, SSE e long-poll)"""
     # Status do draft
     draft_status = DraftStatus.query.filter_by(semana_id=semana.id).first()
     
@@ -6169,38 +8958,39 @@ def api_draft_status_public():
             'posicao_display': get_posicao_display_func(j.posicao),
             'nivel': j.nivel,
             'nivel_display': get_nivel_display_func(j.nivel),
-            'foto_perfil': j.foto_perfil,
+            'foto_perfil': url_foto(j.foto_perfil, 'avatar'),
             'mensalista': j.mensalista,
             'capitao': j.capitao
         } for j in disponiveis]
     
-    # Times info COM TODOS OS JOGADORES
+    # Times info COM TODOS OS JOGADORES (escolhas e jogadores numa consulta)
     times = Time.query.filter_by(semana_id=semana.id).order_by(Time.ordem_escolha).all()
+    times_por_id = {time.id: time for time in times}
+    escolhas = db.session.query(EscolhaDraft, Jogador).join(
+        Jogador, Jogador.id == EscolhaDraft.jogador_id
+    ).filter(
+        EscolhaDraft.semana_id == semana.id
+    ).order_by(EscolhaDraft.ordem_escolha).all()
+    
+    jogadores_por_time = {}
+    for escolha, jogador in escolhas:
+        jogadores_por_time.setdefault(escolha.time_id, []).append({
+            'id': jogador.id,
+            'nome': jogador.nome,
+            'apelido': jogador.apelido,
+            'posicao': jogador.posicao,
+            'posicao_display': get_posicao_display_func(jogador.posicao),
+            'nivel': jogador.nivel,
+            'nivel_display': get_nivel_display_func(jogador.nivel),
+            'foto_perfil': url_foto(jogador.foto_perfil, 'avatar'),
+            'mensalista': jogador.mensalista,
+            'round_num': escolha.round_num,
+            'ordem_escolha': escolha.ordem_escolha
+        })
+    
     times_info = []
     for time in times:
-        escolhas = EscolhaDraft.query.filter_by(
-            semana_id=semana.id,
-            time_id=time.id
-        ).order_by(EscolhaDraft.ordem_escolha).all()
-        
-        jogadores_time = []
-        for escolha in escolhas:
-            jogador = Jogador.query.get(escolha.jogador_id)
-            if jogador:
-                jogadores_time.append({
-                    'id': jogador.id,
-                    'nome': jogador.nome,
-                    'apelido': jogador.apelido,
-                    'posicao': jogador.posicao,
-                    'posicao_display': get_posicao_display_func(jogador.posicao),
-                    'nivel': jogador.nivel,
-                    'nivel_display': get_nivel_display_func(jogador.nivel),
-                    'foto_perfil': jogador.foto_perfil,
-                    'mensalista': jogador.mensalista,
-                    'round_num': escolha.round_num,
-                    'ordem_escolha': escolha.ordem_escolha
-                })
-        
+        jogadores_time = jogadores_por_time.get(time.id, [])
         times_info.append({
             'id': time.id,
             'nome': time.nome,
@@ -6212,15 +9002,9 @@ def api_draft_status_public():
     # Histórico recente (últimas 20 escolhas)
     historico = []
     if semana.draft_em_andamento or semana.draft_finalizado:
-        escolhas = EscolhaDraft.query.filter_by(semana_id=semana.id)\
-            .order_by(EscolhaDraft.ordem_escolha.desc())\
-            .limit(20)\
-            .all()
-        
-        for escolha in escolhas:
-            jogador = Jogador.query.get(escolha.jogador_id)
-            time = Time.query.get(escolha.time_id)
-            if jogador and time:
+        for escolha, jogador in escolhas[::-1][:20]:
+            time = times_por_id.get(escolha.time_id)
+            if time:
                 historico.append({
                     'jogador_id': jogador.id,
                     'jogador_nome': jogador.nome,
@@ -6235,28 +9019,202 @@ def api_draft_status_public():
     # Informações do capitão atual
     vez_capitao = None
     if draft_status and draft_status.vez_capitao_id:
-        capitao = Jogador.query.get(draft_status.vez_capitao_id)
+        capitao = db.session.get(Jogador, draft_status.vez_capitao_id)
         if capitao:
             vez_capitao = {
                 'id': capitao.id,
                 'nome': capitao.nome
             }
     
-    return jsonify({
-        'success': True,
-        'data': {
-            'semana_id': semana.id,
-            'draft_em_andamento': semana.draft_em_andamento,
-            'draft_finalizado': semana.draft_finalizado,
-            'rodada_atual': draft_status.rodada_atual if draft_status else 0,
-            'escolha_atual': draft_status.escolha_atual if draft_status else 0,
-            'vez_capitao': vez_capitao,
-            'jogadores_disponiveis': jogadores_disponiveis,
-            'times_info': times_info,
-            'historico': historico
-        },
-        'updated_at': datetime.utcnow().isoformat()
-    })
+    return {
+        'semana_id': semana.id,
+        'draft_em_andamento': semana.draft_em_andamento,
+        'draft_finalizado': semana.draft_finalizado,
+        'rodada_atual': draft_status.rodada_atual if draft_status else 0,
+        'escolha_atual': draft_status.escolha_atual if draft_status else 0,
+        'vez_capitao': vez_capitao,
+        'jogadores_disponiveis': jogadores_disponiveis,
+        'times_info': times_info,
+        'historico': historico
+    }
+
+@app.route('/api/draft/status_public')
+def api_draft_status_public():
+    """API para status do draft - versão pública"""
+    semana_id = request.args.get('semana_id', type=int)
+    
+    if semana_id:
+        semana = Semana.query.get(semana_id)
+    else:
+        semana = get_semana_atual()
+    
+    if not semana:
+        return jsonify({'success': False, 'message': 'Semana não encontrada'})
+    
+    # ETag pela versão do draft: o relógio grava DraftStatus a cada segundo,
+    # mas não altera o que a página pública mostra
+    etag = etag_dados((), semana.id, versao_draft(semana.id))
+    
+    def montar():
+        versao, dados = status_publico_versionado(semana)
+        return jsonify({
+            'success': True,
+            'data': dados,
+            'versao': versao
+        })
+    
+    return resposta_condicional(etag, montar)
+
+# ======================================================
+# ESPECTADORES SEM WEBSOCKET (SSE E LONG-POLL)
+# ======================================================
+SSE_DURACAO_MAXIMA = 300  # segundos; o navegador reconecta com Last-Event-ID
+SSE_KEEPALIVE = 15  # segundos entre comentários de keep-alive
+LONG_POLL_MAXIMO = 30  # segundos de espera máxima do long-poll
+INTERVALO_VERIFICACAO_DRAFT = 0.25  # segundos entre checagens do contador em memória
+# Os eventos do transmissor acordam as esperas na hora; a consulta ao banco
+# é só a rede de segurança para alterações feitas sem evento
+INTERVALO_CONSULTA_DRAFT = 10  # segundos entre consultas de versão no banco
+
+_cache_status_publico = {}
+_cache_status_publico_lock = Lock()
+
+def versao_draft(semana_id):
+    """Impressão digital do estado do draft (muda a cada escolha, troca ou avanço).
+
+    Inclui as versões de jogadores e confirmações (nomes, fotos e lista de
+    disponíveis). O tempo restante fica de fora para o relógio não gerar
+    novas versões.
+    """
+    escolhas = db.session.query(
+        func.count(EscolhaDraft.id),
+        func.coalesce(func.max(EscolhaDraft.id), 0),
+        func.coalesce(func.sum(EscolhaDraft.id * EscolhaDraft.time_id), 0)
+    ).filter(EscolhaDraft.semana_id == semana_id).one()
+    times = db.session.query(
+        func.count(Time.id),
+        func.coalesce(func.sum(Time.id * func.coalesce(Time.capitao_id, 0)), 0)
+    ).filter(Time.semana_id == semana_id).one()
+    semana = db.session.query(
+        Semana.draft_em_andamento, Semana.draft_finalizado
+    ).filter(Semana.id == semana_id).first()
+    status = db.session.query(
+        DraftStatus.rodada_atual, DraftStatus.escolha_atual,
+        DraftStatus.vez_capitao_id, DraftStatus.finalizado
+    ).filter(DraftStatus.semana_id == semana_id).first()
+    
+    assinatura = repr((tuple(escolhas), tuple(times),
+                       tuple(semana) if semana else None,
+                       tuple(status) if status else None,
+                       versoes_tabelas([Jogador.__tablename__, Confirmacao.__tablename__])))
+    return format(zlib.crc32(assinatura.encode('utf-8')), '08x')
+
+def status_publico_versionado(semana):
+    """Retorna (versao, dados), montando os dados uma vez por versão"""
+    versao = versao_draft(semana.id)
+    with _cache_status_publico_lock:
+        em_cache = _cache_status_publico.get(semana.id)
+    if em_cache and em_cache[0] == versao:
+        return em_cache
+    
+    resultado = (versao, montar_status_publico(semana))
+    with _cache_status_publico_lock:
+        _cache_status_publico[semana.id] = resultado
+    return resultado
+
+def aguardar_mudanca_draft(semana_id, versao_conhecida, limite):
+    """Bloqueia até a versão do draft mudar ou o limite (segundos) acabar.
+
+    Retorna a versão atual. Os eventos em memória do transmissor acordam a
+    espera na hora; a consulta periódica cobre alterações sem evento.
+    """
+    fim = time_module.monotonic() + limite
+    # Nenhuma conexão do pool fica presa durante a espera
+    db.session.rollback()
+    sequencia = transmissor_draft.sequencia(semana_id)
+    proxima_consulta = time_module.monotonic() + INTERVALO_CONSULTA_DRAFT
+    versao = versao_conhecida
+    
+    while True:
+        agora = time_module.monotonic()
+        sequencia_atual = transmissor_draft.sequencia(semana_id)
+        if sequencia_atual != sequencia or agora >= proxima_consulta:
+            sequencia = sequencia_atual
+            proxima_consulta = agora + INTERVALO_CONSULTA_DRAFT
+            versao = versao_draft(semana_id)
+            # Encerra a transação: devolve a conexão antes de dormir e a
+            # próxima consulta enxerga o que outros commits gravaram
+            db.session.rollback()
+            if versao != versao_conhecida:
+                return versao
+        if agora >= fim:
+            return versao
+        socketio.sleep(min(INTERVALO_VERIFICACAO_DRAFT, max(0, fim - agora)))
+
+@app.route('/api/draft/<int:semana_id>/stream')
+def api_draft_stream(semana_id):
+    """Server-Sent Events com o status público do draft (retoma por Last-Event-ID)"""
+    semana = Semana.query.get_or_404(semana_id)
+    ultima_versao = request.headers.get('Last-Event-ID') or request.args.get('ultimo')
+    
+    # Draft encerrado e já entregue: 204 faz o EventSource parar de reconectar
+    if semana.draft_finalizado and not semana.draft_em_andamento \
+            and ultima_versao == versao_draft(semana.id):
+        return Response(status=204)
+    
+    def gerar():
+        versao_enviada = ultima_versao
+        fim = time_module.monotonic() + SSE_DURACAO_MAXIMA
+        yield 'retry: 3000\n\n'
+        
+        while time_module.monotonic() < fim:
+            db.session.rollback()
+            atual = db.session.get(Semana, semana_id)
+            if not atual:
+                break
+            versao, dados = status_publico_versionado(atual)
+            # Devolve a conexão ao pool antes de entregar o evento
+            db.session.rollback()
+            if versao != versao_enviada:
+                versao_enviada = versao
+                yield f'id: {versao}\nevent: draft\ndata: {json_dumps(dados)}\n\n'
+                if dados['draft_finalizado'] and not dados['draft_em_andamento']:
+                    break
+            
+            limite = min(SSE_KEEPALIVE, fim - time_module.monotonic())
+            if aguardar_mudanca_draft(semana_id, versao_enviada, limite) == versao_enviada:
+                yield ': keep-alive\n\n'
+    
+    response = Response(stream_with_context(gerar()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/draft/<int:semana_id>/aguardar')
+def api_draft_aguardar(semana_id):
+    """Long-poll: responde quando a versão do draft for diferente da informada.
+
+    A versão vem em ?versao= ou If-None-Match; sem mudança dentro do prazo a
+    resposta é 304.
+    """
+    semana = Semana.query.get_or_404(semana_id)
+    versao_cliente = request.args.get('versao') or (request.headers.get('If-None-Match') or '').strip('"') or None
+    espera = max(0, min(request.args.get('timeout', 25, type=int), LONG_POLL_MAXIMO))
+    
+    versao = versao_draft(semana.id)
+    if versao_cliente and versao == versao_cliente:
+        versao = aguardar_mudanca_draft(semana.id, versao_cliente, espera)
+        if versao == versao_cliente:
+            response = Response(status=304)
+            response.headers['ETag'] = f'"{versao}"'
+            return response
+        semana = db.session.get(Semana, semana_id)
+    
+    versao, dados = status_publico_versionado(semana)
+    response = jsonify({'success': True, 'data': dados, 'versao': versao})
+    response.headers['ETag'] = f'"{versao}"'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/admin/adicionar_jogador_time', methods=['POST'])
 @admin_required
@@ -6344,13 +9302,13 @@ def adicionar_jogador_time():
         
         # Emite atualização
         try:
-            socketio.emit('draft_update', {
+            transmissor_draft.enviar(semana_id, 'draft_update', {
                 'semana_id': semana_id,
                 'acao': 'jogador_adicionado',
                 'jogador_id': jogador_id,
                 'jogador_nome': jogador.nome,
                 'time_id': time_id
-            }, room=f'draft_{semana_id}')
+            })
         except:
             pass
         
@@ -6540,7 +9498,6 @@ def capitao_escolher():
     draft_status = DraftStatus.query.filter_by(semana_id=semana.id).first()
     if not draft_status or draft_status.vez_capitao_id != current_user.jogador_id:
         return jsonify({'success': False, 'message': 'Não é a sua vez de escolher!'})
-    print("tick", semana.id, draft_status.tempo_restante)
     
     # Busca time do capitão PARA ESTA SEMANA
     time = Time.query.filter_by(
@@ -6663,7 +9620,7 @@ def capitao_escolher():
     # EMITE ATUALIZAÇÕES VIA SOCKETIO (para esta semana específica)
     try:
         # Emite para todos os capitães conectados nesta semana
-        socketio.emit('player_selected_update', {
+        transmissor_draft.enviar(semana.id, 'player_selected_update', {
             'semana_id': semana.id,
             'jogador_id': jogador.id,
             'jogador_nome': jogador.nome,
@@ -6673,7 +9630,7 @@ def capitao_escolher():
             'rodada_atual': draft_status.rodada_atual,
             'escolha_atual': draft_status.escolha_atual,
             'finalizado': draft_status.finalizado
-        }, room=f'draft_{semana.id}')
+        })
         
         # Emite status completo atualizado
         emitir_status_draft_atualizado(semana.id)
@@ -6693,13 +9650,20 @@ def capitao_escolher():
         'semana_id': semana.id  # Adicionado para referência
     })
 
+
 # ======================================================
 # ROTAS DO DRAFT (VISUALIZAÇÃO PÚBLICA)
 # ======================================================
 
+POR_PAGINA_TIMES = 10
+
 @app.route('/times')
 def ver_times():
-    """Página para visualizar todos os times formados por semana"""
+    """Página para visualizar todos os times formados por semana.
+    
+    Paginação por chave (keyset) em Semana.data: ?antes=AAAA-MM-DD traz as
+    semanas anteriores a essa data e ?depois=AAAA-MM-DD as posteriores.
+    """
     # Filtros
     ano = request.args.get('ano', type=int)
     mes = request.args.get('mes', type=int)
@@ -6707,43 +9671,85 @@ def ver_times():
     
     hoje = date.today()
     
+    try:
+        antes = datetime.strptime(request.args['antes'], '%Y-%m-%d').date() if request.args.get('antes') else None
+        depois = datetime.strptime(request.args['depois'], '%Y-%m-%d').date() if request.args.get('depois') else None
+    except ValueError:
+        antes = depois = None
+    
+    if mes and not 1 <= mes <= 12:
+        mes = None
+    # Intervalo de datas (usa o índice de Semana.data em vez de extract())
+    inicio, fim = intervalo_datas(ano=ano, mes=mes) if ano else (None, None)
+    
     # Query base - busca semanas com times formados
-    query = Semana.query.filter(
-        Semana.draft_finalizado == True  # Apenas drafts finalizados
+    query = filtrar_periodo(
+        Semana.query.filter(Semana.draft_finalizado == True),  # Apenas drafts finalizados
+        Semana.data, inicio, fim
     )
-    
-    # Aplicar filtros
-    if ano:
-        query = query.filter(db.extract('year', Semana.data) == ano)
-    if mes:
+    if mes and not ano:
+        # Mês sem ano: não há intervalo contínuo, filtra pelo mês em qualquer ano
         query = query.filter(db.extract('month', Semana.data) == mes)
+    filtrada = query
     
-    # Ordenar por data (mais recente primeiro)
-    semanas = query.order_by(Semana.data.desc()).all()
+    if depois:
+        semanas = query.filter(Semana.data > depois).order_by(Semana.data.asc()).limit(POR_PAGINA_TIMES + 1).all()
+        tem_mais_recentes = len(semanas) > POR_PAGINA_TIMES
+        semanas = list(reversed(semanas[:POR_PAGINA_TIMES]))
+        tem_mais_antigas = True
+    else:
+        if antes:
+            query = query.filter(Semana.data < antes)
+        semanas = query.order_by(Semana.data.desc()).limit(POR_PAGINA_TIMES + 1).all()
+        tem_mais_antigas = len(semanas) > POR_PAGINA_TIMES
+        semanas = semanas[:POR_PAGINA_TIMES]
+        tem_mais_recentes = antes is not None
+    
+    # Carrega times, escolhas e jogadores da página em poucas consultas
+    semana_ids = [semana.id for semana in semanas]
+    times_por_semana = {}
+    jogadores_por_time = {}
+    capitaes_por_id = {}
+    if semana_ids:
+        for time in Time.query.filter(Time.semana_id.in_(semana_ids)).order_by(Time.ordem_escolha):
+            times_por_semana.setdefault(time.semana_id, []).append(time)
+        
+        for escolha, jogador in db.session.query(EscolhaDraft, Jogador).join(
+            Jogador, Jogador.id == EscolhaDraft.jogador_id
+        ).filter(
+            EscolhaDraft.semana_id.in_(semana_ids)
+        ).order_by(EscolhaDraft.ordem_escolha):
+            jogadores_por_time.setdefault(escolha.time_id, []).append({
+                'jogador': jogador,
+                'ordem_escolha': escolha.ordem_escolha,
+                'round': escolha.round_num
+            })
+        
+        # Semanas antigas: escolhas vêm do arquivo
+        arquivadas = sorted(linhas_arquivadas(EscolhaDraft, semana_ids), key=lambda e: e['ordem_escolha'] or 0)
+        if arquivadas:
+            jogadores_arquivo = {j.id: j for j in Jogador.query.filter(
+                Jogador.id.in_({e['jogador_id'] for e in arquivadas})
+            )}
+            for escolha in arquivadas:
+                if escolha['jogador_id'] in jogadores_arquivo:
+                    jogadores_por_time.setdefault(escolha['time_id'], []).append({
+                        'jogador': jogadores_arquivo[escolha['jogador_id']],
+                        'ordem_escolha': escolha['ordem_escolha'],
+                        'round': escolha['round_num']
+                    })
+        
+        capitao_ids = {t.capitao_id for times in times_por_semana.values() for t in times if t.capitao_id}
+        if capitao_ids:
+            capitaes_por_id = {j.id: j for j in Jogador.query.filter(Jogador.id.in_(capitao_ids))}
     
-    # Para cada semana, buscar times e jogadores
     semanas_com_times = []
     for semana in semanas:
-        times = Time.query.filter_by(semana_id=semana.id).order_by(Time.ordem_escolha).all()
+        times = times_por_semana.get(semana.id, [])
         
-        # Para cada time, buscar jogadores
         times_com_jogadores = []
         for time in times:
-            escolhas = EscolhaDraft.query.filter_by(
-                semana_id=semana.id,
-                time_id=time.id
-            ).order_by(EscolhaDraft.ordem_escolha).all()
-            
-            jogadores = []
-            for escolha in escolhas:
-                jogador = Jogador.query.get(escolha.jogador_id)
-                if jogador:
-                    jogadores.append({
-                        'jogador': jogador,
-                        'ordem_escolha': escolha.ordem_escolha,
-                        'round': escolha.round_num
-                    })
-            
+            jogadores = jogadores_por_time.get(time.id, [])
             times_com_jogadores.append({
                 'time': time,
                 'jogadores': jogadores,
@@ -6752,7 +9758,7 @@ def ver_times():
         
         # Estatísticas da semana
         total_jogadores = sum(len(t['jogadores']) for t in times_com_jogadores)
-        capitaes = [Jogador.query.get(time.capitao_id) for time in times if time.capitao_id]
+        capitaes = [capitaes_por_id[time.capitao_id] for time in times if time.capitao_id in capitaes_por_id]
         
         semanas_com_times.append({
             'semana': semana,
@@ -6764,22 +9770,38 @@ def ver_times():
             }
         })
     
-    # Buscar anos/meses disponíveis para filtro
-    anos_disponiveis = db.session.query(
-        db.extract('year', Semana.data).label('ano')
-    ).filter(Semana.draft_finalizado == True).distinct().order_by('ano').all()
+    # Totais de todo o filtro (não só da página)
+    ids_filtrados = filtrada.with_entities(Semana.id)
+    totais = {
+        'semanas': filtrada.count(),
+        'times': Time.query.filter(Time.semana_id.in_(ids_filtrados)).count(),
+        'jogadores': EscolhaDraft.query.filter(EscolhaDraft.semana_id.in_(ids_filtrados)).count() + (
+            db.session.query(func.sum(ArquivoSemana.escolhas)).filter(
+                ArquivoSemana.semana_id.in_(ids_filtrados)
+            ).scalar() or 0
+        ),
+    }
     
-    meses_disponiveis = db.session.query(
-        db.extract('month', Semana.data).label('mes')
-    ).filter(Semana.draft_finalizado == True).distinct().order_by('mes').all()
+    # Anos disponíveis para filtro (min/max usam o índice de Semana.data)
+    primeira, ultima = db.session.query(
+        func.min(Semana.data), func.max(Semana.data)
+    ).filter(Semana.draft_finalizado == True).one()
+    anos_disponiveis = list(range(primeira.year, ultima.year + 1)) if primeira else []
+    
+    filtros = {'ano': ano, 'mes': mes, 'status': status if status != 'todos' else None}
+    filtros = {chave: valor for chave, valor in filtros.items() if valor}
     
     return render_template('times/historico.html',
                          semanas_com_times=semanas_com_times,
-                         anos_disponiveis=[a.ano for a in anos_disponiveis if a.ano],
-                         meses_disponiveis=[m.mes for m in meses_disponiveis if m.mes],
+                         totais=totais,
+                         anos_disponiveis=anos_disponiveis,
+                         meses_disponiveis=list(range(1, 13)),
                          ano_selecionado=ano,
                          mes_selecionado=mes,
                          status_selecionado=status,
+                         filtros=filtros,
+                         pagina_anterior=semanas[0].data.isoformat() if semanas and tem_mais_recentes else None,
+                         proxima_pagina=semanas[-1].data.isoformat() if semanas and tem_mais_antigas else None,
                          hoje=hoje)
 
 @app.route('/draft')
@@ -6965,26 +9987,45 @@ def draft_publico():
 # SOCKET.IO - COMUNICAÇÃO EM TEMPO REAL (corrigido)
 # ======================================================
 
+def chave_cliente_socket():
+    """Identifica o cliente entre conexões para contar reconexões"""
+    if current_user.is_authenticated:
+        return f'user_{current_user.id}'
+    return request.headers.get('X-Forwarded-For', request.remote_addr)
+
 @socketio.on('connect')
-def handle_connect():
+@medir_evento_socket('connect')
+def handle_connect(auth=None):
+    metricas_socketio.registrar_conexao(request.sid, chave_cliente_socket())
+    iniciar_log_metricas()
     if current_user.is_authenticated:
         join_room(f'user_{current_user.id}')
         emit('connected', {'user_id': current_user.id})
 
+@socketio.on('disconnect')
+def handle_disconnect(reason=None):
+    metricas_socketio.registrar_desconexao(request.sid, chave_cliente_socket())
+
 @socketio.on('join_draft')
+@medir_evento_socket('join_draft')
 def handle_join_draft(data):
     semana_id = data.get('semana_id')
     if semana_id:
         join_room(f'draft_{semana_id}')
+        if current_user.is_authenticated and current_user.role == 'admin':
+            join_room(f'draft_admin_{semana_id}')
         emit('joined_draft', {'semana_id': semana_id})
 
 @socketio.on('leave_draft')
+@medir_evento_socket('leave_draft')
 def handle_leave_draft(data):
     semana_id = data.get('semana_id')
     if semana_id:
         leave_room(f'draft_{semana_id}')
+        leave_room(f'draft_admin_{semana_id}')
 
 @socketio.on('request_draft_status')
+@medir_evento_socket('request_draft_status')
 def handle_request_draft_status(data):
     semana_id = data.get('semana_id')
     if not semana_id:
@@ -7002,55 +10043,13 @@ def handle_request_draft_status(data):
     
     # Emite status atualizado apenas para este cliente
     try:
-        times = Time.query.filter_by(semana_id=semana.id).order_by(Time.ordem_escolha).all()
-        
-        times_info = []
-        for time in times:
-            capitao = Jogador.query.get(time.capitao_id)
-            escolhas = EscolhaDraft.query.filter_by(
-                semana_id=semana.id,
-                time_id=time.id
-            ).order_by(EscolhaDraft.ordem_escolha).all()
-            
-            jogadores = []
-            for escolha in escolhas:
-                jogador = Jogador.query.get(escolha.jogador_id)
-                jogadores.append({
-                    'id': jogador.id,
-                    'nome': jogador.nome,
-                    'apelido': jogador.apelido,
-                    'posicao': jogador.posicao,
-                    'nivel': jogador.nivel
-                })
-            
-            times_info.append({
-                'id': time.id,
-                'nome': time.nome,
-                'cor': time.cor,
-                'capitao': capitao.nome if capitao else 'Desconhecido',
-                'capitao_id': capitao.id if capitao else None,
-                'jogadores': jogadores,
-                'total_jogadores': len(jogadores)
-            })
-        
-        # Emite apenas para este cliente
-        emit('draft_status_update', {
-            'semana_id': semana.id,
-            'draft_em_andamento': semana.draft_em_andamento,
-            'finalizado': draft_status.finalizado,
-            'rodada_atual': draft_status.rodada_atual,
-            'escolha_atual': draft_status.escolha_atual,
-            'tempo_restante': draft_status.tempo_restante if draft_status and semana.tempo_escolha > 0 else None,
-            'tempo_configurado': semana.tempo_escolha,
-            'vez_capitao_id': draft_status.vez_capitao_id if draft_status else None,
-            'capitao_atual': draft_status.vez_capitao.nome if draft_status and draft_status.vez_capitao else None,
-            'times': times_info
-        })
-        
+        completo, _ = montar_status_draft(semana, draft_status)
+        emit('draft_status_update', completo)
     except Exception as e:
         print(f"Erro ao emitir status: {e}")
 
 @socketio.on('player_selected')
+@medir_evento_socket('player_selected')
 def handle_player_selected(data):
     """Quando um jogador é escolhido, notifica todos os capitães"""
     semana_id = data.get('semana_id')
@@ -7074,7 +10073,7 @@ def handle_player_selected(data):
         return
     
     # Emite atualização específica
-    emit('player_selected_update', {
+    transmissor_draft.enviar(semana.id, 'player_selected_update', {
         'semana_id': semana.id,
         'jogador_id': jogador.id,
         'jogador_nome': jogador.nome,
@@ -7084,19 +10083,20 @@ def handle_player_selected(data):
         'rodada_atual': draft_status.rodada_atual,
         'escolha_atual': draft_status.escolha_atual,
         'finalizado': draft_status.finalizado
-    }, room=f'draft_{semana.id}')        
+    })
 
 
 @socketio.on('join_draft_public')
+@medir_evento_socket('join_draft_public')
 def handle_join_draft_public(data):
     """Público entra em sala separada"""
     semana_id = data.get('semana_id')
     if semana_id:
         join_room(f'draft_public_{semana_id}')
-        print(f"👥 Público {request.sid} entrou na sala draft_public_{semana_id}")
         emit('joined_draft_public', {'semana_id': semana_id})
 
 @socketio.on('request_draft_status_public')
+@medir_evento_socket('request_draft_status_public')
 def handle_request_draft_status_public(data):
     """Público solicita status"""
     semana_id = data.get('semana_id')
@@ -7112,38 +10112,99 @@ def handle_request_draft_status_public(data):
     if not draft_status:
         return
     
-    times = Time.query.filter_by(semana_id=semana.id).order_by(Time.ordem_escolha).all()
-    
-    times_info_simplificado = []
-    for time in times:
-        escolhas = EscolhaDraft.query.filter_by(
-            semana_id=semana.id,
-            time_id=time.id
-        ).order_by(EscolhaDraft.ordem_escolha).all()
-        
-        jogadores_simplificado = []
-        for escolha in escolhas:
-            jogador = Jogador.query.get(escolha.jogador_id)
-            jogadores_simplificado.append({
-                'id': jogador.id,
-                'nome': jogador.nome,
-                'posicao': jogador.posicao
-            })
-        
-        times_info_simplificado.append({
-            'id': time.id,
-            'nome': time.nome,
-            'cor': time.cor,
-            'total_jogadores': len(jogadores_simplificado)
-        })
-    
-    emit('draft_status_public', {
-        'semana_id': semana.id,
-        'rodada_atual': draft_status.rodada_atual,
-        'escolha_atual': draft_status.escolha_atual,
-        'vez_capitao_id': draft_status.vez_capitao_id,
-        'times': times_info_simplificado
-    })
+    _, publico = montar_status_draft(semana, draft_status)
+    emit('draft_status_public', publico)
+
+@app.route('/api/socketio/metricas')
+@admin_required
+def api_socketio_metricas():
+    """Métricas da camada em tempo real (salas, emits, bytes, latência)"""
+    return jsonify(metricas_socketio.snapshot())
+
+# ======================================================
+# VERSÕES DE DADOS E GET CONDICIONAL (ETag)
+# ======================================================
+# Cada commit incrementa, na própria transação, a linha de VersaoTabela das
+# tabelas que alterou. Como o contador fica no banco, escritas de outros
+# processos (outro worker, comandos da CLI) também mudam as versões. As APIs
+# consultadas em polling montam o ETag a partir desses contadores e
+# respondem 304 sem montar a resposta quando nada mudou. A época muda a
+# cada versão do código, invalidando ETags de respostas com outro formato.
+
+with open(__file__, 'rb') as _fonte:
+    EPOCA_VERSOES = format(zlib.crc32(_fonte.read()), '08x')
+
+def marcar_tabelas_alteradas(session, *tabelas):
+    """Anota tabelas alteradas fora do flush (operações em massa)"""
+    session.info.setdefault('tabelas_alteradas', set()).update(tabelas)
+
+@event.listens_for(db.session, 'after_flush')
+def _coletar_tabelas_alteradas(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tabela = getattr(obj, '__tablename__', None)
+        if tabela:
+            marcar_tabelas_alteradas(session, tabela)
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _coletar_tabelas_em_massa(orm_execute_state):
+    """query.update()/delete() e insert() não passam pelo flush"""
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        tabela = getattr(orm_execute_state.statement, 'table', None)
+        if tabela is not None:
+            marcar_tabelas_alteradas(orm_execute_state.session, tabela.name)
+
+@event.listens_for(db.session, 'before_commit')
+def _incrementar_versoes_tabelas(session):
+    # O commit só faz o último flush depois deste evento: antecipa para
+    # coletar as tabelas dele também
+    session.flush()
+    tabelas = session.info.pop('tabelas_alteradas', set())
+    tabelas.discard(VersaoTabela.__tablename__)
+    if not tabelas:
+        return
+    _inserir_ignorando(VersaoTabela, [{'tabela': tabela, 'versao': 0} for tabela in sorted(tabelas)])
+    session.execute(
+        update(VersaoTabela)
+        .where(VersaoTabela.tabela.in_(tabelas))
+        .values(versao=VersaoTabela.versao + 1),
+        execution_options={'synchronize_session': False}
+    )
+
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_rollback')
+def _descartar_versoes_tabelas(session):
+    session.info.pop('tabelas_alteradas', None)
+
+def versoes_tabelas(tabelas):
+    """Versões atuais das tabelas (lidas do banco), na ordem pedida"""
+    if not tabelas:
+        return []
+    lidas = dict(db.session.query(VersaoTabela.tabela, VersaoTabela.versao).filter(
+        VersaoTabela.tabela.in_(tabelas)
+    ))
+    return [lidas.get(tabela, 0) for tabela in tabelas]
+
+def etag_dados(modelos, *extras):
+    """ETag a partir dos contadores das tabelas dos modelos e de chaves extras"""
+    contadores = versoes_tabelas([m.__tablename__ for m in modelos])
+    assinatura = repr((EPOCA_VERSOES, contadores, extras))
+    return hashlib.sha1(assinatura.encode('utf-8')).hexdigest()[:16]
+
+def resposta_condicional(etag, montar_resposta, privado=False):
+    """Responde 304 se o cliente já tem o ETag; senão monta a resposta completa"""
+    # Comparação fraca: respostas comprimidas levam o ETag como W/"..."
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = montar_resposta()
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache' if privado else 'no-cache'
+    return response
+
+# Tabelas de que cada API depende
+MODELOS_STATUS_DRAFT = (Semana, DraftStatus, Time, EscolhaDraft, Jogador, ConfiguracaoGlobal)
+MODELOS_DISPONIVEIS = (Semana, Confirmacao, EscolhaDraft, Jogador, ConfiguracaoGlobal)
+MODELOS_MENSALIDADES = (Jogador, ConfiguracaoGlobal, CicloMensalidade)
 
 # ======================================================
 # APIs
@@ -7151,6 +10212,12 @@ def handle_request_draft_status_public(data):
 
 @app.route('/api/draft/status')
 def api_draft_status():
+    return resposta_condicional(
+        etag_dados(MODELOS_STATUS_DRAFT, date.today()),
+        _montar_api_draft_status
+    )
+
+def _montar_api_draft_status():
     semana = get_semana_atual()
     draft_status = DraftStatus.query.filter_by(semana_id=semana.id).first()
     
@@ -7205,6 +10272,12 @@ def api_draft_status():
 
 @app.route('/api/jogadores/disponiveis')
 def api_jogadores_disponiveis():
+    return resposta_condicional(
+        etag_dados(MODELOS_DISPONIVEIS, date.today()),
+        _montar_api_jogadores_disponiveis
+    )
+
+def _montar_api_jogadores_disponiveis():
     semana = get_semana_atual()
     
     if not semana.draft_em_andamento:
@@ -7226,6 +10299,63 @@ def api_jogadores_disponiveis():
     
     return jsonify({'disponiveis': jogadores_info})
 
+def jogador_disponivel_dict(jogador):
+    return {
+        'id': jogador.id,
+        'nome': jogador.nome,
+        'apelido': jogador.apelido,
+        'posicao': jogador.posicao,
+        'posicao_display': get_posicao_display_func(jogador.posicao),
+        'nivel': jogador.nivel,
+        'nivel_display': get_nivel_display_func(jogador.nivel),
+        'foto_perfil': url_foto(jogador.foto_perfil, 'avatar'),
+        'mensalista': jogador.mensalista,
+        'capitao': jogador.capitao,
+        'rating': jogador.rating
+    }
+
+def filtros_disponiveis_da_requisicao():
+    """Lê os filtros da consulta de disponíveis da query string"""
+    mensalista = request.args.get('mensalista')
+    ordenar = request.args.get('ordenar', 'nome')
+    return {
+        'posicao': request.args.get('posicao') or None,
+        'nivel': request.args.get('nivel') or None,
+        'mensalista': None if mensalista in (None, '') else mensalista in ('1', 'true', 'sim'),
+        'rating_min': request.args.get('rating_min', type=int),
+        'rating_max': request.args.get('rating_max', type=int),
+        'busca': (request.args.get('busca') or '').strip() or None,
+        'ordenar': ordenar if ordenar in ('nome', 'rating') else 'nome',
+        'pagina': max(request.args.get('pagina', 1, type=int), 1),
+        'por_pagina': max(1, min(request.args.get('por_pagina', POR_PAGINA_DISPONIVEIS, type=int),
+                                 MAX_POR_PAGINA_DISPONIVEIS)),
+    }
+
+@app.route('/api/capitao/disponiveis/<int:semana_id>')
+@capitao_required
+def api_capitao_disponiveis(semana_id):
+    """Consulta paginada dos disponíveis (posição, nível, rating, busca por nome)"""
+    filtros = filtros_disponiveis_da_requisicao()
+    etag = etag_dados(MODELOS_DISPONIVEIS, semana_id, sorted(filtros.items()))
+    
+    def montar():
+        semana = Semana.query.get_or_404(semana_id)
+        if not semana.draft_em_andamento:
+            return jsonify({'success': True, 'jogadores': [], 'total': 0,
+                            'pagina': 1, 'paginas': 0})
+        
+        jogadores, total = obter_pool_disponiveis(semana).consultar(**filtros)
+        return jsonify({
+            'success': True,
+            'jogadores': [jogador_disponivel_dict(j) for j in jogadores],
+            'total': total,
+            'pagina': filtros['pagina'],
+            'por_pagina': filtros['por_pagina'],
+            'paginas': (total + filtros['por_pagina'] - 1) // filtros['por_pagina']
+        })
+    
+    return resposta_condicional(etag, montar, privado=True)
+
 # ======================================================
 # UTILIDADES PARA TEMPLATES
 # ======================================================
@@ -7334,6 +10464,10 @@ def get_posicao_display_filter(posicao):
 def get_nivel_display_filter(nivel):
     return get_nivel_display_func(nivel)
 
+@app.template_filter('foto')
+def foto_filter(url, tamanho='avatar'):
+    return url_foto(url, tamanho)
+
 # Context processor - disponibiliza funções globais
 @app.context_processor
 def utility_processor():
@@ -7356,6 +10490,7 @@ def utility_processor():
         'obter_jogadores_no_ciclo_atual': obter_jogadores_no_ciclo_atual,
         'get_dia_semana_curto': get_dia_semana_curto,
         'format_date': format_date_func,
+        'url_estatico': url_estatico,
         
     }
 
@@ -7495,6 +10630,7 @@ def capitao_dashboard():
     draft_status = None
     minha_vez = False
     jogadores_disponiveis = []
+    total_disponiveis = 0
     minhas_escolhas = []
     times = []
     
@@ -7518,8 +10654,9 @@ def capitao_dashboard():
                 minha_vez = draft_status.vez_capitao_id == current_user.jogador_id
             
             # Busca jogadores disponíveis (apenas se draft em andamento)
+            # Só a primeira página; o restante vem de /api/capitao/disponiveis
             if semana.draft_em_andamento:
-                jogadores_disponiveis = get_jogadores_disponiveis_draft(semana)
+                jogadores_disponiveis, total_disponiveis = obter_pool_disponiveis(semana).consultar()
             
             # Busca escolhas do time DESTA SEMANA
             minhas_escolhas = EscolhaDraft.query.filter_by(
@@ -7537,6 +10674,7 @@ def capitao_dashboard():
                          draft_status=draft_status,
                          minha_vez=minha_vez,
                          jogadores_disponiveis=jogadores_disponiveis,
+                         total_disponiveis=total_disponiveis,
                          minhas_escolhas=minhas_escolhas,
                          times=times)
 
@@ -7558,7 +10696,8 @@ def ver_jogador(id):
             'presente': conf.presente
         })
     
-    return render_template('ver_jogador.html', jogador=jogador, historico=historico)
+    return render_template('ver_jogador.html', jogador=jogador, historico=historico,
+                         estatisticas=estatisticas_jogador(jogador.id))
 
 @app.route('/confirmar_presenca', methods=['POST'])
 def confirmar_presenca():
@@ -7725,133 +10864,121 @@ def calcular_proximo_ciclo_mensalidade():
 def verificar_e_atualizar_mensalidades():
     """Verifica e atualiza status das mensalidades automaticamente"""
     hoje = date.today()
-    mensalistas = Jogador.query.filter_by(mensalista=True, ativo=True).all()
     
-    atualizados = 0
-    vencidos = 0
+    # Vencida e não paga: deixa de ser mensalista
+    vencidos = expirar_mensalidades_vencidas(hoje)
     
-    for jogador in mensalistas:
-        # Se a mensalidade está vencida e não foi paga
-        if jogador.data_fim_mensalidade and jogador.data_fim_mensalidade < hoje:
-            if not jogador.mensalidade_paga:
-                jogador.mensalista = False
-                jogador.mensalidade_paga = False
-                vencidos += 1
-                print(f"⚠️ Jogador {jogador.nome} removido de mensalista - mensalidade vencida")
-            else:
-                # Se foi paga, mantém como mensalista mas marca como não paga para novo ciclo
-                jogador.mensalidade_paga = False
-                atualizados += 1
-        
-        # Se não tem data de fim, cria uma baseada na data de início
-        elif jogador.mensalidade_paga and jogador.data_inicio_mensalidade and not jogador.data_fim_mensalidade:
-            config_global = ConfiguracaoGlobal.query.first()
-            duracao = config_global.duracao_mensalidade_dias if config_global else 30
-            jogador.data_fim_mensalidade = jogador.data_inicio_mensalidade + timedelta(days=duracao - 1)
-            atualizados += 1
+    # Vencida mas paga: continua mensalista, marcada como não paga para o novo ciclo
+    atualizados = Jogador.query.filter(
+        Jogador.mensalista == True,
+        Jogador.ativo == True,
+        Jogador.data_fim_mensalidade < hoje,
+        Jogador.mensalidade_paga == True
+    ).update({'mensalidade_paga': False}, synchronize_session=False)
+    
+    # Sem data de fim: calcula a partir da data de início
+    atualizados += preencher_fim_mensalidades()
     
     db.session.commit()
     return atualizados, vencidos
 
-def renovar_mensalidade_em_lote(jogadores_ids, data_inicio, data_fim):
+LIMITE_NOMES_PREVIA = 20
+
+def atualizar_jogadores_em_lote(condicoes, valores, simular=False):
+    """Aplica valores a todos os jogadores que atendem às condições num único UPDATE.
+
+    Retorna quantos foram alterados (sem commit). Com simular=True nada é
+    gravado e o retorno é a prévia [(id, nome), ...] dos que seriam afetados.
+    """
+    if simular:
+        return db.session.query(Jogador.id, Jogador.nome).filter(*condicoes).order_by(Jogador.nome).all()
+    return Jogador.query.filter(*condicoes).update(valores, synchronize_session=False)
+
+def flash_previa_mensalidades(previa, descricao):
+    """Mostra a prévia de uma atualização em lote como mensagem"""
+    if not previa:
+        flash('Simulação: nenhum jogador seria afetado.', 'info')
+        return
+    nomes = ', '.join(nome for _, nome in previa[:LIMITE_NOMES_PREVIA])
+    if len(previa) > LIMITE_NOMES_PREVIA:
+        nomes += f' e mais {len(previa) - LIMITE_NOMES_PREVIA}'
+    flash(f'Simulação: {len(previa)} jogador(es) {descricao}: {nomes}. Nada foi alterado.', 'info')
+
+def renovar_mensalidade_em_lote(jogadores_ids, data_inicio, data_fim, simular=False):
     """Renova mensalidade para vários jogadores de uma vez"""
-    atualizados = 0
-    
-    for jogador_id in jogadores_ids:
-        jogador = Jogador.query.get(jogador_id)
-        if jogador and jogador.ativo:
-            jogador.mensalista = True
-            jogador.mensalidade_paga = True
-            jogador.data_inicio_mensalidade = data_inicio
-            jogador.data_fim_mensalidade = data_fim
-            atualizados += 1
-    
-    db.session.commit()
-    return atualizados
+    ids = [int(jogador_id) for jogador_id in jogadores_ids if str(jogador_id).isdigit()]
+    resultado = atualizar_jogadores_em_lote(
+        [Jogador.id.in_(ids), Jogador.ativo == True],
+        {
+            'mensalista': True,
+            'mensalidade_paga': True,
+            'data_inicio_mensalidade': data_inicio,
+            'data_fim_mensalidade': data_fim
+        },
+        simular
+    )
+    if not simular:
+        db.session.commit()
+    return resultado
+
+# Motor de ciclos: o ciclo vigente vem da tabela CicloMensalidade (ciclo
+# ativo mais recente). Sem ciclo ativo, usa o ciclo da maioria dos
+# mensalistas pagos e, por último, um ciclo calculado pela configuração.
+# O resultado fica em cache até um commit alterar os ciclos (ou, no caso
+# dos fallbacks, os jogadores/configuração ou a data).
+_cache_ciclo_vigente = {}
+_cache_ciclo_vigente_lock = Lock()
+
+def _versoes_ciclo():
+    return (*versoes_tabelas([CicloMensalidade.__tablename__, Jogador.__tablename__,
+                              ConfiguracaoGlobal.__tablename__]),
+            date.today())
+
+def _sessao_sem_alteracoes():
+    """Sem alterações pendentes nesta transação (resultado pode ir para o cache)"""
+    sessao = db.session
+    return not (sessao.new or sessao.dirty or sessao.deleted or sessao.info.get('tabelas_alteradas'))
 
 def obter_ciclo_atual_mensalidade():
-    """Obtém o ciclo atual de mensalidade ativa - CORRIGIDA E MELHORADA"""
+    """Ciclo (início, fim, jogadores) com mais mensalistas pagos ainda vigentes"""
     hoje = date.today()
     
-    # Busca TODOS os mensalistas pagos com data de fim futura
-    mensalistas_pagos = Jogador.query.filter(
+    ciclo_mais_comum = db.session.query(
+        Jogador.data_inicio_mensalidade, Jogador.data_fim_mensalidade, func.count(Jogador.id)
+    ).filter(
         Jogador.mensalista == True,
         Jogador.mensalidade_paga == True,
         Jogador.ativo == True,
+        Jogador.data_inicio_mensalidade.isnot(None),
         Jogador.data_fim_mensalidade.isnot(None),
         Jogador.data_fim_mensalidade >= hoje
-    ).all()
-    
-    if not mensalistas_pagos:
-        # Se não há mensalistas pagos, busca o ciclo configurado
-        config_global = ConfiguracaoGlobal.query.first()
-        duracao = config_global.duracao_mensalidade_dias if config_global else 30
-        
-        # Tenta encontrar uma data de início baseada em mensalistas ativos
-        ultima_mensalidade = db.session.query(
-            func.max(Jogador.data_fim_mensalidade)
-        ).filter(
-            Jogador.mensalista == True,
-            Jogador.ativo == True,
-            Jogador.data_fim_mensalidade.isnot(None)
-        ).scalar()
-        
-        if ultima_mensalidade and ultima_mensalidade >= hoje:
-            # Usa a data de fim mais recente como base
-            data_inicio = ultima_mensalidade + timedelta(days=1)
-            data_fim = data_inicio + timedelta(days=duracao - 1)
-            return data_inicio, data_fim, 0
-        else:
-            # Não há ciclo ativo
-            return None, None, 0
-    
-    # Agrupa por ciclo (início + fim)
-    ciclos = {}
-    for jogador in mensalistas_pagos:
-        if jogador.data_inicio_mensalidade and jogador.data_fim_mensalidade:
-            ciclo_key = f"{jogador.data_inicio_mensalidade}_{jogador.data_fim_mensalidade}"
-            if ciclo_key in ciclos:
-                ciclos[ciclo_key]['count'] += 1
-                ciclos[ciclo_key]['jogadores'].append(jogador.nome)
-            else:
-                ciclos[ciclo_key] = {
-                    'inicio': jogador.data_inicio_mensalidade,
-                    'fim': jogador.data_fim_mensalidade,
-                    'count': 1,
-                    'jogadores': [jogador.nome]
-                }
+    ).group_by(
+        Jogador.data_inicio_mensalidade, Jogador.data_fim_mensalidade
+    ).order_by(func.count(Jogador.id).desc(), Jogador.data_fim_mensalidade.desc()).first()
     
-    if not ciclos:
-        return None, None, 0
+    if ciclo_mais_comum:
+        return ciclo_mais_comum
     
-    # Encontra o ciclo mais comum (com mais jogadores)
-    ciclo_mais_comum = max(ciclos.values(), key=lambda x: x['count'])
+    # Sem mensalistas pagos: próximo ciclo depois da mensalidade mais recente
+    ultima_mensalidade = db.session.query(
+        func.max(Jogador.data_fim_mensalidade)
+    ).filter(
+        Jogador.mensalista == True,
+        Jogador.ativo == True,
+        Jogador.data_fim_mensalidade.isnot(None)
+    ).scalar()
     
-    # DEBUG: Mostra informação sobre os ciclos encontrados
-    print(f"Ciclos encontrados: {len(ciclos)}")
-    for key, ciclo in ciclos.items():
-        print(f"  Ciclo: {ciclo['inicio']} a {ciclo['fim']} ({ciclo['count']} jogadores)")
-    print(f"Ciclo mais comum: {ciclo_mais_comum['inicio']} a {ciclo_mais_comum['fim']}")
+    if ultima_mensalidade and ultima_mensalidade >= hoje:
+        config_global = ConfiguracaoGlobal.query.first()
+        duracao = config_global.duracao_mensalidade_dias if config_global else 30
+        data_inicio = ultima_mensalidade + timedelta(days=1)
+        return data_inicio, data_inicio + timedelta(days=duracao - 1), 0
     
-    return ciclo_mais_comum['inicio'], ciclo_mais_comum['fim'], ciclo_mais_comum['count']
+    # Não há ciclo ativo
+    return None, None, 0
 
-def obter_ciclo_das_configuracoes():
-    """Obtém o ciclo baseado nas configurações do sistema"""
-    # PRIMEIRO: Verifica se há um ciclo ativo na tabela de ciclos
-    ciclo_ativa = CicloMensalidade.query.filter_by(ativo=True).order_by(CicloMensalidade.updated_at.desc()).first()
-    
-    if ciclo_ativa:
-        print(f"Ciclo encontrado na tabela: {ciclo_ativa.data_inicio} a {ciclo_ativa.data_fim}")
-        return ciclo_ativa.data_inicio, ciclo_ativa.data_fim
-    
-    # SEGUNDO: Tenta obter o ciclo atual dos mensalistas pagos
-    ciclo_inicio, ciclo_fim, _ = obter_ciclo_atual_mensalidade()
-    
-    if ciclo_inicio and ciclo_fim:
-        print(f"Ciclo encontrado nos mensalistas: {ciclo_inicio} a {ciclo_fim}")
-        return ciclo_inicio, ciclo_fim
-    
-    # TERCEIRO: Se não há ciclo, calcula um baseado na configuração
+def _ciclo_calculado():
+    """Ciclo padrão pela duração configurada (primeira segunda do mês ou hoje)"""
     config_global = ConfiguracaoGlobal.query.first()
     if not config_global:
         return None, None
@@ -7859,25 +10986,56 @@ def obter_ciclo_das_configuracoes():
     duracao = config_global.duracao_mensalidade_dias
     hoje = date.today()
     
-    # Tenta criar um ciclo padrão começando na primeira segunda-feira do mês atual
+    # Começa na primeira segunda-feira do mês atual, se hoje estiver nele
     primeiro_dia_mes = hoje.replace(day=1)
-    
-    # Encontra a primeira segunda-feira do mês
     dias_para_segunda = (7 - primeiro_dia_mes.weekday()) % 7
     data_inicio = primeiro_dia_mes + timedelta(days=dias_para_segunda)
     data_fim = data_inicio + timedelta(days=duracao - 1)
-    
-    # Verifica se hoje está dentro deste ciclo
     if data_inicio <= hoje <= data_fim:
-        print(f"Ciclo calculado para o mês: {data_inicio} a {data_fim}")
         return data_inicio, data_fim
     
-    # Se não, cria um ciclo padrão de 30 dias a partir de hoje
-    data_inicio = hoje
-    data_fim = data_inicio + timedelta(days=duracao - 1)
+    # Se não, um ciclo a partir de hoje
+    return hoje, hoje + timedelta(days=duracao - 1)
+
+def resolver_ciclo_vigente():
+    """Resolve o ciclo vigente sem cache: (início, fim, origem)"""
+    ciclo_ativo = CicloMensalidade.query.filter_by(ativo=True).order_by(
+        CicloMensalidade.updated_at.desc(), CicloMensalidade.id.desc()
+    ).first()
+    if ciclo_ativo:
+        return ciclo_ativo.data_inicio, ciclo_ativo.data_fim, 'tabela'
     
-    print(f"Cicro padrão criado: {data_inicio} a {data_fim}")
-    return data_inicio, data_fim
+    ciclo_inicio, ciclo_fim, _ = obter_ciclo_atual_mensalidade()
+    if ciclo_inicio and ciclo_fim:
+        return ciclo_inicio, ciclo_fim, 'mensalistas'
+    
+    ciclo_inicio, ciclo_fim = _ciclo_calculado()
+    if ciclo_inicio and ciclo_fim:
+        return ciclo_inicio, ciclo_fim, 'calculado'
+    return None, None, None
+
+def obter_ciclo_vigente():
+    """Ciclo vigente (início, fim, origem), com cache por versão das tabelas"""
+    versoes = _versoes_ciclo()
+    with _cache_ciclo_vigente_lock:
+        em_cache = _cache_ciclo_vigente.get('ciclo')
+    if em_cache:
+        versoes_cache, ciclo = em_cache
+        # Ciclo da tabela só depende da tabela de ciclos
+        if versoes_cache == versoes or (ciclo[2] == 'tabela' and versoes_cache[0] == versoes[0]):
+            return ciclo
+    
+    ciclo = resolver_ciclo_vigente()
+    # Não guarda resultado visto com alterações ainda não confirmadas
+    if _sessao_sem_alteracoes():
+        with _cache_ciclo_vigente_lock:
+            _cache_ciclo_vigente['ciclo'] = (versoes, ciclo)
+    return ciclo
+
+def obter_ciclo_das_configuracoes():
+    """Obtém o ciclo baseado nas configurações do sistema"""
+    ciclo_inicio, ciclo_fim, _ = obter_ciclo_vigente()
+    return ciclo_inicio, ciclo_fim
 
 def definir_ciclo_manual(data_inicio, data_fim, descricao=None):
     """Define manualmente um ciclo de mensalidade"""
@@ -7898,74 +11056,49 @@ def definir_ciclo_manual(data_inicio, data_fim, descricao=None):
     return novo_ciclo
 
 
+_cache_resumo_mensalidades = {}
+
 def obter_resumo_mensalidades():
-    """Obtém resumo completo das mensalidades"""
-    hoje = date.today()  # Use 'hoje' (português) em toda a função
-    
-    # Total de mensalistas ativos
-    total_mensalistas = Jogador.query.filter_by(mensalista=True, ativo=True).count()
+    """Obtém resumo completo das mensalidades (um agregado, em cache)"""
+    versoes = _versoes_ciclo()
+    em_cache = _cache_resumo_mensalidades.get('resumo')
+    if em_cache and em_cache[0] == versoes:
+        return dict(em_cache[1])
     
-    # Busca ciclo atual do sistema
+    hoje = date.today()
     ciclo_inicio, ciclo_fim = obter_ciclo_das_configuracoes()
     
-    # Inicializa no_ciclo_atual
-    no_ciclo_atual = 0
+    def contar(*condicoes):
+        return func.coalesce(func.sum(case((and_(*condicoes), 1), else_=0)), 0)
     
+    mensalista = Jogador.mensalista == True
+    vigente = Jogador.data_fim_mensalidade >= hoje
     if ciclo_inicio and ciclo_fim:
-        # Jogadores no ciclo atual (datas alinhadas)
-        no_ciclo_atual = Jogador.query.filter(
-            Jogador.mensalista == True,
-            Jogador.ativo == True,
-            Jogador.data_inicio_mensalidade == ciclo_inicio,
-            Jogador.data_fim_mensalidade == ciclo_fim
-        ).count()
-        
-        # Mensalistas pagos no ciclo atual
-        mensalistas_pagos = Jogador.query.filter(
-            Jogador.mensalista == True,
-            Jogador.mensalidade_paga == True,
-            Jogador.ativo == True,
-            Jogador.data_inicio_mensalidade == ciclo_inicio,
-            Jogador.data_fim_mensalidade == ciclo_fim
-        ).count()
+        no_ciclo = and_(Jogador.data_inicio_mensalidade == ciclo_inicio,
+                           Jogador.data_fim_mensalidade == ciclo_fim)
+        # Pagos no ciclo atual (datas alinhadas)
+        pagos = no_ciclo
     else:
-        # Se não há ciclo ativo
-        ciclo_inicio = None
-        ciclo_fim = None
-        
-        # Mensalistas pagos com data futura
-        mensalistas_pagos = Jogador.query.filter(
-            Jogador.mensalista == True,
-            Jogador.mensalidade_paga == True,
-            Jogador.ativo == True,
-            Jogador.data_fim_mensalidade >= hoje  # CORRIGIDO: use 'hoje'
-        ).count()
-    
-    # Mensalistas vencidos (data vencida, independente de pagamento)
-    mensalistas_vencidos = Jogador.query.filter(
-        Jogador.mensalista == True,
-        Jogador.ativo == True,
-        Jogador.data_fim_mensalidade < hoje  # CORRIGIDO: use 'hoje'
-    ).count()
-    
-    # Mensalistas pendentes (não pagos mas ainda no prazo)
-    mensalistas_pendentes = Jogador.query.filter(
-        Jogador.mensalista == True,
-        Jogador.mensalidade_paga == False,
-        Jogador.data_fim_mensalidade >= hoje,  # CORRIGIDO: use 'hoje'
-        Jogador.ativo == True
-    ).count()
-    
-    # Próximo vencimento mais próximo
-    proximo_vencimento = db.session.query(
-        func.min(Jogador.data_fim_mensalidade)
-    ).filter(
-        Jogador.mensalista == True,
-        Jogador.ativo == True,
-        Jogador.data_fim_mensalidade >= hoje  # CORRIGIDO: use 'hoje'
-    ).scalar()
-    
-    return {
+        no_ciclo = false()
+        # Sem ciclo: pagos com data futura
+        pagos = vigente
+    
+    # Um único agregado sobre os jogadores ativos
+    linha = db.session.query(
+        func.count(Jogador.id),
+        contar(Jogador.capitao == True),
+        contar(mensalista),
+        contar(mensalista, no_ciclo),
+        contar(mensalista, Jogador.mensalidade_paga == True, pagos),
+        contar(mensalista, Jogador.mensalidade_paga == False, vigente),
+        contar(mensalista, Jogador.data_fim_mensalidade < hoje),
+        func.min(case((and_(mensalista, vigente), Jogador.data_fim_mensalidade)))
+    ).filter(Jogador.ativo == True).one()
+    
+    (total_jogadores, total_capitaes, total_mensalistas, no_ciclo_atual,
+     mensalistas_pagos, mensalistas_pendentes, mensalistas_vencidos, proximo_vencimento) = linha
+    
+    resumo = {
         'total_mensalistas': total_mensalistas,
         'mensalistas_pagos': mensalistas_pagos,
         'mensalistas_pendentes': mensalistas_pendentes,
@@ -7973,24 +11106,30 @@ def obter_resumo_mensalidades():
         'proximo_vencimento': proximo_vencimento,
         'ciclo_atual_inicio': ciclo_inicio,
         'ciclo_atual_fim': ciclo_fim,
-        'no_ciclo_atual': no_ciclo_atual
-    }   
+        'no_ciclo_atual': no_ciclo_atual,
+        'total_jogadores': total_jogadores,
+        'total_capitaes': total_capitaes
+    }
+    if _sessao_sem_alteracoes():
+        _cache_resumo_mensalidades['resumo'] = (versoes, resumo)
+    return dict(resumo)
 
 @app.route('/api/dashboard/estatisticas')
 @admin_required
 def api_dashboard_estatisticas():
     """API para estatísticas do dashboard admin"""
-    # Resumo de mensalidades
+    return resposta_condicional(
+        etag_dados(MODELOS_MENSALIDADES + (Semana, Confirmacao), date.today()),
+        _montar_api_dashboard_estatisticas,
+        privado=True
+    )
+
+def _montar_api_dashboard_estatisticas():
+    # Resumo de mensalidades (inclui os totais de jogadores e capitães)
     resumo_mensalidades = obter_resumo_mensalidades()
-    
-    # Total de jogadores
-    total_jogadores = Jogador.query.filter_by(ativo=True).count()
-    
-    # Total de mensalistas
-    total_mensalistas = Jogador.query.filter_by(mensalista=True, ativo=True).count()
-    
-    # Total de capitães
-    total_capitaes = Jogador.query.filter_by(capitao=True, ativo=True).count()
+    total_jogadores = resumo_mensalidades['total_jogadores']
+    total_mensalistas = resumo_mensalidades['total_mensalistas']
+    total_capitaes = resumo_mensalidades['total_capitaes']
     
     # Semana atual (para confirmações)
     semana = get_semana_atual()
@@ -8031,6 +11170,1123 @@ def limpar_config_dias():
         flash('Configuração de dias limpa! Configure novamente.', 'info')
     return redirect(url_for('admin_configuracoes'))
 
+# ======================================================
+# ESTATÍSTICAS DOS JOGADORES (ANÁLISE POR TEMPORADA)
+# ======================================================
+# Cada commit que mexe em confirmações, times, escolhas ou no status do draft
+# marca a semana afetada; antes do commit a contribuição dessa semana é
+# recalculada e só a diferença é aplicada em EstatisticaJogador/ParceriaJogadores.
+
+DIAS_SEMANA_CURTO = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+
+def marcar_semana_analise(semana_id):
+    """Agenda a atualização das estatísticas da semana para o próximo commit"""
+    if semana_id:
+        db.session.info.setdefault('analise_semanas', set()).add(semana_id)
+
+def _contribuicao_atual_semana(semana):
+    """Confirmados e escalação (se o draft foi finalizado) da semana no banco"""
+    arquivo = dados_semana_arquivada(semana.id)
+    if arquivo:
+        confirmados = {c['jogador_id'] for c in arquivo['confirmacao'] if c['confirmado']}
+    else:
+        confirmados = {
+            jogador_id for (jogador_id,) in db.session.query(Confirmacao.jogador_id).filter(
+                Confirmacao.semana_id == semana.id,
+                Confirmacao.confirmado == True
+            )
+        }
+    
+    escalacao = []
+    if semana.draft_finalizado:
+        times = db.session.query(Time.id, Time.capitao_id).filter(
+            Time.semana_id == semana.id
+        ).order_by(Time.ordem_escolha, Time.id).all()
+        
+        if arquivo:
+            escolhas = sorted(
+                ((e['ordem_escolha'] or 0, e['escolhido_em'] or datetime.min, e['id']),
+                 e['time_id'], e['jogador_id'], e['round_num'])
+                for e in arquivo['escolha_draft']
+            )
+            escolhas = [(time_id, jogador_id, round_num) for _, time_id, jogador_id, round_num in escolhas]
+        else:
+            escolhas = db.session.query(
+                EscolhaDraft.time_id, EscolhaDraft.jogador_id, EscolhaDraft.round_num
+            ).filter(
+                EscolhaDraft.semana_id == semana.id
+            ).order_by(EscolhaDraft.ordem_escolha, EscolhaDraft.escolhido_em, EscolhaDraft.id)
+        
+        # Posição de cada escolha real (capitães entram com round 0)
+        escolhidos = {}
+        posicao = 0
+        for time_id, jogador_id, round_num in escolhas:
+            if round_num == 0:
+                continue
+            posicao += 1
+            escolhidos.setdefault(time_id, []).append([jogador_id, posicao])
+        
+        escalacao = [[capitao_id, escolhidos.get(time_id, [])] for time_id, capitao_id in times]
+    
+    return confirmados, escalacao
+
+def _acumular_escalacao(escalacao, sinal, deltas, parcerias):
+    for capitao_id, escolhidos in escalacao:
+        membros = [jogador_id for jogador_id, _ in escolhidos]
+        if capitao_id:
+            deltas.setdefault(capitao_id, Counter())['vezes_capitao'] += sinal
+            if capitao_id not in membros:
+                membros.append(capitao_id)
+        
+        for jogador_id, posicao in escolhidos:
+            delta = deltas.setdefault(jogador_id, Counter())
+            delta['escolhas'] += sinal
+            delta['soma_posicao_escolha'] += sinal * posicao
+        
+        for jogador_id in membros:
+            deltas.setdefault(jogador_id, Counter())['jogos'] += sinal
+            for companheiro_id in membros:
+                if companheiro_id != jogador_id:
+                    parcerias[(jogador_id, companheiro_id)] += sinal
+
+CAMPOS_ESTATISTICA = ('jogos', 'escolhas', 'soma_posicao_escolha', 'vezes_capitao', 'confirmacoes')
+
+def _inserir_ignorando(modelo, linhas):
+    """INSERT em lote que pula as linhas já existentes (inclusive criadas por outra transação)"""
+    dialeto = db.session.get_bind().dialect.name
+    if dialeto == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+        comando = insert_postgresql(modelo).on_conflict_do_nothing()
+    else:
+        comando = insert(modelo).prefix_with('OR IGNORE' if dialeto == 'sqlite' else 'IGNORE')
+    db.session.execute(comando, linhas)
+
+def _aplicar_deltas_analise(temporada, dia_semana, deltas, parcerias):
+    """Aplica os deltas em lote; as somas são feitas pelo banco (coluna = coluna + delta).
+    
+    Assim dois commits simultâneos que mexem no mesmo jogador não perdem um
+    ao outro. Jogadores (e pares) com o mesmo delta dividem um único UPDATE.
+    """
+    deltas = {jogador_id: d for jogador_id, d in deltas.items() if any(d.values())}
+    parcerias = {par: n for par, n in parcerias.items() if n}
+    sem_sincronizar = {'synchronize_session': False}
+    
+    if deltas:
+        _inserir_ignorando(EstatisticaJogador, [{
+            'jogador_id': jogador_id, 'temporada': temporada, 'jogos': 0, 'escolhas': 0,
+            'soma_posicao_escolha': 0, 'vezes_capitao': 0, 'confirmacoes': 0,
+            'confirmacoes_dia': '0,0,0,0,0,0,0'
+        } for jogador_id in deltas])
+        
+        grupos = {}
+        for jogador_id, delta in deltas.items():
+            grupos.setdefault(tuple(delta[campo] for campo in CAMPOS_ESTATISTICA), []).append(jogador_id)
+        for valores, ids in grupos.items():
+            db.session.execute(
+                update(EstatisticaJogador).where(
+                    EstatisticaJogador.temporada == temporada,
+                    EstatisticaJogador.jogador_id.in_(ids)
+                ).values({
+                    campo: getattr(EstatisticaJogador, campo) + valor
+                    for campo, valor in zip(CAMPOS_ESTATISTICA, valores) if valor
+                }),
+                execution_options=sem_sincronizar
+            )
+        
+        # O vetor por dia é texto: lido com as linhas travadas (FOR UPDATE) e regravado
+        por_dia = {jogador_id: d['confirmacoes'] for jogador_id, d in deltas.items() if d['confirmacoes']}
+        if por_dia:
+            tabela = EstatisticaJogador.__table__
+            atuais = db.session.execute(
+                select(tabela.c.jogador_id, tabela.c.confirmacoes_dia).where(
+                    tabela.c.temporada == temporada,
+                    tabela.c.jogador_id.in_(list(por_dia))
+                ).with_for_update()
+            ).all()
+            novos = []
+            for jogador_id, texto in atuais:
+                valores = EstatisticaJogador.ler_confirmacoes_dia(texto)
+                valores[dia_semana] += por_dia[jogador_id]
+                novos.append({'b_jogador_id': jogador_id, 'b_dias': ','.join(str(v) for v in valores)})
+            db.session.execute(
+                tabela.update().where(
+                    tabela.c.temporada == temporada,
+                    tabela.c.jogador_id == bindparam('b_jogador_id')
+                ).values(confirmacoes_dia=bindparam('b_dias')),
+                novos
+            )
+    
+    if parcerias:
+        _inserir_ignorando(ParceriaJogadores, [{
+            'jogador_id': jogador_id, 'companheiro_id': companheiro_id,
+            'temporada': temporada, 'jogos': 0
+        } for jogador_id, companheiro_id in parcerias])
+        
+        grupos = {}
+        for par, n in parcerias.items():
+            grupos.setdefault(n, []).append(par)
+        for n, pares in grupos.items():
+            db.session.execute(
+                update(ParceriaJogadores).where(
+                    ParceriaJogadores.temporada == temporada,
+                    tuple_(ParceriaJogadores.jogador_id, ParceriaJogadores.companheiro_id).in_(pares)
+                ).values(jogos=ParceriaJogadores.jogos + n),
+                execution_options=sem_sincronizar
+            )
+
+def atualizar_analise_semana(semana_id):
+    """Recalcula a contribuição da semana e aplica apenas a diferença (não faz commit)"""
+    analise = db.session.get(AnaliseSemana, semana_id)
+    semana = db.session.get(Semana, semana_id)
+    if not analise and not semana:
+        return
+    
+    confirmados, escalacao = _contribuicao_atual_semana(semana) if semana else (set(), [])
+    anteriores = {int(v) for v in (analise.confirmados or '').split(',') if v} if analise else set()
+    escalacao_anterior = json.loads(analise.escalacao or '[]') if analise else []
+    
+    if analise and semana and (analise.temporada, analise.dia_semana) == (semana.data.year, semana.data.weekday()):
+        # Caso comum: só a diferença entre o que foi aplicado e o estado atual
+        deltas = {}
+        parcerias = Counter()
+        for jogador_id in confirmados - anteriores:
+            deltas.setdefault(jogador_id, Counter())['confirmacoes'] += 1
+        for jogador_id in anteriores - confirmados:
+            deltas.setdefault(jogador_id, Counter())['confirmacoes'] -= 1
+        if escalacao != escalacao_anterior:
+            _acumular_escalacao(escalacao_anterior, -1, deltas, parcerias)
+            _acumular_escalacao(escalacao, 1, deltas, parcerias)
+        _aplicar_deltas_analise(semana.data.year, semana.data.weekday(), deltas, parcerias)
+    else:
+        # Semana nova, excluída ou com a data alterada: sai a contribuição antiga inteira, entra a nova
+        contribuicoes = []
+        if analise:
+            contribuicoes.append((analise.temporada, analise.dia_semana, anteriores, escalacao_anterior, -1))
+        if semana:
+            contribuicoes.append((semana.data.year, semana.data.weekday(), confirmados, escalacao, 1))
+        for temporada, dia_semana, ids, escalacao_item, sinal in contribuicoes:
+            deltas = {jogador_id: Counter(confirmacoes=sinal) for jogador_id in ids}
+            parcerias = Counter()
+            _acumular_escalacao(escalacao_item, sinal, deltas, parcerias)
+            _aplicar_deltas_analise(temporada, dia_semana, deltas, parcerias)
+    
+    if not semana:
+        db.session.delete(analise)
+        return
+    
+    if not analise:
+        analise = AnaliseSemana(semana_id=semana_id)
+        db.session.add(analise)
+    analise.temporada = semana.data.year
+    analise.dia_semana = semana.data.weekday()
+    analise.confirmados = ','.join(str(v) for v in sorted(confirmados))
+    analise.escalacao = json.dumps(escalacao)
+
+def reconstruir_analise():
+    """Reconstrói todas as estatísticas a partir do histórico completo"""
+    EstatisticaJogador.query.delete()
+    ParceriaJogadores.query.delete()
+    AnaliseSemana.query.delete()
+    db.session.flush()
+    
+    semanas_ids = [semana_id for (semana_id,) in db.session.query(Semana.id).order_by(Semana.data)]
+    for semana_id in semanas_ids:
+        atualizar_analise_semana(semana_id)
+        db.session.flush()
+    
+    db.session.info.pop('analise_semanas', None)
+    db.session.commit()
+    return len(semanas_ids)
+
+@event.listens_for(db.session, 'after_flush')
+def _coletar_semanas_analise(session, flush_context):
+    """Anota as semanas cujas confirmações/escalações mudaram neste flush"""
+    pendentes = session.info.setdefault('analise_semanas', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Confirmacao, EscolhaDraft, Time)):
+            pendentes.add(obj.semana_id)
+            historico = db.inspect(obj).attrs.semana_id.history
+            pendentes.update(v for v in (historico.deleted or ()) if v)
+        elif isinstance(obj, Semana):
+            estado = db.inspect(obj)
+            if (obj in session.new or obj in session.deleted
+                    or estado.attrs.draft_finalizado.history.has_changes()
+                    or estado.attrs.data.history.has_changes()):
+                pendentes.add(obj.id)
+    pendentes.discard(None)
+
+@event.listens_for(db.session, 'before_commit')
+def _aplicar_analise_pendente(session):
+    """Aplica as estatísticas das semanas alteradas na mesma transação"""
+    if session.info.get('analise_em_andamento'):
+        return
+    session.flush()
+    pendentes = session.info.pop('analise_semanas', None)
+    if not pendentes:
+        return
+    
+    session.info['analise_em_andamento'] = True
+    try:
+        for semana_id in pendentes:
+            atualizar_analise_semana(semana_id)
+        session.flush()
+    except Exception as e:
+        # Deltas aplicados pela metade não podem ser gravados: o erro aborta o
+        # commit e as semanas continuam marcadas para a próxima tentativa
+        print(f"❌ Erro ao atualizar estatísticas das semanas {sorted(pendentes)}: {e}")
+        session.info.setdefault('analise_semanas', set()).update(pendentes)
+        raise
+    finally:
+        session.info.pop('analise_em_andamento', None)
+
+def estatisticas_jogador(jogador_id, temporada=None):
+    """Resumo das estatísticas do jogador (todas as temporadas ou só uma)"""
+    query = EstatisticaJogador.query.filter_by(jogador_id=jogador_id)
+    if temporada:
+        query = query.filter_by(temporada=temporada)
+    linhas = query.all()
+    
+    por_dia = [0] * 7
+    for linha in linhas:
+        por_dia = [a + b for a, b in zip(por_dia, linha.get_confirmacoes_dia())]
+    
+    # Semanas já ocorridas por dia da semana no mesmo intervalo (denominador da taxa)
+    semanas_query = db.session.query(Semana.data).filter(Semana.data <= date.today())
+    if temporada:
+        semanas_query = semanas_query.filter(Semana.data >= date(temporada, 1, 1), Semana.data <= date(temporada, 12, 31))
+    semanas_por_dia = Counter(data_semana.weekday() for (data_semana,) in semanas_query)
+    
+    escolhas = sum(l.escolhas for l in linhas)
+    resumo = {
+        'jogos': sum(l.jogos for l in linhas),
+        'escolhas': escolhas,
+        'media_escolha': round(sum(l.soma_posicao_escolha for l in linhas) / escolhas, 1) if escolhas else None,
+        'vezes_capitao': sum(l.vezes_capitao for l in linhas),
+        'confirmacoes': sum(l.confirmacoes for l in linhas),
+        'presenca_por_dia': [
+            {
+                'dia': DIAS_SEMANA_CURTO[dia],
+                'confirmacoes': por_dia[dia],
+                'semanas': semanas_por_dia.get(dia, 0),
+                'taxa': round(por_dia[dia] / semanas_por_dia[dia] * 100) if semanas_por_dia.get(dia) else 0
+            }
+            for dia in range(7) if semanas_por_dia.get(dia) or por_dia[dia]
+        ],
+    }
+    
+    parceiros_query = db.session.query(
+        Jogador.id, Jogador.nome, func.sum(ParceriaJogadores.jogos).label('jogos')
+    ).join(Jogador, Jogador.id == ParceriaJogadores.companheiro_id).filter(
+        ParceriaJogadores.jogador_id == jogador_id
+    )
+    if temporada:
+        parceiros_query = parceiros_query.filter(ParceriaJogadores.temporada == temporada)
+    resumo['companheiros'] = [
+        {'id': pid, 'nome': nome, 'jogos': jogos}
+        for pid, nome, jogos in parceiros_query.group_by(Jogador.id, Jogador.nome).having(
+            func.sum(ParceriaJogadores.jogos) > 0
+        ).order_by(func.sum(ParceriaJogadores.jogos).desc(), Jogador.nome).limit(5)
+    ]
+    return resumo
+
+CRITERIOS_RANKING = {
+    'jogos': ('Jogos', func.sum(EstatisticaJogador.jogos), True),
+    'presencas': ('Presenças', func.sum(EstatisticaJogador.confirmacoes), True),
+    'capitao': ('Vezes capitão', func.sum(EstatisticaJogador.vezes_capitao), True),
+    'escolha': ('Média de escolha',
+                func.sum(EstatisticaJogador.soma_posicao_escolha) * 1.0 / func.nullif(func.sum(EstatisticaJogador.escolhas), 0),
+                False),
+}
+
+def ranking_temporada(criterio='jogos', temporada=None, limite=20, minimo_escolhas=3):
+    """Ranking de jogadores por critério, direto das estatísticas agregadas"""
+    titulo, expressao, decrescente = CRITERIOS_RANKING.get(criterio, CRITERIOS_RANKING['jogos'])
+    
+    query = db.session.query(
+        Jogador,
+        expressao.label('valor'),
+        func.sum(EstatisticaJogador.jogos).label('jogos'),
+        func.sum(EstatisticaJogador.escolhas).label('escolhas')
+    ).join(Jogador, Jogador.id == EstatisticaJogador.jogador_id).filter(Jogador.ativo == True)
+    if temporada:
+        query = query.filter(EstatisticaJogador.temporada == temporada)
+    query = query.group_by(Jogador.id)
+    
+    if criterio == 'escolha':
+        query = query.having(func.sum(EstatisticaJogador.escolhas) >= minimo_escolhas)
+    else:
+        query = query.having(expressao > 0)
+    
+    ordem = expressao.desc() if decrescente else expressao.asc()
+    return titulo, [
+        {'jogador': jogador, 'valor': round(valor, 1) if isinstance(valor, float) else valor,
+         'jogos': jogos, 'escolhas': escolhas}
+        for jogador, valor, jogos, escolhas in query.order_by(ordem, Jogador.nome).limit(limite)
+    ]
+
+@app.route('/ranking')
+def ranking():
+    """Rankings da temporada a partir das estatísticas pré-calculadas"""
+    temporadas = [t for (t,) in db.session.query(EstatisticaJogador.temporada).distinct().order_by(
+        EstatisticaJogador.temporada.desc()
+    )]
+    temporada = request.args.get('temporada', type=int)
+    if temporada is None and 'temporada' not in request.args:
+        temporada = temporadas[0] if temporadas else date.today().year
+    criterio = request.args.get('criterio', 'jogos')
+    if criterio not in CRITERIOS_RANKING:
+        criterio = 'jogos'
+    
+    titulo, linhas = ranking_temporada(criterio, temporada or None)
+    
+    return render_template('ranking.html',
+                         linhas=linhas,
+                         titulo=titulo,
+                         criterio=criterio,
+                         criterios=CRITERIOS_RANKING,
+                         temporada=temporada,
+                         temporadas=temporadas)
+
+@app.route('/admin/estatisticas/reconstruir', methods=['POST'])
+@admin_required
+def admin_reconstruir_estatisticas():
+    """Reconstrói as estatísticas dos jogadores a partir do histórico"""
+    try:
+        total = reconstruir_analise()
+        flash(f'Estatísticas reconstruídas a partir de {total} semanas!', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Erro ao reconstruir estatísticas: {str(e)}', 'danger')
+    return redirect(request.referrer or url_for('ranking'))
+
+
+# ======================================================
+# RATINGS (ELO POR SEMANA)
+# ======================================================
+# Com os resultados da semana registrados por time, cada time recebe uma
+# variação Elo: rating do time = média dos jogadores, resultado esperado =
+# média contra os outros times da semana, resultado real = sets vencidos /
+# sets jogados. Todos os jogadores do time recebem a variação do time.
+# A fonte da verdade é ResultadoTime; HistoricoRating é derivado e pode ser
+# reconstruído reaplicando as semanas em ordem de data.
+
+FATOR_K_RATING = 32
+
+def calcular_variacoes_semana(ratings, escalacao, resultados):
+    """Variação de rating de cada time numa semana.
+    
+    ratings: {jogador_id: rating}; escalacao: {time_id: [jogador_id, ...]};
+    resultados: {time_id: (vitorias, derrotas)}. Retorna {time_id: variacao}.
+    """
+    medias = {}
+    for time_id, jogadores in escalacao.items():
+        vitorias, derrotas = resultados.get(time_id, (0, 0))
+        if jogadores and vitorias + derrotas > 0:
+            medias[time_id] = sum(ratings[j] for j in jogadores) / len(jogadores)
+    
+    variacoes = {}
+    for time_id, media in medias.items():
+        adversarios = [m for outro, m in medias.items() if outro != time_id]
+        if not adversarios:
+            continue
+        esperado = sum(1 / (1 + 10 ** ((m - media) / 400)) for m in adversarios) / len(adversarios)
+        vitorias, derrotas = resultados[time_id]
+        variacoes[time_id] = round(FATOR_K_RATING * (vitorias / (vitorias + derrotas) - esperado))
+    return variacoes
+
+def recalcular_ratings(desde=None):
+    """Reaplica os resultados das semanas a partir de `desde` (todas se None).
+    
+    Parte do rating que cada jogador tinha antes da primeira semana reaplicada
+    (ou do atual, se ele não tem histórico nesse período), refaz o histórico e
+    grava os ratings finais em lote. Não faz commit.
+    Retorna (semanas reaplicadas, registros de histórico).
+    """
+    semanas = db.session.query(Semana.id).join(
+        ResultadoTime, ResultadoTime.semana_id == Semana.id
+    ).filter(Semana.draft_finalizado == True)
+    periodo = db.session.query(Semana.id)
+    if desde:
+        semanas = semanas.filter(Semana.data >= desde)
+        periodo = periodo.filter(Semana.data >= desde)
+    semanas_ids = [semana_id for (semana_id,) in semanas.distinct().order_by(Semana.data, Semana.id)]
+    
+    atuais = {jogador_id: rating for jogador_id, rating in db.session.query(Jogador.id, Jogador.rating)}
+    ratings = {jogador_id: RATING_PADRAO if rating is None else rating for jogador_id, rating in atuais.items()}
+    
+    # Rating de antes do período: o anterior do registro mais antigo de cada jogador
+    tocados = set()
+    for jogador_id, rating_anterior in db.session.query(
+        HistoricoRating.jogador_id, HistoricoRating.rating_anterior
+    ).join(Semana, Semana.id == HistoricoRating.semana_id).filter(
+        HistoricoRating.semana_id.in_(periodo)
+    ).order_by(Semana.data.desc(), Semana.id.desc()):
+        if jogador_id in ratings:
+            ratings[jogador_id] = rating_anterior
+            tocados.add(jogador_id)
+    
+    escalacoes = {}
+    resultados = {}
+    if semanas_ids:
+        for semana_id, time_id, jogador_id in db.session.query(
+            EscolhaDraft.semana_id, EscolhaDraft.time_id, EscolhaDraft.jogador_id
+        ).join(Jogador, Jogador.id == EscolhaDraft.jogador_id).filter(
+            EscolhaDraft.semana_id.in_(semanas_ids)
+        ):
+            escalacoes.setdefault(semana_id, {}).setdefault(time_id, []).append(jogador_id)
+        for escolha in linhas_arquivadas(EscolhaDraft, semanas_ids):
+            if escolha['jogador_id'] in atuais:
+                escalacoes.setdefault(escolha['semana_id'], {}).setdefault(escolha['time_id'], []).append(escolha['jogador_id'])
+        for semana_id, time_id, vitorias, derrotas in db.session.query(
+            ResultadoTime.semana_id, ResultadoTime.time_id, ResultadoTime.vitorias, ResultadoTime.derrotas
+        ).filter(ResultadoTime.semana_id.in_(semanas_ids)):
+            resultados.setdefault(semana_id, {})[time_id] = (vitorias or 0, derrotas or 0)
+    
+    agora = datetime.utcnow()
+    historico = []
+    for semana_id in semanas_ids:
+        escalacao = escalacoes.get(semana_id, {})
+        variacoes = calcular_variacoes_semana(ratings, escalacao, resultados.get(semana_id, {}))
+        for time_id, variacao in variacoes.items():
+            for jogador_id in escalacao[time_id]:
+                anterior = ratings[jogador_id]
+                ratings[jogador_id] = anterior + variacao
+                tocados.add(jogador_id)
+                historico.append({
+                    'jogador_id': jogador_id,
+                    'semana_id': semana_id,
+                    'time_id': time_id,
+                    'rating_anterior': anterior,
+                    'rating_novo': anterior + variacao,
+                    'variacao': variacao,
+                    'created_at': agora
+                })
+    
+    HistoricoRating.query.filter(HistoricoRating.semana_id.in_(periodo)).delete(synchronize_session=False)
+    if historico:
+        db.session.execute(insert(HistoricoRating), historico)
+    
+    alterados = [
+        {'id': jogador_id, 'rating': ratings[jogador_id]}
+        for jogador_id in tocados if ratings[jogador_id] != atuais[jogador_id]
+    ]
+    if alterados:
+        db.session.execute(update(Jogador), alterados)
+    
+    return len(semanas_ids), len(historico)
+
+def registrar_resultados_semana(semana, resultados):
+    """Grava os resultados {time_id: (vitorias, derrotas)} e atualiza os ratings"""
+    existentes = {r.time_id: r for r in ResultadoTime.query.filter_by(semana_id=semana.id)}
+    for time_id, (vitorias, derrotas) in resultados.items():
+        resultado = existentes.get(time_id)
+        if not resultado:
+            resultado = ResultadoTime(time_id=time_id, semana_id=semana.id)
+            db.session.add(resultado)
+        resultado.vitorias = vitorias
+        resultado.derrotas = derrotas
+    
+    return recalcular_ratings(semana.data)
+
+@app.route('/admin/semana/<int:semana_id>/resultados', methods=['POST'])
+@admin_required
+def registrar_resultados(semana_id):
+    """Registra sets vencidos/perdidos de cada time e atualiza os ratings"""
+    semana = Semana.query.get_or_404(semana_id)
+    if not semana.draft_finalizado:
+        flash('Draft ainda não finalizado!', 'warning')
+        return redirect(url_for('gerenciar_times'))
+    
+    resultados = {}
+    for time in Time.query.filter_by(semana_id=semana.id):
+        vitorias = request.form.get(f'vitorias_{time.id}', type=int)
+        derrotas = request.form.get(f'derrotas_{time.id}', type=int)
+        if vitorias is None and derrotas is None:
+            continue
+        if (vitorias or 0) < 0 or (derrotas or 0) < 0:
+            flash('Vitórias e derrotas não podem ser negativas!', 'danger')
+            return redirect(url_for('gerenciar_times'))
+        resultados[time.id] = (vitorias or 0, derrotas or 0)
+    
+    try:
+        semanas, registros = registrar_resultados_semana(semana, resultados)
+        db.session.commit()
+        flash(f'Resultados salvos! Ratings atualizados ({semanas} semanas reaplicadas).', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Erro ao salvar resultados: {str(e)}', 'danger')
+    return redirect(url_for('gerenciar_times'))
+
+@app.route('/admin/ratings/recalcular', methods=['POST'])
+@admin_required
+def admin_recalcular_ratings():
+    """Recalcula os ratings a partir de uma temporada (ou de todo o histórico)"""
+    temporada = request.form.get('temporada', type=int)
+    inicio = time_module.perf_counter()
+    try:
+        semanas, registros = recalcular_ratings(date(temporada, 1, 1) if temporada else None)
+        db.session.commit()
+        flash(f'Ratings recalculados: {semanas} semanas, {registros} registros '
+              f'em {(time_module.perf_counter() - inicio) * 1000:.0f} ms.', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Erro ao recalcular ratings: {str(e)}', 'danger')
+    return redirect(request.referrer or url_for('ranking'))
+
+@app.route('/api/jogador/<int:jogador_id>/ratings')
+@login_required
+def api_historico_rating(jogador_id):
+    """Evolução do rating do jogador semana a semana"""
+    jogador = Jogador.query.get_or_404(jogador_id)
+    linhas = db.session.query(HistoricoRating, Semana.data).join(
+        Semana, Semana.id == HistoricoRating.semana_id
+    ).filter(HistoricoRating.jogador_id == jogador.id).order_by(Semana.data).all()
+    
+    return jsonify({
+        'success': True,
+        'rating': jogador.rating,
+        'historico': [{
+            'semana_id': h.semana_id,
+            'data': data.isoformat(),
+            'rating_anterior': h.rating_anterior,
+            'rating_novo': h.rating_novo,
+            'variacao': h.variacao
+        } for h, data in linhas]
+    })
+
+
+# ======================================================
+# ARQUIVO DE TEMPORADAS ANTIGAS
+# ======================================================
+# Semanas finalizadas há mais de HORIZONTE_ARQUIVO_DIAS (variável de ambiente
+# ARQUIVO_HORIZONTE_DIAS) saem das tabelas do dia a dia para uma linha
+# comprimida em ArquivoSemana, com os jogadores envolvidos indexados em
+# ArquivoJogador. A semana, os times, os resultados e o histórico de rating
+# continuam nas tabelas normais.
+HORIZONTE_ARQUIVO_DIAS = int(os.environ.get('ARQUIVO_HORIZONTE_DIAS', 365))
+LOTE_ARQUIVO = 100  # semanas por transação
+MAX_ARQUIVOS_EM_CACHE = 256
+
+TABELAS_ARQUIVO = (Confirmacao, EscolhaDraft, HistoricoDraft, PagamentoCofre, MovimentoCofre)
+
+_cache_arquivo = {}
+_cache_arquivo_lock = Lock()
+
+def _valor_arquivo(valor):
+    return valor.isoformat() if isinstance(valor, (date, datetime)) else valor
+
+def _conversores_arquivo(modelo):
+    """Funções que desfazem a serialização de cada coluna (datas voltam a ser datas)"""
+    conversores = {}
+    for coluna in modelo.__table__.columns:
+        if isinstance(coluna.type, db.DateTime):
+            conversores[coluna.key] = datetime.fromisoformat
+        elif isinstance(coluna.type, db.Date):
+            conversores[coluna.key] = date.fromisoformat
+    return conversores
+
+def _ler_arquivo(registro):
+    """{tabela: [dict da linha, ...]} de um ArquivoSemana (descomprimido uma vez e guardado)"""
+    chave = (registro.semana_id, registro.arquivado_em)
+    with _cache_arquivo_lock:
+        em_cache = _cache_arquivo.get(chave)
+    if em_cache is not None:
+        return em_cache
+    
+    bruto = json.loads(zlib.decompress(registro.dados))
+    dados = {}
+    for modelo in TABELAS_ARQUIVO:
+        tabela = bruto.get(modelo.__tablename__, {'colunas': [], 'linhas': []})
+        conversores = _conversores_arquivo(modelo)
+        linhas = []
+        for valores in tabela['linhas']:
+            linha = dict(zip(tabela['colunas'], valores))
+            for coluna, converter in conversores.items():
+                if linha.get(coluna):
+                    linha[coluna] = converter(linha[coluna])
+            linhas.append(linha)
+        dados[modelo.__tablename__] = linhas
+    
+    with _cache_arquivo_lock:
+        _cache_arquivo[chave] = dados
+        while len(_cache_arquivo) > MAX_ARQUIVOS_EM_CACHE:
+            _cache_arquivo.pop(next(iter(_cache_arquivo)))
+    return dados
+
+def dados_semana_arquivada(semana_id):
+    """Dados arquivados da semana, ou None se ela está nas tabelas normais"""
+    registro = db.session.get(ArquivoSemana, semana_id)
+    return _ler_arquivo(registro) if registro else None
+
+def linhas_arquivadas(modelo, semanas_ids):
+    """Linhas de `modelo` guardadas no arquivo das semanas dadas (uma consulta)"""
+    semanas_ids = list(semanas_ids)
+    if not semanas_ids:
+        return []
+    linhas = []
+    for registro in ArquivoSemana.query.filter(ArquivoSemana.semana_id.in_(semanas_ids)):
+        linhas.extend(_ler_arquivo(registro)[modelo.__tablename__])
+    return linhas
+
+def arquivos_semanas(inicio=None, fim=None, semana_id=None, decrescente=False):
+    """(semana, dados) das semanas arquivadas no período (ou da semana dada), em ordem de data"""
+    query = db.session.query(Semana, ArquivoSemana).join(ArquivoSemana, ArquivoSemana.semana_id == Semana.id)
+    if semana_id is not None:
+        query = query.filter(Semana.id == semana_id)
+    ordem = (Semana.data.desc(), Semana.id.desc()) if decrescente else (Semana.data, Semana.id)
+    for semana, registro in filtrar_periodo(query, Semana.data, inicio, fim).order_by(*ordem).yield_per(LOTE_ARQUIVO):
+        yield semana, _ler_arquivo(registro)
+
+# Leitores das semanas arquivadas: as tuplas têm o formato das consultas
+# equivalentes nas tabelas normais, para os relatórios intercalarem as duas
+# fontes por data (heapq.merge)
+
+def pagamentos_arquivados(arquivos):
+    """(data, nome, valor, método, pago, pago_em, observação) dos pagamentos arquivados"""
+    for semana, dados in arquivos:
+        pagamentos = sorted(dados['pagamento_cofre'], key=itemgetter('id'))
+        nomes = dict(db.session.query(Jogador.id, Jogador.nome).filter(
+            Jogador.id.in_({p['jogador_id'] for p in pagamentos if p['jogador_id']})
+        ))
+        for p in pagamentos:
+            yield (semana.data, nomes.get(p['jogador_id']), p['valor'], p['metodo_pagamento'],
+                   p['pago'], p['pago_em'], p['observacao'])
+
+def escolhas_arquivadas(arquivos):
+    """(data, time_id, time, capitão, ordem, round, jogador, posição, nível) das escolhas arquivadas"""
+    for semana, dados in arquivos:
+        times = {t.id: t for t in Time.query.filter(Time.semana_id == semana.id)}
+        ids = {e['jogador_id'] for e in dados['escolha_draft']} | {t.capitao_id for t in times.values() if t.capitao_id}
+        jogadores = {j.id: j for j in db.session.query(
+            Jogador.id, Jogador.nome, Jogador.posicao, Jogador.nivel
+        ).filter(Jogador.id.in_(ids))} if ids else {}
+        # Mesmos critérios dos joins da consulta normal: time e jogador precisam existir
+        escolhas = sorted(
+            (e for e in dados['escolha_draft'] if e['time_id'] in times and e['jogador_id'] in jogadores),
+            key=lambda e: (times[e['time_id']].ordem_escolha or 0, e['ordem_escolha'] or 0)
+        )
+        for e in escolhas:
+            time_ = times[e['time_id']]
+            jogador = jogadores[e['jogador_id']]
+            capitao = jogadores.get(time_.capitao_id)
+            yield (semana.data, time_.id, time_.nome, capitao.nome if capitao else None,
+                   e['ordem_escolha'], e['round_num'], jogador.nome, jogador.posicao, jogador.nivel)
+
+def presencas_arquivadas(arquivos):
+    """(data, nome, mensalista, confirmado, confirmado_em, presente, prioridade) das confirmações arquivadas"""
+    for semana, dados in arquivos:
+        confirmacoes = dados['confirmacao']
+        jogadores = {id: (nome, mensalista) for id, nome, mensalista in db.session.query(
+            Jogador.id, Jogador.nome, Jogador.mensalista
+        ).filter(Jogador.id.in_({c['jogador_id'] for c in confirmacoes}))}
+        linhas = [
+            (semana.data, *jogadores[c['jogador_id']], c['confirmado'], c['confirmado_em'],
+             c['presente'], c['prioridade'])
+            for c in confirmacoes if c['jogador_id'] in jogadores
+        ]
+        yield from sorted(linhas, key=itemgetter(1))
+
+def _jogadores_do_arquivo(linhas):
+    """Jogadores citados nas linhas arquivadas de uma semana"""
+    return sorted({linha['jogador_id'] for tabela in linhas.values() for linha in tabela
+                   if linha.get('jogador_id')})
+
+def indexar_jogadores_arquivados():
+    """Refaz o índice ArquivoJogador a partir dos arquivos (sem commit); retorna as linhas"""
+    ArquivoJogador.query.delete(synchronize_session=False)
+    jogadores = {id for (id,) in db.session.query(Jogador.id)}
+    total = 0
+    for (semana_id,) in db.session.query(ArquivoSemana.semana_id).all():
+        registro = db.session.get(ArquivoSemana, semana_id)
+        indices = [{'semana_id': registro.semana_id, 'jogador_id': jogador_id}
+                   for jogador_id in _jogadores_do_arquivo(_ler_arquivo(registro)) if jogador_id in jogadores]
+        if indices:
+            db.session.execute(insert(ArquivoJogador), indices)
+            total += len(indices)
+    return total
+
+def _resumo_arquivo(semana, linhas):
+    """Colunas de resumo do ArquivoSemana a partir das linhas da semana"""
+    pagos = [p for p in linhas['pagamento_cofre'] if p['pago']]
+    metodos = {}
+    for pagamento in pagos:
+        total = metodos.setdefault(pagamento['metodo_pagamento'], [0, 0])
+        total[0] += 1
+        total[1] += pagamento['valor'] or 0
+    
+    saldo = 0
+    for movimento in linhas['movimento_cofre']:
+        if movimento['tipo'] in TIPOS_MOVIMENTO_CREDITO:
+            saldo += movimento['valor']
+        elif movimento['tipo'] in TIPOS_MOVIMENTO_DEBITO:
+            saldo -= movimento['valor']
+    
+    return {
+        'semana_id': semana.id,
+        'temporada': semana.data.year,
+        'confirmados': sum(1 for c in linhas['confirmacao'] if c['confirmado']),
+        'escolhas': len(linhas['escolha_draft']),
+        'pagamentos': len(linhas['pagamento_cofre']),
+        'valor_pago': sum(p['valor'] or 0 for p in pagos),
+        'pagamentos_metodo': json.dumps(metodos),
+        'saldo_movimentos': saldo,
+        'ultimo_movimento_em': max((m['created_at'] for m in linhas['movimento_cofre'] if m['created_at']), default=None),
+        'arquivado_em': datetime.utcnow()
+    }
+
+def semanas_para_arquivar(horizonte_dias=None):
+    """Semanas finalizadas antes do horizonte, ainda não arquivadas e sem pagamento pendente.
+
+    Também ficam de fora semanas com avulso escalado sem registro no cofre: a
+    dívida dele só é calculada a partir das escolhas nas tabelas normais.
+    """
+    corte = date.today() - timedelta(days=HORIZONTE_ARQUIVO_DIAS if horizonte_dias is None else horizonte_dias)
+    return Semana.query.filter(
+        Semana.draft_finalizado == True,
+        Semana.data < corte,
+        ~db.session.query(ArquivoSemana).filter(ArquivoSemana.semana_id == Semana.id).exists(),
+        ~db.session.query(PagamentoCofre).filter(
+            PagamentoCofre.semana_id == Semana.id, PagamentoCofre.pago == False
+        ).exists(),
+        ~db.session.query(EscolhaDraft).join(Jogador, Jogador.id == EscolhaDraft.jogador_id).filter(
+            EscolhaDraft.semana_id == Semana.id,
+            or_(Jogador.mensalista == False, Jogador.mensalista.is_(None)),
+            ~db.session.query(PagamentoCofre).filter(
+                PagamentoCofre.semana_id == EscolhaDraft.semana_id,
+                PagamentoCofre.jogador_id == EscolhaDraft.jogador_id
+            ).exists()
+        ).exists()
+    ).order_by(Semana.data)
+
+def arquivar_lote(semanas):
+    """Move as linhas das semanas para ArquivoSemana em lote (sem commit); retorna as linhas movidas"""
+    ids = [semana.id for semana in semanas]
+    por_semana = {semana_id: {modelo.__tablename__: [] for modelo in TABELAS_ARQUIVO} for semana_id in ids}
+    empacotado = {semana_id: {} for semana_id in ids}
+    movidas = 0
+    
+    for modelo in TABELAS_ARQUIVO:
+        tabela = modelo.__tablename__
+        colunas = [coluna.key for coluna in modelo.__table__.columns]
+        for linha in db.session.execute(modelo.__table__.select().where(modelo.__table__.c.semana_id.in_(ids))).mappings():
+            registro = {coluna: linha[coluna] for coluna in colunas}
+            por_semana[linha['semana_id']][tabela].append(registro)
+            empacotado[linha['semana_id']].setdefault(tabela, {'colunas': colunas, 'linhas': []})['linhas'].append(
+                [_valor_arquivo(registro[coluna]) for coluna in colunas]
+            )
+    
+    arquivos = []
+    for semana in semanas:
+        resumo = _resumo_arquivo(semana, por_semana[semana.id])
+        resumo['dados'] = zlib.compress(json.dumps(empacotado[semana.id], separators=(',', ':')).encode('utf-8'), 9)
+        arquivos.append(resumo)
+    db.session.execute(insert(ArquivoSemana), arquivos)
+    indices = [{'semana_id': semana_id, 'jogador_id': jogador_id}
+               for semana_id in ids for jogador_id in _jogadores_do_arquivo(por_semana[semana_id])]
+    if indices:
+        db.session.execute(insert(ArquivoJogador), indices)
+    
+    for modelo in TABELAS_ARQUIVO:
+        movidas += modelo.query.filter(modelo.semana_id.in_(ids)).delete(synchronize_session=False)
+    return movidas
+
+def arquivar_semanas_antigas(horizonte_dias=None):
+    """Arquiva as semanas antigas em lotes, um commit por lote; retorna (semanas, linhas)"""
+    total_semanas = total_linhas = 0
+    while True:
+        semanas = semanas_para_arquivar(horizonte_dias).limit(LOTE_ARQUIVO).all()
+        if not semanas:
+            break
+        total_linhas += arquivar_lote(semanas)
+        total_semanas += len(semanas)
+        db.session.commit()
+    if total_semanas:
+        print(f"🗄️ {total_semanas} semana(s) arquivada(s), {total_linhas} linha(s) movidas")
+    return total_semanas, total_linhas
+
+def restaurar_semana_arquivada(semana_id):
+    """Devolve as linhas arquivadas da semana às tabelas normais (sem commit); retorna as linhas"""
+    registro = db.session.get(ArquivoSemana, semana_id)
+    if not registro:
+        return 0
+    dados = _ler_arquivo(registro)
+    
+    # Linhas que apontam para jogadores ou times excluídos depois do arquivamento ficam de fora
+    jogadores = {id for (id,) in db.session.query(Jogador.id)}
+    times = {id for (id,) in db.session.query(Time.id).filter(Time.semana_id == semana_id)}
+    restauradas = 0
+    for modelo in TABELAS_ARQUIVO:
+        linhas = [
+            linha for linha in dados[modelo.__tablename__]
+            if ('jogador_id' not in linha or linha['jogador_id'] in jogadores)
+            and ('time_id' not in linha or linha['time_id'] in times)
+        ]
+        if linhas:
+            db.session.execute(insert(modelo), linhas)
+            restauradas += len(linhas)
+    
+    ArquivoJogador.query.filter_by(semana_id=semana_id).delete(synchronize_session=False)
+    db.session.delete(registro)
+    return restauradas
+
+def tarefa_arquivar_temporadas():
+    """Arquiva as semanas finalizadas além do horizonte configurado"""
+    _, linhas = arquivar_semanas_antigas()
+    return linhas
+
+@app.route('/api/admin/arquivo/<int:semana_id>/restaurar', methods=['POST'])
+@admin_required
+def api_restaurar_semana_arquivada(semana_id):
+    """Traz uma semana arquivada de volta para as tabelas normais"""
+    if not db.session.get(ArquivoSemana, semana_id):
+        return jsonify({'success': False, 'message': 'Semana não está arquivada.'}), 404
+    
+    try:
+        restauradas = restaurar_semana_arquivada(semana_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Erro ao restaurar: {str(e)}'}), 500
+    return jsonify({'success': True, 'linhas': restauradas, 'message': f'{restauradas} linha(s) restaurada(s).'})
+
+
+# ======================================================
+# TAREFAS AGENDADAS
+# ======================================================
+
+# Horários no relógio local do servidor; AGENDADOR_<NOME>=HH:MM sobrescreve
+AGENDADOR_ATIVO = os.environ.get('AGENDADOR_TAREFAS', '1') != '0'
+INTERVALO_AGENDADOR = int(os.environ.get('INTERVALO_AGENDADOR', 30))  # segundos entre verificações
+PRAZO_LIDERANCA = INTERVALO_AGENDADOR * 3  # segundos até outro processo poder assumir
+
+agendador_task = None
+agendador_task_lock = Lock()
+_id_processo_agendador = None
+
+def tarefa_expirar_mensalidades():
+    """Expira mensalidades vencidas e não pagas e completa datas de fim"""
+    linhas = expirar_mensalidades_vencidas() + preencher_fim_mensalidades()
+    db.session.commit()
+    return linhas
+
+def tarefa_criar_semanas():
+    """Cria as semanas que faltam no período do ciclo vigente"""
+    # Propaga a falha para a execução ficar registrada como erro
+    return sincronizar_semanas_automaticas()
+
+def tarefa_limpeza():
+    """Descarta caches de semanas sem draft em andamento e registros de tarefas removidas"""
+    em_andamento = {id for (id,) in db.session.query(Semana.id).filter(
+        Semana.draft_em_andamento == True
+    )}
+    descartados = 0
+    with _pools_disponiveis_lock:
+        for semana_id in [id for id in pools_disponiveis if id not in em_andamento]:
+            pools_disponiveis.pop(semana_id, None)
+            descartados += 1
+    with _cache_status_publico_lock:
+        for semana_id in [id for id in _cache_status_publico if id not in em_andamento]:
+            _cache_status_publico.pop(semana_id, None)
+            descartados += 1
+    
+    removidos = ExecucaoTarefa.query.filter(
+        ExecucaoTarefa.nome.notin_(list(TAREFAS_AGENDADAS))
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return descartados + removidos
+
+TAREFAS_AGENDADAS = {
+    'expirar_mensalidades': {
+        'titulo': 'Expirar mensalidades vencidas',
+        'horario': '03:00',
+        'dias': None,  # todos os dias
+        'funcao': tarefa_expirar_mensalidades
+    },
+    'criar_semanas': {
+        'titulo': 'Criar semanas do ciclo',
+        'horario': '03:10',
+        'dias': [0],  # segunda-feira
+        'funcao': tarefa_criar_semanas
+    },
+    'limpeza': {
+        'titulo': 'Limpeza de caches',
+        'horario': '03:20',
+        'dias': None,
+        'funcao': tarefa_limpeza
+    },
+    'arquivar_temporadas': {
+        'titulo': 'Arquivar semanas antigas',
+        'horario': '04:00',
+        'dias': [6],  # domingo
+        'funcao': tarefa_arquivar_temporadas
+    },
+    'limpar_fotos': {
+        'titulo': 'Remover fotos órfãs',
+        'horario': '04:30',
+        'dias': [6],
+        'funcao': tarefa_limpar_fotos
+    }
+}
+
+def horario_tarefa(nome):
+    """Horário configurado (HH:MM) da tarefa, considerando a variável de ambiente"""
+    return os.environ.get(f'AGENDADOR_{nome.upper()}', TAREFAS_AGENDADAS[nome]['horario'])
+
+def proximo_horario(horario, dias, depois_de):
+    """Próximo instante estritamente após depois_de no horário e dias da semana dados"""
+    hora, minuto = (int(parte) for parte in horario.split(':'))
+    candidato = depois_de.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+    if candidato <= depois_de:
+        candidato += timedelta(days=1)
+    while dias is not None and candidato.weekday() not in dias:
+        candidato += timedelta(days=1)
+    return candidato
+
+def id_processo_agendador():
+    """Identificador deste processo (calculado no primeiro uso, após o fork)"""
+    global _id_processo_agendador
+    if _id_processo_agendador is None:
+        _id_processo_agendador = f'{os.getpid()}-{secrets.token_hex(4)}'
+    return _id_processo_agendador
+
+def assumir_lideranca(dono=None):
+    """Renova ou assume a liderança do agendador; só um processo roda as tarefas"""
+    dono = dono or id_processo_agendador()
+    agora = datetime.now()
+    expira_em = agora + timedelta(seconds=PRAZO_LIDERANCA)
+    
+    renovado = db.session.execute(
+        update(LiderAgendador)
+        .where(LiderAgendador.id == 1)
+        .where(or_(LiderAgendador.dono == dono, LiderAgendador.expira_em < agora))
+        .values(dono=dono, expira_em=expira_em)
+    ).rowcount
+    if renovado:
+        db.session.commit()
+        return True
+    
+    if db.session.get(LiderAgendador, 1):
+        db.session.rollback()
+        return False
+    try:
+        db.session.add(LiderAgendador(id=1, dono=dono, expira_em=expira_em))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+def executar_tarefa(nome):
+    """Roda uma tarefa e registra duração, linhas afetadas e próxima execução"""
+    tarefa = TAREFAS_AGENDADAS[nome]
+    inicio = time_module.perf_counter()
+    try:
+        linhas = tarefa['funcao']()
+        sucesso, mensagem = True, None
+    except Exception as e:
+        db.session.rollback()
+        linhas, sucesso, mensagem = None, False, str(e)[:300]
+        print(f"❌ Tarefa {nome} falhou: {e}")
+    duracao_ms = int((time_module.perf_counter() - inicio) * 1000)
+    
+    agora = datetime.now()
+    execucao = db.session.get(ExecucaoTarefa, nome) or ExecucaoTarefa(nome=nome, execucoes=0)
+    execucao.ultima_execucao_em = agora
+    execucao.duracao_ms = duracao_ms
+    execucao.linhas_afetadas = linhas
+    execucao.sucesso = sucesso
+    execucao.mensagem = mensagem
+    execucao.proxima_execucao_em = proximo_horario(horario_tarefa(nome), tarefa['dias'], agora)
+    execucao.execucoes = (execucao.execucoes or 0) + 1
+    db.session.add(execucao)
+    db.session.commit()
+    
+    if sucesso:
+        print(f"⏰ Tarefa {nome}: {linhas} linha(s) em {duracao_ms} ms")
+    return execucao
+
+def executar_tarefas_pendentes():
+    """Roda as tarefas cujo horário já passou; retorna os nomes executados"""
+    agora = datetime.now()
+    execucoes = {e.nome: e for e in ExecucaoTarefa.query.all()}
+    executadas = []
+    for nome, tarefa in TAREFAS_AGENDADAS.items():
+        execucao = execucoes.get(nome)
+        if execucao is None or execucao.proxima_execucao_em is None:
+            # Primeira vez: só agenda, a tarefa roda no próximo horário
+            execucao = execucao or ExecucaoTarefa(nome=nome, execucoes=0)
+            execucao.proxima_execucao_em = proximo_horario(horario_tarefa(nome), tarefa['dias'], agora)
+            db.session.add(execucao)
+            db.session.commit()
+        elif execucao.proxima_execucao_em <= agora:
+            executar_tarefa(nome)
+            executadas.append(nome)
+    return executadas
+
+def ciclo_agendador():
+    """Laço do agendador: a cada intervalo, o líder roda as tarefas pendentes"""
+    while True:
+        socketio.sleep(INTERVALO_AGENDADOR)
+        with app.app_context():
+            try:
+                if assumir_lideranca():
+                    executar_tarefas_pendentes()
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Erro no agendador de tarefas: {e}")
+            finally:
+                db.session.remove()
+
+def iniciar_agendador():
+    global agendador_task
+    if not AGENDADOR_ATIVO:
+        return
+    with agendador_task_lock:
+        if agendador_task is None:
+            agendador_task = socketio.start_background_task(ciclo_agendador)
+
+@app.before_request
+def garantir_agendador():
+    """Sobe o agendador no primeiro request atendido por este processo"""
+    if agendador_task is None:
+        iniciar_agendador()
+
+@app.route('/admin/tarefas')
+@admin_required
+def admin_tarefas():
+    """Status das tarefas agendadas"""
+    execucoes = {e.nome: e for e in ExecucaoTarefa.query.all()}
+    tarefas = [{
+        'nome': nome,
+        'titulo': tarefa['titulo'],
+        'horario': horario_tarefa(nome),
+        'dias': ', '.join(get_dia_semana_curto(d) for d in tarefa['dias']) if tarefa['dias'] else 'Todos',
+        'execucao': execucoes.get(nome)
+    } for nome, tarefa in TAREFAS_AGENDADAS.items()]
+    
+    lider = db.session.get(LiderAgendador, 1)
+    return render_template('admin/tarefas.html',
+                         tarefas=tarefas,
+                         lider=lider,
+                         agora=datetime.now(),
+                         agendador_ativo=AGENDADOR_ATIVO)
+
+@app.route('/admin/tarefas/<nome>/executar', methods=['POST'])
+@admin_required
+def admin_executar_tarefa(nome):
+    """Roda uma tarefa agendada imediatamente"""
+    if nome not in TAREFAS_AGENDADAS:
+        flash('Tarefa não encontrada.', 'danger')
+        return redirect(url_for('admin_tarefas'))
+    
+    execucao = executar_tarefa(nome)
+    if execucao.sucesso:
+        flash(f'Tarefa "{TAREFAS_AGENDADAS[nome]["titulo"]}" executada: {execucao.linhas_afetadas} linha(s) em {execucao.duracao_ms} ms.', 'success')
+    else:
+        flash(f'Erro ao executar tarefa: {execucao.mensagem}', 'danger')
+    return redirect(url_for('admin_tarefas'))
+
+
 # ======================================================
 # INICIALIZAÇÃO DO SISTEMA
 # ======================================================
@@ -8070,6 +12326,13 @@ with app.app_context():
     # Cria pasta de uploads se não existir
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+    # Compila os CSS/JS (só regrava pacotes que mudaram)
+    if FLASK_ENV != 'development':
+        try:
+            compilar_estaticos()
+        except OSError as e:
+            print(f"⚠️ Estáticos não compilados, servindo os originais: {e}")
+
     # Cria semanas automáticas apenas se não houver nenhuma semana no banco
     if not Semana.query.first():
         criar_semanas_automaticas()
@@ -8078,6 +12341,15 @@ with app.app_context():
     # Busca semana atual, não criando novas se já existiremnano do
     get_semana_atual()
 
+    # Arquivos anteriores ao índice de jogadores arquivados
+    if ArquivoSemana.query.first() and not ArquivoJogador.query.first():
+        print(f'✅ Jogadores arquivados indexados: {indexar_jogadores_arquivados()}')
+        db.session.commit()
+
+    # Popula as estatísticas dos jogadores na primeira execução
+    if not AnaliseSemana.query.first() and Semana.query.first():
+        print(f'✅ Estatísticas calculadas para {reconstruir_analise()} semanas')
+
     print('✅ Sistema inicializado com sucesso!')
 
     
@@ -8087,4 +12359,5 @@ with app.app_context():
 # ======================================================
 
 if __name__ == "__main__":
+    iniciar_agendador()
     socketio.run(app, host="0.0.0.0", port=5000, debug=True, allow_unsafe_werkzeug=True)
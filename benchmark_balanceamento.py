@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# benchmark_balanceamento.py
+
+import sys
+import os
+import random
+import time
+from statistics import median
+
+# Banco em memória: o benchmark não toca no banco, só precisa importar o app
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import balancear_times, avaliar_equilibrio, forca_jogador
+
+POSICOES = ['levantador', 'ponteiro', 'ponteiro', 'central', 'central', 'libero', 'oposto']
+NIVEIS = ['iniciante', 'intermediario', 'intermediario', 'avancado']
+
+# (times, jogadores por time) comuns nas semanas do grupo
+CENARIOS = [(2, 6), (3, 6), (4, 6), (4, 8), (6, 6)]
+REPETICOES = 200
+
+def gerar_elenco(rng, quantidade):
+    """Jogadores fictícios como (id, forca, posicao)"""
+    return [
+        (i, forca_jogador(int(rng.gauss(1000, 150)), rng.choice(NIVEIS)), rng.choice(POSICOES))
+        for i in range(1, quantidade + 1)
+    ]
+
+def separar_aleatorio(rng, jogadores, num_times, tamanho):
+    embaralhados = jogadores[:]
+    rng.shuffle(embaralhados)
+    return [embaralhados[i * tamanho:(i + 1) * tamanho] for i in range(num_times)]
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+def executar_cenario(rng, num_times, tamanho):
+    tempos = []
+    pontuacoes = []
+    pontuacoes_aleatorias = []
+    
+    for _ in range(REPETICOES):
+        jogadores = gerar_elenco(rng, num_times * tamanho)
+        por_id = {j[0]: j for j in jogadores}
+        
+        # Capitães: os mais fortes, um por time, como no sorteio
+        capitaes = sorted(jogadores, key=lambda j: -j[1])[:num_times]
+        fixos = [[c] for c in capitaes]
+        restantes = [j for j in jogadores if j not in capitaes]
+        
+        inicio = time.perf_counter()
+        distribuicao = balancear_times(restantes, num_times, tamanho, fixos)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        
+        pontuacoes.append(avaliar_equilibrio([[por_id[i] for i in ids] for ids in distribuicao])['pontuacao'])
+        pontuacoes_aleatorias.append(avaliar_equilibrio(separar_aleatorio(rng, jogadores, num_times, tamanho))['pontuacao'])
+    
+    print(f"{num_times} times x {tamanho:<2} | "
+          f"p50 {median(tempos):6.2f} ms | p95 {percentil(tempos, 0.95):6.2f} ms | "
+          f"pontuação {median(pontuacoes):5.1f} (aleatório {median(pontuacoes_aleatorias):5.1f})")
+
+if __name__ == "__main__":
+    semente = int(sys.argv[1]) if len(sys.argv) > 1 else 42
+    rng = random.Random(semente)
+    
+    print(f"⚖️ Benchmark de balanceamento ({REPETICOES} elencos por cenário, semente {semente})\n")
+    for num_times, tamanho in CENARIOS:
+        executar_cenario(rng, num_times, tamanho)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# benchmark_json.py
+
+import sys
+import os
+import gzip
+import json
+import time
+from datetime import date
+from statistics import median
+
+# Banco em memória com um draft fictício; nada é gravado em disco
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('AGENDADOR_TAREFAS', '0')
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import app as A
+
+NOMES = ['João', 'Conceição', 'Sebastião', 'Letícia', 'Gonçalo', 'Lúcia', 'André', 'Inês',
+         'Márcio', 'Débora', 'Vinícius', 'Bárbara']
+POSICOES = ['levantador', 'ponteiro', 'central', 'libero', 'oposto']
+NIVEIS = ['iniciante', 'intermediario', 'avancado']
+
+NUM_TIMES = 4
+JOGADORES_POR_TIME = 6
+DISPONIVEIS = 12
+REPETICOES = 2000
+
+def montar_draft():
+    """Semana com 4 times completos e jogadores ainda disponíveis; devolve (completo, publico)"""
+    with A.app.app_context():
+        semana = A.Semana(data=date.today(), descricao='Benchmark', draft_em_andamento=True)
+        A.db.session.add(semana)
+        A.db.session.flush()
+
+        total = NUM_TIMES * JOGADORES_POR_TIME + DISPONIVEIS
+        jogadores = []
+        for i in range(total):
+            jogador = A.Jogador(
+                nome=f'{NOMES[i % len(NOMES)]} {i:02d}', apelido=NOMES[i % len(NOMES)],
+                posicao=POSICOES[i % len(POSICOES)], nivel=NIVEIS[i % len(NIVEIS)],
+                foto_perfil=f'/static/uploads/fotos/{i:024x}.jpg',
+                mensalista=(i % 3 == 0), ativo=True
+            )
+            A.db.session.add(jogador)
+            jogadores.append(jogador)
+        A.db.session.flush()
+
+        for jogador in jogadores:
+            A.db.session.add(A.Confirmacao(jogador_id=jogador.id, semana_id=semana.id, confirmado=True))
+
+        for t in range(NUM_TIMES):
+            capitao = jogadores[t]
+            time_ = A.Time(semana_id=semana.id, nome=f'Time {capitao.nome}', capitao_id=capitao.id,
+                           ordem_escolha=t + 1)
+            A.db.session.add(time_)
+            A.db.session.flush()
+            for rodada in range(JOGADORES_POR_TIME):
+                jogador = jogadores[NUM_TIMES + rodada * NUM_TIMES + t]
+                A.db.session.add(A.EscolhaDraft(
+                    semana_id=semana.id, time_id=time_.id, jogador_id=jogador.id,
+                    round_num=rodada + 1, ordem_escolha=rodada * NUM_TIMES + t + 1
+                ))
+
+        draft_status = A.DraftStatus(semana_id=semana.id, rodada_atual=JOGADORES_POR_TIME + 1,
+                                     escolha_atual=1, vez_capitao_id=jogadores[0].id)
+        A.db.session.add(draft_status)
+        A.db.session.commit()
+
+        completo, _ = A.montar_status_draft(semana, draft_status)
+        return completo, A.montar_status_publico(semana)
+
+# Serializadores comparados: o anterior (padrão do Flask/Socket.IO) e os novos
+SERIALIZADORES = {
+    'json padrão (ascii)': lambda dados: json.dumps(dados, default=A.DefaultJSONProvider.default,
+                                                    sort_keys=True, separators=(',', ':')),
+    'json compacto utf-8': lambda dados: json.dumps(dados, default=A.DefaultJSONProvider.default,
+                                                    ensure_ascii=False, separators=(',', ':')),
+}
+if A.orjson is not None:
+    SERIALIZADORES['orjson'] = lambda dados: A.orjson.dumps(
+        dados, default=A.DefaultJSONProvider.default,
+        option=A.orjson.OPT_PASSTHROUGH_DATETIME | A.orjson.OPT_NON_STR_KEYS
+    ).decode('utf-8')
+
+def medir(nome_payload, dados):
+    print(f"\n{nome_payload}")
+    for nome, serializar in SERIALIZADORES.items():
+        tempos = []
+        for _ in range(REPETICOES):
+            inicio = time.perf_counter()
+            texto = serializar(dados)
+            tempos.append((time.perf_counter() - inicio) * 1_000_000)
+
+        corpo = texto.encode('utf-8')
+        gz = len(gzip.compress(corpo, A.COMPRESSAO_NIVEL_GZIP))
+        br = len(A.brotli.compress(corpo, quality=A.COMPRESSAO_QUALIDADE_BROTLI)) if A.brotli else None
+        print(f"  {nome:<20} | {len(corpo):6d} B | gzip {gz:5d} B | "
+              f"br {br if br is not None else '-':>5} B | encode p50 {median(tempos):7.1f} µs")
+
+if __name__ == "__main__":
+    completo, publico = montar_draft()
+
+    print(f"📦 Benchmark de JSON ({NUM_TIMES} times x {JOGADORES_POR_TIME}, "
+          f"{DISPONIVEIS} disponíveis, {REPETICOES} repetições)")
+    medir('draft_status_update (capitães/admin)', completo)
+    medir('status público completo (API/SSE)', publico)